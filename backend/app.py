@@ -1,15 +1,15 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS, cross_origin
+import click
 from datetime import datetime
-import pymongo
 import uuid
 import os
+import time
 import json
-import subprocess
 from dotenv import load_dotenv
-import certifi
 import re
-from urllib.parse import urlparse, unquote
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 # Load environment variables
@@ -17,35 +17,228 @@ load_dotenv()
 
 app = Flask(__name__)
 # CORS(app)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=["X-Next-Cursor"])
+
+# orjson-backed JSON (handles ObjectId/datetime) and negotiated gzip/brotli responses
+from services.json_provider import FastJSONProvider, list_response
+from services.compression import init_compression
+from services.metrics import registry, init_metrics, scan_phase_seconds
+app.json = FastJSONProvider(app)
+init_compression(app)
+init_metrics(app)
 
 # Register analytics blueprint
 from routes.analytics import analytics_bp
 app.register_blueprint(analytics_bp)
 
-# MongoDB setup
-MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
-if MONGO_URI.startswith('mongodb+srv://') or 'mongodb.net' in MONGO_URI:
-    mongo_client = pymongo.MongoClient(
-        MONGO_URI,
-        tls=True,
-        tlsCAFile=certifi.where(),
-        serverSelectionTimeoutMS=30000
-    )
-else:
-    mongo_client = pymongo.MongoClient(MONGO_URI)
-db = mongo_client["accessibility_analyzer"]
-scans_collection = db["scans"]
+from services.db import collection, get_db, on_connect, pool_stats
+from services.jobs import scan_jobs, QUEUED, COMPLETED, FAILED
+from services.scan_workers import scan_worker_pool
+from services.scan_cache import scan_cache, canonicalize_url
+from services.crawler import SiteCrawler, CRAWL_MAX_PAGES, CRAWL_PER_HOST_CONCURRENCY
+from services.snippets import SnippetStore
+from services.indexes import (setup_indexes, ROLLUP_INDEXES, SUMMARY_INDEXES, ISSUE_OCCURRENCE_INDEXES,
+                              ISSUE_STATS_INDEXES, HISTORY_INDEXES, MONITOR_INDEXES, JOB_INDEXES)
+from services.history import ScanHistory, snapshot_document, ensure_history
+from services.diff import diff_cache, diff_issues, present_diff
+from services.summaries import record_summaries, remove_summaries, rebuild_summaries, ensure_summaries
+from services.analytics_cache import analytics_cache
+from services.rollups import record_scores, rebuild_rollups, check_rollups, ensure_rollups
+from services.query_plans import check_query_plans
+from services.pagination import parse_fields, read_page, normalize_dates, ensure_dates
+from services.columnar import columnar
+from services.admission import scan_governor, ScanRejected
+from services.profiles import profile_pool
+from services.scheduler import ScanScheduler, SCAN_SCHEDULER, SCHEDULER_MIN_INTERVAL
+from services.retention import RetentionEngine, RETENTION_ENABLED
+from services.export import ExportRequest, EXPORT_FORMATS, stream_export, write_parquet
+from services.reports import (upsert_latest, latest_fields, latest_op, latest_by_url, read_offset_page, delete_reports)
+from services.reports import find_report as find_scan
+from services.issue_index import (enrich_issue, record_issues, remove_issues, previous_issue_ids,
+                                  rebuild_issue_index, ensure_issue_index)
+
+# MongoDB setup (shared client, see services/db.py)
+scans_collection = collection("scans")
+rollups_collection = collection("score_rollups")
+summaries_collection = collection("url_summaries")
+issue_occurrences_collection = collection("issue_occurrences")
+issue_stats_collection = collection("issue_stats")
+snippet_store = SnippetStore(collection("snippets"))
+# Append-only snapshots of every scan; scans_collection holds the latest one per URL
+scan_history = ScanHistory(collection("scan_history"))
+history_collection = scan_history.collection
+# URLs rescanned on an interval by the built-in scheduler
+monitors_collection = collection("monitored_urls")
+# Per-day score aggregates of snapshots removed by retention
+archive_collection = collection("score_archive")
+# Downsamples and prunes old history; cached analytics are dropped after a pass that changed anything
+retention = RetentionEngine(history_collection, scans_collection, archive_collection, on_change=analytics_cache.bump)
+
+def setup_collections():
+    # The time-series collection has to exist before anything (including create_index) touches it
+    ensure_history(scan_history, scans_collection)
+    ensure_dates(scans_collection)
+    problems = (setup_indexes(scans_collection) + setup_indexes(rollups_collection, ROLLUP_INDEXES)
+                + setup_indexes(history_collection, HISTORY_INDEXES)
+                + setup_indexes(summaries_collection, SUMMARY_INDEXES)
+                + setup_indexes(issue_occurrences_collection, ISSUE_OCCURRENCE_INDEXES)
+                + setup_indexes(issue_stats_collection, ISSUE_STATS_INDEXES)
+                + setup_indexes(monitors_collection, MONITOR_INDEXES)
+                + setup_indexes(scan_jobs.collection, JOB_INDEXES))
+    # Trends and score changes are derived from the full history
+    ensure_rollups(history_collection, rollups_collection, archive_collection)
+    ensure_summaries(history_collection, summaries_collection)
+    ensure_issue_index(scans_collection, history_collection, issue_occurrences_collection, issue_stats_collection)
+    return problems
+
+# Each process creates/verifies indexes in the background once its client exists
+on_connect(setup_collections)
+
+def load_columnar():
+    # In-process analytics snapshot, kept current by the scan write paths below
+    try:
+        columnar.load(scans_collection, history_collection, archive_collection)
+    except Exception as e:
+        print(f"Unable to load columnar analytics: {str(e)}")
+
+on_connect(load_columnar)
+
+def start_scheduler():
+    # SCAN_SCHEDULER=true runs recurring scans inside the web processes; otherwise use `flask run-scheduler`
+    if SCAN_SCHEDULER:
+        scan_scheduler.start()
+
+on_connect(start_scheduler)
+
+def start_retention():
+    # RETENTION_ENABLED=true downsamples and prunes old history in the background; otherwise use `flask apply-retention`
+    if RETENTION_ENABLED:
+        retention.start()
+
+on_connect(start_retention)
+
+@app.cli.command('ensure-indexes')
+def ensure_indexes_command():
+    if setup_collections():
+        raise SystemExit(1)
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    print(f"Rebuilt {rebuild_rollups(history_collection, rollups_collection, archive_collection)} score rollup buckets")
+
+@app.cli.command('rebuild-summaries')
+def rebuild_summaries_command():
+    print(f"Rebuilt {rebuild_summaries(history_collection, summaries_collection)} URL score summaries")
+
+@app.cli.command('rebuild-issue-index')
+def rebuild_issue_index_command():
+    count = rebuild_issue_index(scans_collection, history_collection, issue_occurrences_collection, issue_stats_collection)
+    print(f"Rebuilt issue index for {count} issues")
+
+@app.cli.command('migrate-history')
+def migrate_history_command():
+    # Copies per-URL scan documents that predate the history into scan_history; safe to rerun
+    print(f"Migrated {scan_history.migrate(scans_collection)} scans into scan_history")
+    print(f"scan_history is {'a time-series' if scan_history.is_timeseries() else 'a regular'} collection")
+
+@app.cli.command('migrate-dates')
+def migrate_dates_command():
+    # Converts scans stored with ISO string dates, which keyset cursors would skip; safe to rerun
+    print(f"Converted {normalize_dates(scans_collection)} string dates on scans")
+
+@app.cli.command('check-rollups')
+def check_rollups_command():
+    # Compares the rollup-served trends with the full trend pipeline
+    mismatches = check_rollups(history_collection, rollups_collection, archive_collection)
+    for mismatch in mismatches:
+        print(f"MISMATCH {mismatch}")
+    if mismatches:
+        raise SystemExit(1)
+    print("Score rollups match the trend pipeline")
+
+@app.cli.command('check-columnar')
+def check_columnar_command():
+    # Loads the columnar analytics snapshot and compares its responses with the Mongo-served ones
+    from routes.analytics import check_columnar
+    if not columnar.enabled():
+        print("Columnar analytics are disabled (COLUMNAR_ANALYTICS=off or numpy is not installed)")
+        raise SystemExit(1)
+    columnar.load(scans_collection, history_collection, archive_collection)
+    mismatches = check_columnar()
+    for mismatch in mismatches:
+        print(f"MISMATCH {mismatch}")
+    if mismatches:
+        raise SystemExit(1)
+    print("Columnar analytics match the Mongo-served analytics")
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    # Fails when any API query or analytics pipeline scans a whole collection or sorts in memory
+    setup_collections()
+    failed = 0
+    for name, ok, stages in check_query_plans(get_db()):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {' > '.join(stages)}")
+        failed += not ok
+    if failed:
+        print(f"{failed} queries fall back to COLLSCAN or an in-memory SORT")
+        raise SystemExit(1)
+
+@app.cli.command('run-scheduler')
+def run_scheduler_command():
+    # Dedicated process for recurring scans; leases keep it safe next to SCAN_SCHEDULER=true web processes
+    setup_collections()
+    scan_scheduler.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scan_scheduler.stop()
+
+@app.cli.command('apply-retention')
+def apply_retention_command():
+    # One retention pass over scan_history; safe next to RETENTION_ENABLED=true processes (they share a lock)
+    setup_collections()
+    result = retention.run()
+    if result is None:
+        print("Retention is already running in another process")
+        raise SystemExit(1)
+    print(f"Pruned {result['pruned']} and downsampled {result['downsampled']} snapshots in {result['seconds']}s")
+
+@app.cli.command('export-parquet')
+@click.argument('directory', default='.')
+@click.option('--rows', default='scan', help='scan or issue')
+@click.option('--source', default='latest', help='latest or history')
+@click.option('--url-prefix', default=None)
+@click.option('--since', default=None, help='ISO date, inclusive')
+@click.option('--until', default=None, help='ISO date, exclusive')
+def export_parquet_command(directory, rows, source, url_prefix, since, until):
+    # Offline Parquet export for analytics tools, written one row group per cursor batch
+    export = ExportRequest('parquet', rows, source, url_prefix, since, until)
+    path = os.path.join(directory, export.filename())
+    written = write_parquet(history_collection if source == 'history' else scans_collection, export, path)
+    print(f"Wrote {written} rows to {path}")
+
+@app.cli.command('sweep-scratch')
+def sweep_scratch_command():
+    # Removes scan scratch directories left by crashed processes and per-scan directories from older versions
+    print(f"Removed {profile_pool.sweep()} orphaned scratch directories")
+    print(json.dumps(profile_pool.stats()["usage"]))
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
 
 def validate_url(url):
     try:
         url = url.strip()
-        if not url.startswith(('http://', 'https://')):
+        if not url.lower().startswith(('http://', 'https://')):
             url = f"https://{url}"
         parsed = urlparse(url)
         if not parsed.netloc:
             return None, "Invalid URL format"
-        return url, None
+        # One canonical form per page so the cache, coalescing and storage all agree
+        return canonicalize_url(url), None
     except Exception as e:
         return None, f"URL validation error: {str(e)}"
 
@@ -69,6 +262,56 @@ def handle_exception(e):
 # ------------------ Accessibility Scan ------------------
 
 # --------------------------------------
+def rejected_response(error):
+    # Too many scans waiting: tell the client when a slot is likely to be free
+    response = jsonify({"error": "Too many scans in progress, retry later", "retryAfter": error.retry_after})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 429
+
+def perform_scan(url, raw_url, force=False):
+    # Runs on a scan worker, returning the report payload. Only the call that actually runs the scan
+    # persists it; a cache hit or a scan joined while in progress gets that stored payload back, so a
+    # repeated scan never appends a duplicate snapshot or counts twice in the derived collections.
+    print(f"Starting scan for URL: {url}")
+    payload, fresh = scan_cache.get_or_scan(url, lambda u: save_scan(u, raw_url, run_accessibility_scan(u)), force=force)
+    if not fresh:
+        print(f"Reusing stored scan {payload['id']} for URL: {url}")
+    return payload
+
+def save_scan(url, raw_url, scan_results):
+    # Appends the snapshot, moves the latest pointer and updates every derived collection
+    write_start = time.perf_counter()
+
+    scan_date = datetime.now()
+    snapshot_id = str(uuid.uuid4())
+    new_id = str(uuid.uuid4())
+    # Atomic per-URL upsert; the pre-image tells which issues this scan replaces (None for a new URL)
+    existing_scan = upsert_latest(scans_collection, url, latest_fields(raw_url, scan_date, scan_results, snapshot_id), new_id)
+    scan_id = existing_scan["id"] if existing_scan else new_id
+    print(f"{'Existing scan updated' if existing_scan else 'New scan saved'} with ID: {scan_id}")
+
+    # The snapshot is appended to the history; the per-URL document only moves its latest pointer
+    scan_history.record([snapshot_document(scan_id, url, raw_url, scan_date, scan_results, snapshot_id)])
+
+    # Earlier scores stay in the history, so they stay in the trend buckets too
+    record_scores(rollups_collection, [(scan_date, scan_results.get("score"))])
+    record_summaries(summaries_collection, [(url, scan_date, scan_results.get("score"))])
+    record_issues(issue_occurrences_collection, issue_stats_collection, [
+        (url, scan_date, scan_results.get("issues"), previous_issue_ids(existing_scan))
+    ])
+    columnar.record([(url, scan_date, scan_results.get("score"), scan_results.get("issues"))])
+    scan_phase_seconds.observe(time.perf_counter() - write_start, 'mongo_write')
+    analytics_cache.bump()
+
+    return scan_payload(scan_id, url, raw_url, scan_date, scan_results)
+
+def scan_payload(scan_id, url, raw_url, scan_date, scan_results):
+    return {
+        "id": scan_id, "scanId": scan_id, "url": url,
+        "original_url": raw_url, "date": scan_date.isoformat(),
+        "message": "Scan completed successfully", "results": scan_results, "status": "completed"
+    }
+
 @app.route('/api/scan', methods=['POST'])
 def scan_url():
     try:
@@ -81,99 +324,502 @@ def scan_url():
         if error:
             return jsonify({"error": error}), 400
 
-        print(f"Starting scan for URL: {url}")
-        scan_results = run_accessibility_scan(url)
-        # Run scan (TEMPORARILY BYPASSED FOR TESTING DUPLICATES)
-        
-        
-        scan_results = {
-            "score": 85,
-            "metrics": {
-                "performance": 90,
-                "accessibility": 85,
-                "bestPractices": 80,
-                "seo": 95
-            },
-            "issues": [],
-            "issuesBySeverity": {"critical": 0, "serious": 0, "moderate": 0, "minor": 0},
-            "scanTime": datetime.now().isoformat()
-        }
+        force = parse_bool(data.get('force', request.args.get('force')))
 
-        # Check if a scan for this URL already exists in the database
-        existing_scan = scans_collection.find_one({"url": url})
-
-        if existing_scan:
-            scan_id = existing_scan["id"]
-            inserted_id = existing_scan["_id"]
-            
-            # Update the existing document with new scan details
-            scans_collection.update_one(
-                {"_id": inserted_id},
-                {
-                    "$set": {
-                        "original_url": raw_url,
-                        "date": datetime.now(),
-                        "results": scan_results,
-                        "status": "completed"
-                    }
-                }
-            )
-            print(f"Existing scan updated for ID: {scan_id}")
-        else:
-            # Create a brand new document if it's a new unique URL
-            scan_id = str(uuid.uuid4())
-            scan_document = {
-                "id": scan_id,
-                "url": url,
-                "original_url": raw_url,
-                "date": datetime.now(),
-                "results": scan_results,
-                "status": "completed"
-            }
-            result = scans_collection.insert_one(scan_document)
-            inserted_id = result.inserted_id
-            print(f"New scan saved with ID: {scan_id}, MongoDB _id: {inserted_id}")
+        # Hand the scan to the worker pool so the request thread never waits on Chrome
+        scan_governor.admit()
+        try:
+            job_id = scan_jobs.submit(scan_governor.admitted(perform_scan), url, raw_url, force)
+        except Exception:
+            scan_governor.release()
+            raise
+        print(f"Queued scan job {job_id} for URL: {url}")
 
         return jsonify({
-            "id": scan_id, "scanId": scan_id, "url": url,
-            "original_url": raw_url, "date": datetime.now().isoformat(),
-            "message": "Scan completed successfully", "results": scan_results, "status": "completed"
-        }), 200
+            "jobId": job_id, "url": url, "original_url": raw_url,
+            "status": QUEUED, "message": "Scan queued",
+            "statusUrl": f"/api/scans/{job_id}/status",
+            "resultUrl": f"/api/scans/{job_id}/result"
+        }), 202
+    except ScanRejected as e:
+        return rejected_response(e)
     except Exception as e:
         print(f"Scan error: {str(e)}")
         return jsonify({"error": f"Scan failed: {str(e)}"}), 500
 
+# ------------------ Batch Scan ------------------
+
+BATCH_MAX_URLS = int(os.environ.get('BATCH_MAX_URLS', 500))
+BATCH_WRITE_CHUNK = int(os.environ.get('BATCH_WRITE_CHUNK', 50))
+
+def write_scan_chunk(chunk):
+    # One insert_many into the history and one bulk_write of latest pointers per chunk
+    if not chunk: return
+    write_start = time.perf_counter()
+    snapshots = [
+        snapshot_document(item["id"], item["url"], item["original_url"], item["date"], item["results"])
+        for item in chunk
+    ]
+    scan_history.record(snapshots)
+    operations = [
+        latest_op(item["url"], latest_fields(item["original_url"], item["date"], item["results"], snapshot["snapshotId"]),
+                  item["id"])
+        for item, snapshot in zip(chunk, snapshots)
+    ]
+    scans_collection.bulk_write(operations, ordered=False)
+    record_scores(rollups_collection, [
+        (item["date"], item["results"].get("score")) for item in chunk
+    ])
+    record_summaries(summaries_collection, [
+        (item["url"], item["date"], item["results"].get("score")) for item in chunk
+    ])
+    record_issues(issue_occurrences_collection, issue_stats_collection, [
+        (item["url"], item["date"], item["results"].get("issues"), item["previousIssues"]) for item in chunk
+    ])
+    columnar.record([
+        (item["url"], item["date"], item["results"].get("score"), item["results"].get("issues")) for item in chunk
+    ])
+    scan_phase_seconds.observe(time.perf_counter() - write_start, 'batch_write')
+    analytics_cache.bump()
+
+@app.route('/api/scan/batch', methods=['POST'])
+def scan_batch():
+    data = request.get_json(silent=True) or {}
+    raw_urls = data.get('urls')
+    if not isinstance(raw_urls, list) or not raw_urls:
+        return jsonify({"error": "A non-empty list of URLs is required"}), 400
+    if len(raw_urls) > BATCH_MAX_URLS:
+        return jsonify({"error": f"At most {BATCH_MAX_URLS} URLs per batch"}), 400
+
+    try:
+        concurrency = int(data.get('concurrency', 4))
+    except (TypeError, ValueError):
+        return jsonify({"error": "concurrency must be an integer"}), 400
+    concurrency = max(1, min(concurrency, scan_worker_pool.size))
+    force = parse_bool(data.get('force', False))
+
+    # Deduplicate on the validated (canonical) URL, keeping the first spelling seen
+    targets = {}
+    invalid = []
+    for raw_url in raw_urls:
+        url, error = validate_url(str(raw_url))
+        if error:
+            invalid.append({"url": raw_url, "status": FAILED, "error": error})
+        elif url not in targets:
+            targets[url] = raw_url
+
+    # Resolve already-stored URLs with a single query so every line can carry an id
+    existing = latest_by_url(scans_collection, targets)
+
+    # The batch holds up to `concurrency` scan slots at a time until its stream ends
+    admitted = min(concurrency, len(targets))
+    if admitted:
+        try:
+            scan_governor.admit(admitted)
+        except ScanRejected as e:
+            return rejected_response(e)
+
+    def batch_scan(url):
+        # (payload, item): item is the chunk entry to write, set only when this batch ran the scan
+        fresh_items = []
+        def run(u):
+            item = {
+                "id": existing[u]["id"] if u in existing else str(uuid.uuid4()), "url": u,
+                "original_url": targets[u], "results": run_accessibility_scan(u), "date": datetime.now(),
+                "previousIssues": previous_issue_ids(existing.get(u))
+            }
+            fresh_items.append(item)
+            return scan_payload(item["id"], u, item["original_url"], item["date"], item["results"])
+        payload, fresh = scan_cache.get_or_scan(url, run, force=force)
+        return payload, fresh_items[0] if fresh else None
+
+    def generate():
+        try:
+            yield from stream_batch()
+        finally:
+            if admitted:
+                scan_governor.release(admitted)
+
+    def stream_batch():
+        for line in invalid:
+            yield json.dumps(line) + "\n"
+
+        pending = []
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-scan") as executor:
+            futures = {executor.submit(batch_scan, url): url for url in targets}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    payload, item = future.result()
+                except Exception as e:
+                    yield json.dumps({"url": url, "original_url": targets[url],
+                                      "status": FAILED, "error": f"Scan failed: {str(e)}"}) + "\n"
+                    continue
+
+                # Cache hits and joined scans were stored by the scan that produced them
+                if item: pending.append(item)
+                yield json.dumps({"id": payload["id"], "url": url, "original_url": targets[url],
+                                  "status": COMPLETED, "results": payload["results"]}) + "\n"
+
+                if len(pending) >= BATCH_WRITE_CHUNK:
+                    yield from flush(pending)
+                    pending = []
+        yield from flush(pending)
+
+    def flush(chunk):
+        try:
+            write_scan_chunk(chunk)
+        except Exception as e:
+            print(f"Batch write error: {str(e)}")
+            yield json.dumps({"error": f"Failed to save results: {str(e)}",
+                              "urls": [item["url"] for item in chunk]}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# ------------------ Site Crawl ------------------
+
+@app.route('/api/scan/crawl', methods=['POST'])
+def scan_crawl():
+    data = request.get_json(silent=True) or {}
+    if not data.get('url'):
+        return jsonify({"error": "URL is required"}), 400
+    url, error = validate_url(data.get('url'))
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        max_pages = max(1, min(int(data.get('maxPages', CRAWL_MAX_PAGES)), CRAWL_MAX_PAGES))
+        concurrency = max(1, min(int(data.get('concurrency', CRAWL_PER_HOST_CONCURRENCY)), scan_worker_pool.size))
+    except (TypeError, ValueError):
+        return jsonify({"error": "maxPages and concurrency must be integers"}), 400
+    force = parse_bool(data.get('force', False))
+
+    crawler = SiteCrawler(url, max_pages=max_pages, per_host_concurrency=concurrency)
+    # Every discovered page goes through the normal scan + persist path
+    try:
+        scan_governor.admit(concurrency)
+    except ScanRejected as e:
+        return rejected_response(e)
+    job_id = scan_jobs.submit(scan_governor.admitted(crawler.crawl, concurrency),
+                              lambda page_url: perform_scan(page_url, page_url, force))
+    print(f"Queued crawl job {job_id} for site: {url}")
+
+    return jsonify({
+        "jobId": job_id, "url": url, "status": QUEUED, "message": "Crawl queued",
+        "maxPages": max_pages, "concurrency": concurrency,
+        "statusUrl": f"/api/scans/{job_id}/status",
+        "resultUrl": f"/api/scans/{job_id}/result"
+    }), 202
+
+# ------------------ Scheduled Scans ------------------
+
+# Scheduled rescans go through the same scan + persist path as POST /api/scan, on the job queue
+# Recurring scans always run fresh; a cached result would be stored as a new snapshot
+scan_scheduler = ScanScheduler(monitors_collection, lambda url, raw_url: perform_scan(url, raw_url, force=True),
+                               scan_jobs.submit)
+
+def monitor_response(doc):
+    return {key: value for key, value in doc.items() if key not in ("_id", "leaseUntil")}
+
+@app.route('/api/monitors', methods=['POST'])
+def register_monitors():
+    # {"url": ..., "interval": seconds} or {"urls": [...], "interval": seconds}
+    data = request.get_json(silent=True) or {}
+    raw_urls = data.get('urls') or ([data['url']] if data.get('url') else [])
+    if not isinstance(raw_urls, list) or not raw_urls:
+        return jsonify({"error": "url or urls is required"}), 400
+    if len(raw_urls) > BATCH_MAX_URLS:
+        return jsonify({"error": f"At most {BATCH_MAX_URLS} URLs per request"}), 400
+    try:
+        interval = int(data.get('interval', 86400))
+    except (TypeError, ValueError):
+        return jsonify({"error": "interval must be an integer number of seconds"}), 400
+    if interval < SCHEDULER_MIN_INTERVAL:
+        return jsonify({"error": f"interval must be at least {SCHEDULER_MIN_INTERVAL} seconds"}), 400
+
+    registered, errors = [], []
+    for raw_url in raw_urls:
+        url, error = validate_url(str(raw_url))
+        if error:
+            errors.append({"url": raw_url, "error": error})
+            continue
+        try:
+            registered.append(monitor_response(scan_scheduler.register(url, raw_url, interval)))
+        except Exception as e:
+            errors.append({"url": raw_url, "error": str(e)})
+    return jsonify({"monitors": registered, "errors": errors}), 201 if registered else 400
+
+@app.route('/api/monitors', methods=['GET'])
+def list_monitors():
+    try:
+        limit = min(int(request.args.get('limit', 100)), 500)
+        skip = max(int(request.args.get('skip', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "limit and skip must be integers"}), 400
+    try:
+        monitors = [monitor_response(doc) for doc in scan_scheduler.list(limit=limit, skip=skip)]
+        return jsonify({"monitors": monitors, "scheduler": scan_scheduler.stats()}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/monitors', methods=['DELETE'])
+def delete_monitors():
+    data = request.get_json(silent=True) or {}
+    urls = [validate_url(str(url))[0] for url in data.get('urls') or []]
+    urls = [url for url in urls if url]
+    if not urls:
+        return jsonify({"error": "No URLs provided"}), 400
+    try:
+        return jsonify({"deleted": scan_scheduler.unregister(urls)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/monitors/stats', methods=['GET'])
+def monitor_stats():
+    return jsonify(scan_scheduler.stats()), 200
+
+@app.route('/api/scans/<job_id>/status', methods=['GET'])
+def scan_status(job_id):
+    job = scan_jobs.get(job_id)
+    if not job: return jsonify({"error": "Scan job not found"}), 404
+    job.pop("result", None)
+    return jsonify(job), 200
+
+@app.route('/api/scans/<job_id>/result', methods=['GET'])
+def scan_result(job_id):
+    job = scan_jobs.get(job_id)
+    if not job: return jsonify({"error": "Scan job not found"}), 404
+    if job["status"] == COMPLETED:
+        return jsonify(job["result"]), 200
+    if job["status"] == FAILED:
+        return jsonify({"jobId": job_id, "status": FAILED, "error": f"Scan failed: {job['error']}"}), 500
+    # Still queued or running
+    return jsonify({"jobId": job_id, "status": job["status"]}), 202
+
+# ------------------------------------------------------------
+# Prometheus metrics
+# ------------------------------------------------------------
+def job_queue_depth():
+    stats = scan_jobs.stats()
+    return {("queued",): stats[QUEUED], ("running",): stats["running"]}
+
+def scan_worker_counts():
+    stats = scan_worker_pool.stats()
+    return {("live",): stats["live"], ("idle",): stats["idle"]}
+
+def mongo_pool_usage():
+    stats = pool_stats()
+    return {("open",): stats["open"], ("checked_out",): stats["checkedOut"], ("max",): stats["maxPoolSize"]}
+
+registry.gauge('webable_scan_jobs', 'Scan jobs waiting for or holding a job worker', ('state',), job_queue_depth)
+registry.gauge('webable_chrome_in_flight', 'Scans currently running in a worker Chrome',
+               read=lambda: scan_worker_pool.stats()["inFlight"])
+registry.gauge('webable_scan_workers', 'Long-lived Node scan workers', ('state',), scan_worker_counts)
+registry.gauge('webable_mongo_pool_connections', 'MongoDB connection pool usage in this process', ('state',), mongo_pool_usage)
+registry.gauge('webable_analytics_cache_entries', 'Cached analytics responses',
+               read=lambda: analytics_cache.stats()["entries"])
+registry.gauge('webable_scan_capacity', 'Scans allowed to run at once given memory and load',
+               read=lambda: scan_governor.stats()["capacity"])
+registry.gauge('webable_scans_waiting', 'Scans waiting for an admission slot',
+               read=lambda: scan_governor.stats()["waiting"])
+def scratch_usage(key):
+    usage = profile_pool.stats()["usage"]
+    return {(area,): usage[area][key] for area in ("profiles", "legacy") if area in usage}
+
+registry.gauge('webable_scratch_bytes', 'Disk used by scan scratch directories as of the last sweep', ('area',),
+               lambda: scratch_usage("bytes"))
+registry.gauge('webable_scratch_files', 'Files and directories (inodes) under scan scratch directories', ('area',),
+               lambda: scratch_usage("files"))
+registry.gauge('webable_scratch_free_bytes', 'Free space on the filesystem holding the scan profiles',
+               read=lambda: profile_pool.stats()["usage"].get("freeBytes") or 0)
+registry.gauge('webable_scheduled_scans_running', 'Scheduled scans holding a scheduler slot',
+               read=lambda: scan_scheduler.stats()["running"])
+registry.gauge('webable_columnar_snapshots', 'Scan snapshots held by the columnar analytics engine',
+               read=lambda: columnar.stats()["snapshots"])
+registry.gauge('webable_columnar_bytes', 'Memory held by the columnar analytics arrays',
+               read=lambda: columnar.stats()["bytes"])
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/scan/admission', methods=['GET'])
+def scan_admission_stats():
+    return jsonify(scan_governor.stats()), 200
+
+@app.route('/api/scan/profiles', methods=['GET'])
+def scan_profile_stats():
+    return jsonify(profile_pool.stats()), 200
+
+@app.route('/api/scan/cache', methods=['GET'])
+def scan_cache_stats():
+    return jsonify(scan_cache.stats()), 200
+
+@app.route('/api/reports/retention', methods=['GET'])
+def retention_stats():
+    return jsonify(retention.stats()), 200
+
+@app.route('/api/reports/diff-cache', methods=['GET'])
+def diff_cache_stats():
+    return jsonify(diff_cache.stats()), 200
+
+def wants_elements():
+    # Affected-element HTML is only resolved from fingerprints on ?expand=elements
+    return 'elements' in request.args.get('expand', '').split(',')
+
+def find_report(identifier, projection=None):
+    return find_scan(scans_collection, identifier, projection)
+
 @app.route('/api/reports/<path:identifier>', methods=['GET'])
 def get_report(identifier):
     try:
-        scan = scans_collection.find_one({"url": unquote(identifier)}) if identifier.startswith('http') else scans_collection.find_one({"id": identifier})
+        scan = find_report(identifier)
         if not scan: return jsonify({"error": "Scan not found"}), 404
-        scan["_id"] = str(scan["_id"])
+        if wants_elements(): snippet_store.expand([scan])
         return jsonify(scan), 200
     except Exception: return jsonify({"error": "Failed to retrieve report"}), 500
 
+@app.route('/api/reports/<path:identifier>/history', methods=['GET'])
+def get_report_history(identifier):
+    # Every stored snapshot of the report's URL, newest first; ?before=<ISO date> pages back
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        before = datetime.fromisoformat(request.args['before']) if request.args.get('before') else None
+        projection = parse_fields(request.args.get('fields'), default={"results.issues": 0})
+        # Snapshot ids are what ?against= / ?to= on /diff take
+        if 1 in projection.values(): projection["snapshotId"] = 1
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        scan = find_report(identifier, {"url": 1})
+        if not scan: return jsonify({"error": "Scan not found"}), 404
+        snapshots = scan_history.read(scan["url"], limit=limit, before=before, projection=projection)
+        if wants_elements(): snippet_store.expand(snapshots)
+        return list_response(app, snapshots)
+    except Exception: return jsonify({"error": "Failed to retrieve report history"}), 500
+
+DIFF_SIDE_FIELDS = {"id": 1, "url": 1, "date": 1, "snapshotId": 1, "results.score": 1, "downsampled": 1}
+
+def diff_side(scan, snapshot_id):
+    # One side of a diff: a snapshot from the report's history, or another report's latest scan
+    if snapshot_id:
+        snapshot = scan_history.find(scan["url"], snapshot_id, DIFF_SIDE_FIELDS)
+        if snapshot: return dict(snapshot, source="history")
+        other = find_report(snapshot_id, DIFF_SIDE_FIELDS)
+        return dict(other, source="scans") if other else None
+    return dict(scan, source="scans")
+
+def side_issues(side):
+    # Issues are only loaded when the diff is not cached yet
+    if side["source"] == "history":
+        doc = scan_history.find(side["url"], side["snapshotId"], {"results.issues": 1})
+    else:
+        doc = scans_collection.find_one({"_id": side["_id"]}, {"results.issues": 1})
+    return ((doc or {}).get("results") or {}).get("issues") or []
+
+def side_summary(side):
+    return {"id": side.get("id"), "url": side["url"], "snapshotId": side.get("snapshotId"),
+            "date": side.get("date"), "score": (side.get("results") or {}).get("score")}
+
+@app.route('/api/reports/<path:identifier>/diff', methods=['GET'])
+def get_report_diff(identifier):
+    # Fixed/new/changed issues between two scans. Defaults: the latest scan against the snapshot
+    # before it; ?against= and ?to= take snapshot ids from /history (or another report id).
+    try:
+        scan = find_report(identifier, DIFF_SIDE_FIELDS)
+        if not scan: return jsonify({"error": "Scan not found"}), 404
+        target = diff_side(scan, request.args.get('to'))
+        if not target: return jsonify({"error": "Snapshot not found"}), 404
+        if request.args.get('against'):
+            base = diff_side(scan, request.args['against'])
+        else:
+            previous = scan_history.read(target["url"], limit=1, before=target.get("date"), projection=DIFF_SIDE_FIELDS)
+            base = dict(previous[0], source="history") if previous else None
+        if not base: return jsonify({"error": "No earlier scan to compare against"}), 404
+        # Retention dropped the issue details of old snapshots; only their scores remain
+        if base.get("downsampled") or target.get("downsampled"):
+            return jsonify({"error": "Issue details of this snapshot are no longer retained"}), 410
+
+        compute = lambda: diff_issues(side_issues(base), side_issues(target))
+        if base.get("snapshotId") and target.get("snapshotId"):
+            key = (base["snapshotId"], target["snapshotId"])
+            diff = diff_cache.get_or_compute(key, compute)
+        else:
+            # Pre-history documents have no snapshot id to cache under
+            key, diff = None, compute()
+
+        body = present_diff(diff, snippet_store.lookup if wants_elements() else None)
+        base_score, target_score = side_summary(base)["score"], side_summary(target)["score"]
+        body.update({
+            "from": side_summary(base), "to": side_summary(target),
+            "scoreChange": target_score - base_score if None not in (base_score, target_score) else None
+        })
+        response = jsonify(body)
+        if key:
+            # Both snapshots are immutable, so the pair (plus expansion) identifies the response
+            response.set_etag(f"{key[0]}-{key[1]}{'-elements' if wants_elements() else ''}")
+            response = response.make_conditional(request)
+        return response
+    except Exception as e:
+        print(f"Error computing report diff: {str(e)}")
+        return jsonify({"error": "Failed to compute report diff"}), 500
+
+def page_response(body, next_cursor):
+    # The body stays a plain list; the token for the following page travels in a header
+    response = list_response(app, body)
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+    return response, 200
+
 @app.route('/api/reports', methods=['GET'])
 def get_reports():
+    # ?cursor=<X-Next-Cursor> pages by (date, _id); ?fields=id,url,date,score projects in Mongo
     try:
         limit = min(int(request.args.get('limit', 10)), 100)
         skip = max(int(request.args.get('skip', 0)), 0)
-        scans = list(scans_collection.find().sort("date", -1).skip(skip).limit(limit))
-        for scan in scans: scan["_id"] = str(scan["_id"])
-        return jsonify(scans), 200
+        projection = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        if skip and not request.args.get('cursor'):
+            scans = read_offset_page(scans_collection, limit, skip, projection)
+            next_cursor = None
+        else:
+            scans, next_cursor = read_page(scans_collection, limit, request.args.get('cursor'), projection)
+        if wants_elements(): snippet_store.expand(scans)
+        return page_response(scans, next_cursor)
+    except ValueError as e: return jsonify({"error": str(e)}), 400
     except Exception: return jsonify({"error": "Failed to retrieve reports"}), 500
 
+@app.route('/api/export', methods=['GET'])
+def export_scans():
+    # Streams every matching scan (or issue) row: ?format=ndjson|csv&rows=scan|issue&source=latest|history
+    # &url_prefix=&since=&until= (ISO dates). Parquet files come from `flask export-parquet`.
+    try:
+        export = ExportRequest.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if export.format not in EXPORT_FORMATS:
+        return jsonify({"error": "Parquet exports are generated offline with `flask export-parquet`"}), 400
+    collection = history_collection if export.source == 'history' else scans_collection
+    response = Response(stream_with_context(stream_export(collection, export, app.json.dumps_bytes)),
+                        mimetype=EXPORT_FORMATS[export.format])
+    response.headers["Content-Disposition"] = f'attachment; filename="{export.filename()}"'
+    return response
+
 @app.route('/api/recent-scans', methods=['GET'])
 @cross_origin()
 def recent_scans():
     try:
         limit = min(int(request.args.get('limit', 5)), 20)
-        scans = list(scans_collection.find().sort("date", -1).limit(limit))
+        scans, next_cursor = read_page(scans_collection, limit, request.args.get('cursor'),
+                                       {"id": 1, "url": 1, "date": 1, "results.score": 1})
         recent = [{
-            "_id": str(s["_id"]), "id": s["id"], "url": s["url"],
+            "_id": s["_id"], "id": s["id"], "url": s["url"],
             "displayUrl": s["url"].replace("https://", "").replace("http://", ""),
             "score": s["results"]["score"], "date": s["date"]
         } for s in scans]
-        return jsonify(recent), 200
+        return page_response(recent, next_cursor)
+    except ValueError as e: return jsonify({"error": str(e)}), 400
     except Exception: return jsonify({"error": "Failed to retrieve recent scans"}), 500
 
 @app.route('/api/scans/delete', methods=['DELETE'])
@@ -184,67 +830,65 @@ def delete_scans():
         ids = data.get('ids', [])
         if not ids:
             return jsonify({"error": "No IDs provided"}), 400
-        result = scans_collection.delete_many({"id": {"$in": ids}})
-        return jsonify({"deleted": result.deleted_count}), 200
+        removed, deleted = delete_reports(scans_collection, ids)
+        scan_history.remove({scan["url"] for scan in removed})
+        remove_summaries(summaries_collection, {scan["url"] for scan in removed})
+        remove_issues(issue_occurrences_collection, issue_stats_collection,
+                      [(scan["url"], previous_issue_ids(scan)) for scan in removed])
+        columnar.remove({scan["url"] for scan in removed})
+        # A cached payload would point a rescan at the deleted report
+        for scan in removed: scan_cache.invalidate(scan["url"])
+        if deleted: analytics_cache.bump()
+        return jsonify({"deleted": deleted}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 def run_accessibility_scan(url):
     try:
-        # Create a unique ID for this specific scan instance
-        scan_id = str(uuid.uuid4())
-        # Use system temp directory + unique subfolder
-        unique_temp = os.path.join(os.environ.get('TEMP', os.getcwd()), f'lh_{scan_id}')
-        os.makedirs(unique_temp, exist_ok=True)
-        
-        env = os.environ.copy()
-        env["TEMP"] = unique_temp
-        env["TMP"] = unique_temp
-        
-        process = subprocess.Popen(
-            ['node', 'scan_service.js', url], 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE,
-            env=env
-        )
-        stdout, stderr = process.communicate(timeout=300)
-        
-        if process.returncode != 0:
-            raise Exception(stderr.decode())
-        
-        return json.loads(stdout.decode())
-    except Exception as e:
-        raise Exception(f"Scan failed: {str(e)}")     
-        
-        scan_results = json.loads(stdout.decode())
+        # Long-lived Node workers keep lighthouse/puppeteer/axe loaded and Chrome warm.
+        # Workers reply with only the category scores and trimmed axe violations, never the full report.
+        # Waits for a slot when memory or load caps the number of Chromes running at once
+        with scan_governor.slot():
+            scan_results = scan_worker_pool.scan(url, timeout=300)
         
         # Calculate scores (standardizing the logic)
         lh = scan_results.get('lighthouse', {})
         cats = lh.get('categories', {})
+        snippets = {}
+        with scan_phase_seconds.time('process'):
+            issues = process_axe_results(scan_results.get('axe', {}), snippets)
+        with scan_phase_seconds.time('snippet_write'):
+            snippet_store.save(snippets)
         
         return {
-            'score': round(cats.get('accessibility', {}).get('score', 0) * 100),
+            'score': category_score(cats, 'accessibility'),
             'metrics': {
-                'performance': round(cats.get('performance', {}).get('score', 0) * 100),
-                'accessibility': round(cats.get('accessibility', {}).get('score', 0) * 100),
-                'bestPractices': round(cats.get('best-practices', {}).get('score', 0) * 100),
-                'seo': round(cats.get('seo', {}).get('score', 0) * 100)
+                'performance': category_score(cats, 'performance'),
+                'accessibility': category_score(cats, 'accessibility'),
+                'bestPractices': category_score(cats, 'best-practices'),
+                'seo': category_score(cats, 'seo')
             },
-            'issues': process_axe_results(scan_results.get('axe', {})),
+            'issues': issues,
             'issuesBySeverity': count_issues_by_severity(scan_results.get('axe', {})),
             'scanTime': datetime.now().isoformat()
         }
     except Exception as e:
         raise Exception(f"Scan failed: {str(e)}")
 
-def process_axe_results(axe_results):
+def category_score(categories, name):
+    # Lighthouse reports a null score for categories it could not compute
+    return round((categories.get(name, {}).get('score') or 0) * 100)
+
+def process_axe_results(axe_results, snippets):
+    # Affected elements are stored once in the snippets collection; issues keep only fingerprints.
+    # snippets collects {fingerprint: html} for the caller to save.
     issues = []
     if not isinstance(axe_results, dict): return issues
     for v in axe_results.get('violations', []):
-        issues.append({
+        issues.append(enrich_issue({
             'id': v.get('id'), 'title': v.get('help'), 'impact': v.get('impact'),
-            'affectedElements': [n.get('html') for n in v.get('nodes', []) if 'html' in n]
-        })
+            'elementRefs': [snippet_store.add(snippets, n['html']) for n in v.get('nodes', []) if n.get('html')]
+        }))
     return issues
 
 def count_issues_by_severity(axe_results):
@@ -0,0 +1,56 @@
+# Columnar analytics engine: cost of recording scans and of each analytics read as the history grows.
+# For the same reads served over HTTP next to the Mongo-served ones, run bench_endpoints twice,
+# once with COLUMNAR_ANALYTICS=serve.
+#
+#   cd backend && python -m benchmarks.bench_columnar [--urls 20000 --history 25 --issues 12 --reads 50]
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.corpus import RULES
+from services.columnar import _Store
+
+
+def timed_ms(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--urls', type=int, default=20000)
+    parser.add_argument('--history', type=int, default=25)
+    parser.add_argument('--issues', type=int, default=12)
+    parser.add_argument('--reads', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(20)
+    start = datetime(2025, 1, 1)
+    issues = [{"id": rule, "title": rule} for rule in RULES]
+    store = _Store()
+    write_start = time.perf_counter()
+    for n in range(args.history):
+        store.record([
+            (f"https://site{u // 20}.example/page{u % 20}", start + timedelta(hours=6 * n, minutes=u % 360),
+             rng.randint(30, 100), rng.sample(issues, rng.randint(1, args.issues)))
+            for u in range(args.urls)
+        ])
+    scans = args.urls * args.history
+    write_seconds = time.perf_counter() - write_start
+    print(f"{scans} scans recorded in {write_seconds:.1f}s ({write_seconds / scans * 1e6:.1f} us/scan), "
+          f"{store.nbytes() / 2 ** 20:.1f} MiB of arrays")
+
+    print(f"\n{'read':>10} {'ms':>8}")
+    for name, read in (("overview", store.overview),
+                       ("daily", lambda: store.trend('daily')),
+                       ("weekly", lambda: store.trend('weekly')),
+                       ("monthly", lambda: store.trend('monthly')),
+                       ("issues", store.issues)):
+        print(f"{name:>10} {timed_ms(read, args.reads):>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+# Times every endpoint in app.py and routes/analytics.py against a synthetic corpus and compares
+# p50/p99 latency and peak allocations with a stored baseline.
+#
+#   cd backend && python -m benchmarks.bench_endpoints --backend memory [--urls 500 --history 10 --issues 12 --elements 8]
+#   cd backend && BENCH_MONGO_URI=mongodb://localhost:27017/ python -m benchmarks.bench_endpoints --backend mongod
+#   ... --save-baseline benchmarks/results/baseline.json      # record
+#   ... --baseline benchmarks/results/baseline.json           # compare; exits 1 on regressions
+#
+# The committed benchmarks/results/baseline.json was recorded with
+#   --backend memory --urls 100 --requests 20 --memory-requests 2
+# so compare with the same arguments (its "corpus" key lists them).
+#
+# --backend memory runs on mongomock (pip install mongomock) and is only meaningful for comparing
+# runs with each other; use a local mongod for numbers that reflect production. Everything goes to
+# a scratch database that is dropped afterwards. Scans use a fake scanner in place of the Node
+# workers, so POST /api/scan measures the backend's own work around a scan.
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+import pymongo
+
+from benchmarks.corpus import CorpusGenerator, load_corpus
+
+BENCH_DB = "webable_bench_endpoints"
+# Deltas below this many ms are noise on any backend
+NOISE_FLOOR_MS = 0.2
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def make_client(args):
+    if args.backend == 'memory':
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("--backend memory needs mongomock (pip install mongomock)")
+        client = mongomock.MongoClient()
+        # The app creates its own client through services.db; hand it the same in-memory server
+        pymongo.MongoClient = lambda *a, **k: client
+        return client
+    uri = os.environ.get('BENCH_MONGO_URI', os.environ.get('MONGO_URI', 'mongodb://localhost:27017/'))
+    os.environ['MONGO_URI'] = uri
+    return pymongo.MongoClient(uri)
+
+
+def build_cases(app_module, client, db):
+    # (name, request function) in run order; read-only endpoints first, writes last
+    from services.analytics_cache import analytics_cache
+
+    report = db["scans"].find_one({}, {"id": 1, "url": 1, "historyCount": 1}, sort=[("historyCount", -1)])
+    snapshots = list(db["scan_history"].find({"url": report["url"]}, {"snapshotId": 1}).sort("date", 1))
+    issue = db["issue_stats"].find_one({}, sort=[("activeCount", -1)])
+    second_page = client.get("/api/reports?limit=50").headers.get("X-Next-Cursor")
+    fake_urls = (f"https://bench-new.example/p{i}" for i in range(10 ** 9))
+    deletable = (doc["id"] for doc in db["scans"].find({}, {"id": 1}).sort("date", 1))
+
+    def get(path, expected=200, **kwargs):
+        def run():
+            response = client.get(path, **kwargs)
+            response.get_data()
+            assert response.status_code == expected, f"{path}: {response.status_code}"
+        return run
+
+    def uncached(path):
+        request = get(path)
+
+        def run():
+            analytics_cache.bump()
+            request()
+        return run
+
+    def scan_end_to_end():
+        job = client.post("/api/scan", json={"url": next(fake_urls)}).get_json()["jobId"]
+        while client.get(f"/api/scans/{job}/status").get_json()["status"] not in ("completed", "failed"):
+            time.sleep(0.0005)
+
+    def scan_batch():
+        urls = [next(fake_urls) for _ in range(5)]
+        response = client.post("/api/scan/batch", json={"urls": urls, "concurrency": 5})
+        assert response.get_data().count(b"\n") == 5
+
+    def delete_one():
+        response = client.delete("/api/scans/delete", json={"ids": [next(deletable)]})
+        assert response.status_code == 200
+
+    rid = report["id"]
+    # A corpus of 50 URLs or fewer fits on one page and has no cursor to follow
+    cursor_cases = [("GET /api/reports cursor", get(f"/api/reports?limit=50&cursor={second_page}"))] if second_page else []
+    return [
+        ("GET /api/reports", get("/api/reports?limit=50")),
+        ("GET /api/reports fields", get("/api/reports?limit=50&fields=id,url,date,score")),
+    ] + cursor_cases + [
+        ("GET /api/reports skip", get("/api/reports?limit=50&skip=400")),
+        ("GET /api/reports gzip", get("/api/reports?limit=50", headers={"Accept-Encoding": "gzip"})),
+        ("GET /api/reports/<id>", get(f"/api/reports/{rid}")),
+        ("GET /api/reports/<id> expand", get(f"/api/reports/{rid}?expand=elements")),
+        ("GET /api/reports/<url>", get(f"/api/reports/{report['url']}")),
+        ("GET /api/reports/<id>/history", get(f"/api/reports/{rid}/history?limit=50")),
+        ("GET /api/reports/<id>/diff", get(f"/api/reports/{rid}/diff")),
+        ("GET /api/reports/<id>/diff against", get(f"/api/reports/{rid}/diff?against={snapshots[0]['snapshotId']}")),
+        ("GET /api/recent-scans", get("/api/recent-scans?limit=20")),
+        ("GET /api/analytics/overview", get("/api/analytics/overview")),
+        ("GET /api/analytics/overview uncached", uncached("/api/analytics/overview")),
+        ("GET /api/analytics/trends daily uncached", uncached("/api/analytics/trends?period=daily")),
+        ("GET /api/analytics/trends monthly uncached", uncached("/api/analytics/trends?period=monthly")),
+        ("GET /api/analytics/issues uncached", uncached("/api/analytics/issues")),
+        ("GET /api/analytics/issues/<id>/sites uncached", uncached(f"/api/analytics/issues/{issue['_id']}/sites")),
+        ("GET /api/analytics/cache", get("/api/analytics/cache")),
+        ("GET /api/scan/cache", get("/api/scan/cache")),
+        ("GET /metrics", get("/metrics")),
+        ("POST /api/scan end-to-end", scan_end_to_end),
+        ("POST /api/scan/batch x5", scan_batch),
+        ("DELETE /api/scans/delete", delete_one),
+    ]
+
+
+def measure(run, requests, memory_requests):
+    for _ in range(3):
+        run()
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+    # Allocation peak is measured in a separate pass so tracing does not distort the latencies
+    tracemalloc.start()
+    for _ in range(memory_requests):
+        run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"p50": percentile(samples, 0.5), "p99": percentile(samples, 0.99), "peakKiB": peak / 1024}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for key in ("p50", "p99", "peakKiB"):
+            floor = NOISE_FLOOR_MS if key != "peakKiB" else 16
+            if result[key] > before[key] * (1 + tolerance) and result[key] - before[key] > floor:
+                regressions.append(f"{name} {key}: {before[key]:.2f} -> {result[key]:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', choices=['memory', 'mongod'], default='memory')
+    parser.add_argument('--urls', type=int, default=500)
+    parser.add_argument('--history', type=int, default=10)
+    parser.add_argument('--issues', type=int, default=12)
+    parser.add_argument('--elements', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--memory-requests', type=int, default=5)
+    parser.add_argument('--only', help="run only cases whose name contains this text")
+    parser.add_argument('--baseline', help="compare against this baseline JSON")
+    parser.add_argument('--save-baseline', help="write the results to this baseline JSON")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative slowdown (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    os.environ['MONGO_DB_NAME'] = BENCH_DB
+    mongo = make_client(args)
+    mongo.drop_database(BENCH_DB)
+    try:
+        generator = CorpusGenerator(urls=args.urls, history=args.history, issues=args.issues, elements=args.elements)
+        start = time.perf_counter()
+        counts = load_corpus(mongo[BENCH_DB], generator)
+        print(f"corpus: {counts['urls']} urls, {counts['snapshots']} snapshots, {counts['snippets']} snippets "
+              f"loaded in {time.perf_counter() - start:.1f}s ({args.backend})")
+
+        # Imported only now so services.db picks up the scratch database and client
+        import app as app_module
+        app_module.setup_collections()
+        app_module.scan_worker_pool.scan = lambda url, timeout=300: generator.axe_violations()
+        client = app_module.app.test_client()
+
+        results = {}
+        print(f"\n{'endpoint':<48} {'p50 ms':>8} {'p99 ms':>8} {'peak KiB':>9}")
+        for name, run in build_cases(app_module, client, mongo[BENCH_DB]):
+            if args.only and args.only not in name:
+                continue
+            results[name] = measure(run, args.requests, args.memory_requests)
+            r = results[name]
+            print(f"{name:<48} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['peakKiB']:>9.0f}")
+        print(f"\npeak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+        if args.save_baseline:
+            os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+            with open(args.save_baseline, 'w') as f:
+                json.dump({"backend": args.backend, "corpus": vars(args), "results": results}, f, indent=2)
+            print(f"baseline written to {args.save_baseline}")
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            if baseline.get("backend") != args.backend:
+                print(f"warning: baseline was recorded on {baseline.get('backend')}, this run used {args.backend}")
+            regressions = compare(results, baseline["results"], args.tolerance)
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+            if regressions:
+                sys.exit(1)
+            print(f"no regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    finally:
+        mongo.drop_database(BENCH_DB)
+        try:
+            import app as app_module
+            app_module.scan_jobs.shutdown()
+        except Exception:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Per-event recording cost of services.metrics: histogram observe, timer context manager and
+# counter increment, single-threaded and with several threads recording concurrently.
+#
+#   cd backend && python -m benchmarks.bench_metrics [--events 1000000] [--threads 8]
+import argparse
+import threading
+import time
+
+from services.metrics import MetricsRegistry
+
+ROUTES = [f"/api/route/{i}" for i in range(20)]
+
+
+def per_event_ns(func, events):
+    start = time.perf_counter()
+    func(events)
+    return (time.perf_counter() - start) / events * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    histogram = registry.histogram('bench_seconds', 'bench', ('route', 'method', 'status'))
+    counter = registry.counter('bench_total', 'bench', ('outcome',))
+
+    def observe(n):
+        for i in range(n):
+            histogram.observe(0.0123, ROUTES[i % 20], 'GET', '200')
+
+    def timed(n):
+        for i in range(n):
+            with histogram.time(ROUTES[i % 20], 'GET', '200'):
+                pass
+
+    def increment(n):
+        for _ in range(n):
+            counter.inc('completed')
+
+    def empty(n):
+        for i in range(n):
+            ROUTES[i % 20]
+
+    loop = per_event_ns(empty, args.events)
+    print(f"{'event':>22} {'ns/event':>9}")
+    for name, func in (("histogram.observe", observe), ("histogram.time", timed), ("counter.inc", increment)):
+        print(f"{name:>22} {per_event_ns(func, args.events) - loop:>9.0f}")
+
+    per_thread = args.events // args.threads
+    threads = [threading.Thread(target=observe, args=(per_thread,)) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = (time.perf_counter() - start) / (per_thread * args.threads) * 1e9
+    print(f"{f'observe x{args.threads} threads':>22} {elapsed - loop:>9.0f}")
+
+    start = time.perf_counter()
+    size = len(registry.render())
+    print(f"\nrender: {size} bytes in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Compares skip/limit paging with keyset (date, _id) cursors at increasing offsets, and full
+# documents with the fields= projection used by list views.
+#
+#   cd backend && BENCH_MONGO_URI=mongodb://localhost:27017/ python -m benchmarks.bench_pagination [--scans 200000] [--offsets 0 1000 10000 100000]
+#
+# Needs a real mongod; everything is written to a scratch database that is dropped afterwards.
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import bson
+import pymongo
+
+from services.indexes import SCANS_INDEXES, ensure_indexes
+from services.pagination import LIST_SORT, encode_cursor, parse_fields, read_page
+
+BENCH_DB = "webable_bench_pagination"
+LIST_VIEW_FIELDS = "id,url,date,score"
+
+
+def load_scans(scans, total, issues=15, nodes=10, seed=5):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    batch = []
+    for i in range(total):
+        batch.append({
+            "id": f"scan-{i}", "url": f"https://site{i}.example/",
+            # Several scans share a timestamp so the _id tie-breaker is exercised
+            "date": start + timedelta(seconds=i // 3), "status": "completed",
+            "results": {
+                "score": rng.randint(30, 100),
+                "metrics": {"performance": 90, "accessibility": 85, "bestPractices": 80, "seo": 95},
+                "issues": [{
+                    "id": f"rule-{v}", "title": f"Rule {v}", "impact": "serious",
+                    "elementRefs": [f"{rng.getrandbits(160):040x}" for _ in range(nodes)]
+                } for v in range(issues)]
+            }
+        })
+        if len(batch) == 5000:
+            scans.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        scans.insert_many(batch, ordered=False)
+
+
+def best_of(func, runs=5):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scans', type=int, default=200000)
+    parser.add_argument('--offsets', type=int, nargs='+', default=[0, 1000, 10000, 100000])
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    client = pymongo.MongoClient(os.environ.get('BENCH_MONGO_URI', os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')))
+    client.drop_database(BENCH_DB)
+    scans = client[BENCH_DB]["scans"]
+    try:
+        ensure_indexes(scans, SCANS_INDEXES)
+        load_scans(scans, args.scans)
+        projection = parse_fields(LIST_VIEW_FIELDS)
+
+        print(f"{'offset':>8} {'skip ms':>9} {'keyset ms':>10} {'speedup':>8}")
+        for offset in [o for o in args.offsets if o < args.scans]:
+            # The cursor a client would hold after paging to this offset
+            anchor = scans.find({}, {"date": 1}).sort(LIST_SORT).skip(offset - 1).limit(1) if offset else None
+            token = encode_cursor(next(anchor)) if anchor else None
+            skip_time, skipped = best_of(lambda: list(scans.find({}, projection).sort(LIST_SORT).skip(offset).limit(args.limit)))
+            keyset_time, (paged, _) = best_of(lambda: read_page(scans, args.limit, token, projection))
+            assert [d["_id"] for d in skipped] == [d["_id"] for d in paged]
+            print(f"{offset:>8} {skip_time * 1000:>9.2f} {keyset_time * 1000:>10.2f} {skip_time / keyset_time:>7.1f}x")
+
+        full_time, (full, _) = best_of(lambda: read_page(scans, args.limit))
+        lean_time, (lean, _) = best_of(lambda: read_page(scans, args.limit, projection=projection))
+        full_bytes = sum(len(bson.encode(d)) for d in full)
+        lean_bytes = sum(len(bson.encode(d)) for d in lean)
+        print(f"\nfirst page of {args.limit}: full documents {full_bytes / 1024:.1f} KiB in {full_time * 1000:.2f} ms, "
+              f"fields={LIST_VIEW_FIELDS} {lean_bytes / 1024:.1f} KiB in {lean_time * 1000:.2f} ms")
+    finally:
+        client.drop_database(BENCH_DB)
+
+
+if __name__ == '__main__':
+    main()
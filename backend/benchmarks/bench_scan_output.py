@@ -0,0 +1,115 @@
+# Compares what the backend holds per scan when a worker sends the full
+# Lighthouse + axe report versus the summarizeResults() extract from scan_service.js.
+#
+#   cd backend && python -m benchmarks.bench_scan_output [--audits 400] [--violations 40] [--nodes 60]
+#
+# The fixture is a synthetic report shaped like a real Lighthouse 11 / axe 4
+# result (audits with large `details` tables, violations with per-node checks).
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+CATEGORIES = ['performance', 'accessibility', 'best-practices', 'seo']
+IMPACTS = ['critical', 'serious', 'moderate', 'minor']
+
+
+def make_report(audits=400, violations=40, nodes=60, seed=7):
+    rng = random.Random(seed)
+    lighthouse = {
+        "lighthouseVersion": "11.7.1",
+        "categories": {
+            cat: {
+                "id": cat, "title": cat.title(), "score": round(rng.random(), 2),
+                "auditRefs": [{"id": f"audit-{i}", "weight": rng.randint(0, 10)} for i in range(audits // 4)]
+            } for cat in CATEGORIES
+        },
+        "audits": {
+            f"audit-{i}": {
+                "id": f"audit-{i}", "title": f"Audit {i}", "description": "x" * 300,
+                "score": round(rng.random(), 2),
+                "details": {
+                    "type": "table",
+                    "items": [
+                        {"url": f"https://example.com/asset/{i}/{j}.js", "totalBytes": rng.randint(1, 10 ** 6),
+                         "wastedMs": rng.random() * 1000, "node": {"snippet": "<div class=\"x\">" + "y" * 80 + "</div>"}}
+                        for j in range(20)
+                    ]
+                }
+            } for i in range(audits)
+        },
+        "i18n": {"rendererFormattedStrings": {f"s{i}": "z" * 60 for i in range(300)}}
+    }
+    axe = {
+        "violations": [
+            {
+                "id": f"rule-{v}", "impact": rng.choice(IMPACTS), "help": f"Rule {v} help",
+                "description": "d" * 120, "helpUrl": f"https://dequeuniversity.com/rules/axe/4.9/rule-{v}",
+                "tags": ["wcag2a", "wcag111"],
+                "nodes": [
+                    {
+                        "html": f"<img src=\"/img/{v}/{n}.png\" class=\"hero\">",
+                        "target": [f"#main > div:nth-child({n}) > img"],
+                        "impact": rng.choice(IMPACTS),
+                        "any": [{"id": "has-alt", "data": None, "relatedNodes": [{"html": "<p>" + "r" * 100 + "</p>"}] * 3,
+                                 "message": "m" * 150}],
+                        "all": [], "none": [],
+                        "failureSummary": "f" * 200
+                    } for n in range(nodes)
+                ]
+            } for v in range(violations)
+        ],
+        "passes": [{"id": f"pass-{p}", "nodes": [{"html": "<a>ok</a>"}] * 30} for p in range(60)],
+        "incomplete": [], "inapplicable": [{"id": f"na-{p}"} for p in range(40)]
+    }
+    return {"lighthouse": lighthouse, "axe": axe}
+
+
+def summarize(report):
+    # Python mirror of summarizeResults() in scan_service.js
+    categories = {k: {"score": v.get("score")} for k, v in report["lighthouse"]["categories"].items()}
+    violations = [
+        {
+            "id": v["id"], "impact": v["impact"], "help": v["help"], "description": v["description"],
+            "helpUrl": v["helpUrl"], "tags": v["tags"],
+            "nodes": [{"html": n["html"], "target": n["target"], "impact": n["impact"]} for n in v["nodes"]]
+        } for v in report["axe"]["violations"]
+    ]
+    return {"lighthouse": {"categories": categories}, "axe": {"violations": violations}}
+
+
+def measure(label, line):
+    tracemalloc.start()
+    start = time.perf_counter()
+    parsed = json.loads(line)
+    cats = parsed["lighthouse"]["categories"]
+    _ = {k: v.get("score") for k, v in cats.items()}
+    _ = [(v["id"], [n["html"] for n in v["nodes"]]) for v in parsed["axe"]["violations"]]
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} payload={len(line) / 1024:>9.1f} KB  parse+extract={elapsed * 1000:>8.2f} ms  peak={peak / 1024 / 1024:>7.2f} MB")
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--audits', type=int, default=400)
+    parser.add_argument('--violations', type=int, default=40)
+    parser.add_argument('--nodes', type=int, default=60)
+    args = parser.parse_args()
+
+    report = make_report(args.audits, args.violations, args.nodes)
+    full_line = json.dumps(report)
+    summary_line = json.dumps(summarize(report))
+    del report
+
+    full_time, full_peak = measure("full", full_line)
+    summary_time, summary_peak = measure("summary", summary_line)
+    print(f"payload {len(full_line) / len(summary_line):.1f}x smaller, "
+          f"parse {full_time / summary_time:.1f}x faster, peak memory {full_peak / summary_peak:.1f}x lower")
+
+
+if __name__ == '__main__':
+    main()
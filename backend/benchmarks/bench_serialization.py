@@ -0,0 +1,75 @@
+# Serialize-plus-compress throughput for report payloads: Flask's stdlib provider versus
+# FastJSONProvider, each uncompressed, gzip and (when installed) brotli.
+#
+#   cd backend && python -m benchmarks.bench_serialization [--page 100] [--runs 5]
+#
+# Fixtures are the synthetic scans from bench_snippets, shaped like stored documents
+# (ObjectId _id, datetime date) both as list pages (elementRefs) and ?expand=elements reports.
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.bench_snippets import make_corpus, to_refs
+from services.compression import brotli, compress_body
+from services.json_provider import FastJSONProvider, _default, orjson
+from services.snippets import SNIPPET_MAX_LENGTH
+
+
+class StdlibProvider(DefaultJSONProvider):
+    # The previous setup: stdlib json, with _id converted the way the handlers used to
+    default = staticmethod(_default)
+
+
+def make_fixtures(page):
+    corpus = make_corpus(sites=10, scans=page // 10 + 1)[:page]
+    refs, _ = to_refs(corpus, SNIPPET_MAX_LENGTH)
+    start = datetime(2025, 1, 1)
+    for docs in (corpus, refs):
+        for i, doc in enumerate(docs):
+            doc.update(_id=ObjectId(), date=start + timedelta(minutes=i), status="completed")
+    return {f"list page ({page} scans)": refs, "expanded report (1 scan)": corpus[0]}
+
+
+def throughput(func, payload_size, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return best * 1000, payload_size / best / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--page', type=int, default=100)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    providers = {"stdlib": StdlibProvider(app), "fast": FastJSONProvider(app)}
+    encodings = [None, 'gzip'] + (['br'] if brotli is not None else [])
+    print(f"orjson {'installed' if orjson else 'missing (fast == stdlib)'}, brotli {'installed' if brotli else 'missing'}")
+
+    for name, payload in make_fixtures(args.page).items():
+        raw = providers["stdlib"].dumps(payload).encode()
+        print(f"\n{name}: {len(raw) / 1024:.0f} KiB JSON")
+        print(f"{'provider':>8} {'encoding':>9} {'bytes':>10} {'ms':>8} {'MiB/s':>8}")
+        for provider_name, provider in providers.items():
+            encode = (lambda p=provider: p.dumps_bytes(payload)) if provider_name == "fast" \
+                else (lambda p=provider: p.dumps(payload).encode())
+            for encoding in encodings:
+                def run():
+                    data = encode()
+                    return compress_body(data, encoding) if encoding else data
+                size = len(run())
+                ms, mib_s = throughput(run, len(raw), args.runs)
+                print(f"{provider_name:>8} {encoding or 'identity':>9} {size:>10} {ms:>8.2f} {mib_s:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# Measures storage and /api/reports response size for inline affectedElements
+# versus content-addressed elementRefs + the snippets collection.
+#
+#   cd backend && python -m benchmarks.bench_snippets [--sites 50] [--scans 20] [--violations 12] [--nodes 25]
+#
+# Synthetic corpus: every site has shared header/nav/footer markup that shows up
+# in most scans, plus a smaller share of page-specific elements.
+import argparse
+import json
+import random
+
+from services.snippets import SNIPPET_MAX_LENGTH, snippet_fingerprint, truncate_snippet
+
+try:
+    import bson
+
+    def doc_size(doc):
+        return len(bson.encode(doc))
+    SIZE_UNIT = "BSON"
+except ImportError:
+    def doc_size(doc):
+        return len(json.dumps(doc))
+    SIZE_UNIT = "JSON"
+
+
+def make_corpus(sites=50, scans=20, violations=12, nodes=25, shared_ratio=0.7, seed=11):
+    rng = random.Random(seed)
+    corpus = []
+    for s in range(sites):
+        shared = [
+            f"<nav class=\"site-{s}-nav\"><ul>" + "".join(f"<li><a href=\"/p{i}\">Item {i}</a></li>" for i in range(k % 8 + 3)) + "</ul></nav>"
+            for k in range(40)
+        ] + [f"<footer id=\"f{s}\">" + "<p>legal text </p>" * rng.randint(5, 60) + "</footer>" for _ in range(10)]
+        for n in range(scans):
+            issues = []
+            for v in range(violations):
+                elements = []
+                for e in range(nodes):
+                    if rng.random() < shared_ratio:
+                        elements.append(rng.choice(shared))
+                    else:
+                        elements.append(f"<div class=\"c{v}\" data-scan=\"{n}\">" + "t" * rng.randint(20, 900) + "</div>")
+                issues.append({"id": f"rule-{v}", "title": f"Rule {v}", "impact": "serious", "affectedElements": elements})
+            corpus.append({"id": f"{s}-{n}", "url": f"https://site{s}.example/page{n}", "results": {"score": 80, "issues": issues}})
+    return corpus
+
+
+def to_refs(corpus, max_length):
+    snippets = {}
+    converted = []
+    for scan in corpus:
+        issues = []
+        for issue in scan["results"]["issues"]:
+            refs = []
+            for html in issue["affectedElements"]:
+                html = truncate_snippet(html, max_length)
+                fp = snippet_fingerprint(html)
+                snippets[fp] = html
+                refs.append(fp)
+            issues.append({k: v for k, v in issue.items() if k != "affectedElements"} | {"elementRefs": refs})
+        converted.append({**scan, "results": {**scan["results"], "issues": issues}})
+    return converted, snippets
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sites', type=int, default=50)
+    parser.add_argument('--scans', type=int, default=20)
+    parser.add_argument('--violations', type=int, default=12)
+    parser.add_argument('--nodes', type=int, default=25)
+    parser.add_argument('--max-length', type=int, default=SNIPPET_MAX_LENGTH)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.sites, args.scans, args.violations, args.nodes)
+    converted, snippets = to_refs(corpus, args.max_length)
+
+    inline = sum(doc_size(doc) for doc in corpus)
+    refs = sum(doc_size(doc) for doc in converted)
+    snippet_docs = sum(doc_size({"_id": fp, "html": html}) for fp, html in snippets.items())
+    page = 100
+    list_inline = len(json.dumps(corpus[:page]))
+    list_refs = len(json.dumps(converted[:page]))
+
+    print(f"corpus: {len(corpus)} scans, {len(snippets)} distinct snippets ({SIZE_UNIT} sizes)")
+    print(f"inline storage       {inline / 1024 / 1024:>8.2f} MB")
+    print(f"refs + snippets      {(refs + snippet_docs) / 1024 / 1024:>8.2f} MB "
+          f"(scans {refs / 1024 / 1024:.2f} MB, snippets {snippet_docs / 1024 / 1024:.2f} MB)")
+    print(f"storage reduction    {inline / (refs + snippet_docs):>8.1f}x")
+    print(f"/api/reports?limit={page}: inline {list_inline / 1024:.0f} KB, refs {list_refs / 1024:.0f} KB "
+          f"({list_inline / list_refs:.1f}x smaller without ?expand=elements)")
+
+
+if __name__ == '__main__':
+    main()
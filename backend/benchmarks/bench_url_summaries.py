@@ -0,0 +1,93 @@
+# Compares the old improvements/regressions aggregation (sort every scan, $push all scores
+# per URL, $slice the last two) with indexed reads of the url_summaries collection.
+#
+#   cd backend && BENCH_MONGO_URI=mongodb://localhost:27017/ python -m benchmarks.bench_url_summaries [--sizes 10000 100000 1000000]
+#
+# Needs a real mongod; everything is written to a scratch database that is dropped afterwards.
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import pymongo
+
+from services.indexes import SCANS_INDEXES, SUMMARY_INDEXES, ensure_indexes
+from services.pipelines import SCORED_SCANS
+from services.summaries import read_summary_stats, rebuild_summaries
+
+BENCH_DB = "webable_bench_summaries"
+
+# The pipeline get_overview ran before url_summaries existed
+OLD_DIFF_PIPELINE = [
+    {"$match": SCORED_SCANS},
+    {"$sort": {"date": 1}},
+    {"$group": {"_id": "$url", "scores": {"$push": "$results.score"}}},
+    {"$project": {"last_two": {"$slice": ["$scores", -2]}}},
+    {"$project": {"diff": {"$cond": {
+        "if": {"$eq": [{"$size": "$last_two"}, 2]},
+        "then": {"$subtract": [{"$arrayElemAt": ["$last_two", 1]}, {"$arrayElemAt": ["$last_two", 0]}]},
+        "else": 0
+    }}}},
+    {"$group": {
+        "_id": None,
+        "improvements": {"$sum": {"$cond": [{"$gt": ["$diff", 0]}, 1, 0]}},
+        "regressions": {"$sum": {"$cond": [{"$lt": ["$diff", 0]}, 1, 0]}}
+    }}
+]
+
+
+def load_scans(scans, total, urls, seed=3):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    batch = []
+    for i in range(total):
+        batch.append({
+            "id": f"scan-{i}", "url": f"https://site{rng.randrange(urls)}.example/",
+            "date": start + timedelta(minutes=i), "status": "completed",
+            "results": {"score": rng.randint(30, 100)}
+        })
+        if len(batch) == 10000:
+            scans.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        scans.insert_many(batch, ordered=False)
+
+
+def best_of(func, runs=3):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--history', type=int, default=20, help="average scans per URL")
+    args = parser.parse_args()
+
+    client = pymongo.MongoClient(os.environ.get('BENCH_MONGO_URI', os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')))
+    db = client[BENCH_DB]
+    try:
+        print(f"{'scans':>9} {'urls':>7} {'pipeline ms':>12} {'summaries ms':>13} {'speedup':>8}")
+        for size in args.sizes:
+            client.drop_database(BENCH_DB)
+            scans, summaries = db["scans"], db["url_summaries"]
+            ensure_indexes(scans, SCANS_INDEXES)
+            ensure_indexes(summaries, SUMMARY_INDEXES)
+            urls = max(1, size // args.history)
+            load_scans(scans, size, urls)
+            rebuild_summaries(scans, summaries)
+
+            old = best_of(lambda: list(scans.aggregate(OLD_DIFF_PIPELINE, allowDiskUse=True)))
+            new = best_of(lambda: read_summary_stats(summaries))
+            print(f"{size:>9} {urls:>7} {old * 1000:>12.1f} {new * 1000:>13.2f} {old / new:>7.0f}x")
+    finally:
+        client.drop_database(BENCH_DB)
+
+
+if __name__ == '__main__':
+    main()
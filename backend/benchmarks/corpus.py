@@ -0,0 +1,149 @@
+# Synthetic scan corpus shaped like what the backend stores: per-URL snapshot history in
+# scan_history, one latest document per URL in scans, content-addressed snippets, and the
+# derived collections (score_rollups, url_summaries, issue index) built from them.
+#
+# Used by bench_endpoints and anything else that needs a realistic database to run against.
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from services.issue_index import ISSUE_CATEGORIES, enrich_issue
+from services.snippets import snippet_fingerprint, truncate_snippet
+
+RULES = list(ISSUE_CATEGORIES) + ['region', 'landmark-one-main', 'page-has-heading-one', 'list']
+IMPACTS = ['critical', 'serious', 'moderate', 'minor']
+
+
+class CorpusGenerator:
+    def __init__(self, urls=500, history=10, issues=12, elements=8, shared_ratio=0.6, seed=19,
+                 start=datetime(2025, 1, 1), interval=timedelta(hours=6)):
+        self.urls = urls
+        self.history = history
+        self.issues = issues
+        self.elements = elements
+        self.shared_ratio = shared_ratio
+        self.start = start
+        self.interval = interval
+        self.rng = random.Random(seed)
+
+    def url(self, index):
+        return f"https://site{index // 20}.example/page{index % 20}"
+
+    def element_html(self, site, unique):
+        # Headers/nav/footers repeat across a site's pages; the rest is page specific
+        if self.rng.random() < self.shared_ratio:
+            return f"<nav class=\"site-{site}\"><a href=\"/p{self.rng.randrange(12)}\">Link</a></nav>"
+        return f"<div class=\"c{unique}\" data-n=\"{self.rng.getrandbits(32)}\">" + "t" * self.rng.randint(20, 400) + "</div>"
+
+    def scan_results(self, site, snippets, issue_count=None):
+        rules = self.rng.sample(RULES, min(len(RULES), issue_count or self.issues))
+        issues = []
+        for rule in rules:
+            refs = []
+            for e in range(self.rng.randint(1, self.elements * 2 - 1)):
+                html = truncate_snippet(self.element_html(site, e))
+                fingerprint = snippet_fingerprint(html)
+                snippets[fingerprint] = html
+                refs.append(fingerprint)
+            issues.append(enrich_issue({
+                "id": rule, "title": rule.replace('-', ' ').capitalize(),
+                "impact": self.rng.choice(IMPACTS), "elementRefs": refs
+            }))
+        severity = {impact: 0 for impact in IMPACTS}
+        for issue in issues:
+            severity[issue["impact"]] += 1
+        metrics = {name: self.rng.randint(30, 100) for name in ('performance', 'accessibility', 'bestPractices', 'seo')}
+        return {
+            "score": metrics["accessibility"], "metrics": metrics, "issues": issues,
+            "issuesBySeverity": severity, "scanTime": self.start.isoformat()
+        }
+
+    def axe_violations(self, site=0):
+        # Raw worker output for a fake scanner: the same shape summarizeResults() returns
+        snippets = {}
+        results = self.scan_results(site, snippets)
+        return {
+            "lighthouse": {"categories": {
+                "accessibility": {"score": results["metrics"]["accessibility"] / 100},
+                "performance": {"score": results["metrics"]["performance"] / 100},
+                "best-practices": {"score": results["metrics"]["bestPractices"] / 100},
+                "seo": {"score": results["metrics"]["seo"] / 100},
+            }},
+            "axe": {"violations": [{
+                "id": issue["id"], "help": issue["title"], "impact": issue["impact"],
+                "nodes": [{"html": snippets[ref], "target": ["div"], "impact": issue["impact"]} for ref in issue["elementRefs"]]
+            } for issue in results["issues"]]}
+        }
+
+    def generate(self):
+        # Yields (latest_doc, snapshots, snippets) per URL
+        for index in range(self.urls):
+            url = self.url(index)
+            scan_id = str(uuid.uuid4())
+            snippets, snapshots = {}, []
+            depth = max(1, self.history + self.rng.randint(-self.history // 2, self.history // 2))
+            first = self.start + timedelta(minutes=self.rng.randrange(24 * 60))
+            for n in range(depth):
+                snapshots.append({
+                    "snapshotId": str(uuid.uuid4()), "scanId": scan_id, "url": url, "original_url": url,
+                    "date": first + n * self.interval, "status": "completed",
+                    "results": self.scan_results(index // 20, snippets, self.rng.randint(1, self.issues))
+                })
+            latest = snapshots[-1]
+            doc = {
+                "_id": ObjectId(), "id": scan_id, "url": url, "original_url": url, "date": latest["date"],
+                "results": latest["results"], "status": "completed",
+                "snapshotId": latest["snapshotId"], "historyCount": len(snapshots)
+            }
+            yield doc, snapshots, snippets
+
+
+def load_corpus(db, generator, batch_size=200):
+    # Writes the corpus and rebuilds every derived collection; returns counts
+    from services.history import ScanHistory
+    from services.indexes import (SCANS_INDEXES, ROLLUP_INDEXES, SUMMARY_INDEXES, ISSUE_OCCURRENCE_INDEXES,
+                                  ISSUE_STATS_INDEXES, HISTORY_INDEXES, ensure_indexes)
+    from services.issue_index import rebuild_issue_index
+    from services.rollups import record_scores
+    from services.summaries import rebuild_summaries
+    from pymongo import UpdateOne
+
+    history = ScanHistory(db["scan_history"])
+    history.ensure()
+    for name, indexes in (("scans", SCANS_INDEXES), ("score_rollups", ROLLUP_INDEXES), ("url_summaries", SUMMARY_INDEXES),
+                          ("issue_occurrences", ISSUE_OCCURRENCE_INDEXES), ("issue_stats", ISSUE_STATS_INDEXES),
+                          ("scan_history", HISTORY_INDEXES)):
+        ensure_indexes(db[name], indexes)
+
+    counts = {"urls": 0, "snapshots": 0, "snippets": 0}
+    docs, snapshots, snippets = [], [], {}
+
+    def flush():
+        if docs:
+            db["scans"].insert_many(docs, ordered=False)
+            history.record(snapshots)
+            # Same incremental path scan writes take (no full-history aggregation needed)
+            record_scores(db["score_rollups"], [(s["date"], s["results"]["score"]) for s in snapshots])
+        if snippets:
+            db["snippets"].bulk_write([
+                UpdateOne({"_id": fp}, {"$setOnInsert": {"html": html}}, upsert=True) for fp, html in snippets.items()
+            ], ordered=False)
+
+    for doc, doc_snapshots, doc_snippets in generator.generate():
+        docs.append(doc)
+        snapshots.extend(doc_snapshots)
+        snippets.update(doc_snippets)
+        counts["urls"] += 1
+        counts["snapshots"] += len(doc_snapshots)
+        if len(docs) >= batch_size:
+            flush()
+            counts["snippets"] += len(snippets)
+            docs, snapshots, snippets = [], [], {}
+    flush()
+    counts["snippets"] += len(snippets)
+
+    rebuild_summaries(db["scan_history"], db["url_summaries"])
+    rebuild_issue_index(db["scans"], db["scan_history"], db["issue_occurrences"], db["issue_stats"])
+    return counts
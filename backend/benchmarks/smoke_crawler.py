@@ -0,0 +1,113 @@
+# Offline smoke test for the site crawler against the static fixture site in fixtures/crawl_site,
+# served on a local port. Checks same-origin filtering, the sitemap index merge, 404 sitemap
+# entries and broken links being skipped, the max_pages budget and the per-host concurrency cap.
+#
+#   cd backend && python -m benchmarks.smoke_crawler
+import functools
+import os
+import threading
+import time
+import urllib.request
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from services.crawler import SiteCrawler
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'crawl_site')
+# Each response is held this long so overlapping requests show up in the concurrency count
+RESPONSE_DELAY = 0.05
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    # Serves the fixture files, filling the server's own origin into the sitemaps
+    in_flight = 0
+    max_in_flight = 0
+    requests = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            cls.requests.append(self.path)
+        try:
+            time.sleep(RESPONSE_DELAY)
+            if self.path.endswith('.xml'):
+                self.send_sitemap()
+            else:
+                super().do_GET()
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def send_sitemap(self):
+        path = os.path.join(FIXTURE_DIR, self.path.lstrip('/'))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path) as f:
+            body = f.read().replace('{origin}', f"http://127.0.0.1:{self.server.server_port}").encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.in_flight = cls.max_in_flight = 0
+            cls.requests = []
+
+
+def fake_scan(url):
+    # Stands in for a real scan: loads the page once, like the browser would
+    with urllib.request.urlopen(url, timeout=10) as response:
+        response.read()
+    return {"id": url, "results": {"score": 90, "issuesBySeverity": {"serious": 1},
+                                   "issues": [{"id": "color-contrast", "title": "Contrast", "elementRefs": ["a", "b"]}]}}
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(FixtureHandler, directory=FIXTURE_DIR))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    origin = f"http://127.0.0.1:{server.server_port}"
+    failures = []
+
+    def check(name, ok, detail=''):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{': ' + str(detail) if detail and not ok else ''}")
+        if not ok:
+            failures.append(name)
+
+    try:
+        FixtureHandler.reset()
+        report = SiteCrawler(origin + "/", max_pages=50, per_host_concurrency=2).crawl(fake_scan)
+        urls = sorted(page["url"] for page in report["pages"])
+        expected = sorted([origin, f"{origin}/about.html", f"{origin}/blog/", f"{origin}/blog/post-1.html",
+                           f"{origin}/blog/post-2.html", f"{origin}/hidden.html"])
+        check("discovers linked pages and sitemap-only pages", urls == expected, urls)
+        check("same-origin only", all(url.startswith(origin) for url in urls), urls)
+        check("404 sitemap entries and broken links are not scanned",
+              not any(url.endswith(('gone.html', 'missing.html')) for url in urls), urls)
+        check("sitemap index is followed", "/sitemap-pages.xml" in FixtureHandler.requests, FixtureHandler.requests)
+        check("every page scanned", all(page["status"] == "completed" for page in report["pages"]), report["pages"])
+        check("per-issue element counts", report["issues"][0]["elements"] == 2 * len(expected), report["issues"])
+        check("per-host concurrency <= 2", FixtureHandler.max_in_flight <= 2, FixtureHandler.max_in_flight)
+
+        FixtureHandler.reset()
+        report = SiteCrawler(origin + "/", max_pages=3, per_host_concurrency=1).crawl(fake_scan)
+        check("max_pages budget", len(report["pages"]) == 3, [page["url"] for page in report["pages"]])
+        check("per-host concurrency <= 1", FixtureHandler.max_in_flight <= 1, FixtureHandler.max_in_flight)
+    finally:
+        server.shutdown()
+
+    if failures:
+        raise SystemExit(f"{len(failures)} crawler checks failed")
+    print("Crawler smoke test passed")
+
+
+if __name__ == '__main__':
+    main()
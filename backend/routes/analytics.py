@@ -1,92 +1,22 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
-import os
-import pymongo
-import certifi
+from services.db import collection, is_db_connected
+from services.pipelines import COMPLETED_SCANS, overview_stats_pipeline
+from services.rollups import read_trend
+from services.summaries import read_summary_stats
+from services.analytics_cache import analytics_cache
+from services.metrics import analytics_query_seconds
+from services.columnar import columnar, compare_analytics
+from services.issue_index import read_recurring_issues, read_distribution, sites_with_issue, get_issue_category
 
 analytics_bp = Blueprint('analytics', __name__)
 
-# MongoDB setup (matching backend/app.py)
-MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
-try:
-    if MONGO_URI.startswith('mongodb+srv://') or 'mongodb.net' in MONGO_URI:
-        mongo_client = pymongo.MongoClient(
-            MONGO_URI,
-            tls=True,
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=2000
-        )
-    else:
-        mongo_client = pymongo.MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
-    db = mongo_client["accessibility_analyzer"]
-    scans_collection = db["scans"]
-except Exception as e:
-    print(f"Analytics unable to connect to MongoDB initially: {str(e)}")
-    scans_collection = None
-
-# Helper to check if MongoDB is connected and responsive
-def is_db_connected():
-    if scans_collection is None:
-        return False
-    try:
-        mongo_client.admin.command('ping', serverSelectionTimeoutMS=1000)
-        return True
-    except Exception:
-        return False
-
-# Issue Category Mapping Helper
-ISSUE_CATEGORIES = {
-    'color-contrast': 'Contrast',
-    'image-alt': 'Text Alternatives',
-    'image-redundant-alt': 'Text Alternatives',
-    'input-image-alt': 'Text Alternatives',
-    'role-img-alt': 'Text Alternatives',
-    'html-has-lang': 'Language',
-    'html-lang-valid': 'Language',
-    'valid-lang': 'Language',
-    'document-title': 'Page Structure',
-    'landmark-one-main': 'Page Structure',
-    'page-has-heading-one': 'Page Structure',
-    'bypass': 'Navigation',
-    'frame-title': 'Navigation',
-    'link-name': 'Navigation',
-    'button-name': 'Keyboard & Interactive',
-    'label': 'Forms & Inputs',
-    'form-field-multiple-labels': 'Forms & Inputs',
-    'aria-allowed-attr': 'ARIA',
-    'aria-hidden-body': 'ARIA',
-    'aria-required-attr': 'ARIA',
-    'aria-required-children': 'ARIA',
-    'aria-required-parent': 'ARIA',
-    'aria-roles': 'ARIA',
-    'aria-valid-attr-value': 'ARIA',
-    'aria-valid-attr': 'ARIA',
-    'duplicate-id-active': 'Keyboard & Interactive',
-    'duplicate-id-aria': 'ARIA',
-    'duplicate-id': 'Page Structure',
-    'list': 'Content Structure',
-    'listitem': 'Content Structure',
-}
-
-def get_issue_category(issue_id):
-    if not issue_id:
-        return 'Other'
-    if issue_id in ISSUE_CATEGORIES:
-        return ISSUE_CATEGORIES[issue_id]
-    issue_id_lower = issue_id.lower()
-    if issue_id_lower.startswith('aria-') or issue_id_lower.startswith('role-'):
-        return 'ARIA'
-    if 'alt' in issue_id_lower:
-        return 'Text Alternatives'
-    if 'lang' in issue_id_lower:
-        return 'Language'
-    if 'table' in issue_id_lower or 'list' in issue_id_lower:
-        return 'Content Structure'
-    if 'label' in issue_id_lower or 'input' in issue_id_lower or 'select' in issue_id_lower or 'button' in issue_id_lower:
-        return 'Forms & Inputs'
-    if 'focus' in issue_id_lower or 'tabindex' in issue_id_lower or 'keyboard' in issue_id_lower:
-        return 'Keyboard & Interactive'
-    return 'Other'
+# MongoDB setup (shared client and cached health state, see services/db.py)
+scans_collection = collection("scans")
+rollups_collection = collection("score_rollups")
+summaries_collection = collection("url_summaries")
+issue_occurrences_collection = collection("issue_occurrences")
+issue_stats_collection = collection("issue_stats")
 
 # MOCK DATA FALLBACKS (For offline / demo support)
 def get_mock_overview():
@@ -147,205 +77,175 @@ def get_mock_issues():
     }
 
 
+# ================== MONGO-SERVED ANALYTICS ==================
+# Each returns the response body or raises; the endpoints decide on fallbacks
+
+def mongo_overview():
+    # 1. Total, average, best, and worst score metrics
+    with analytics_query_seconds.time('overview_stats'):
+        stats = list(scans_collection.aggregate(overview_stats_pipeline()))
+
+    if not stats or stats[0]["totalScans"] == 0:
+        return {
+            "totalScans": 0,
+            "averageScore": 0,
+            "bestScore": 0,
+            "worstScore": 0,
+            "latestScore": 0,
+            "improvements": 0,
+            "regressions": 0,
+            "isDemo": False
+        }
+
+    # 2. Latest, best and worst score plus improvements & regressions,
+    # from the per-URL summaries kept current by every scan write
+    with analytics_query_seconds.time('url_summaries'):
+        summary = read_summary_stats(summaries_collection)
+
+    return {
+        "totalScans": stats[0]["totalScans"],
+        "averageScore": round(stats[0]["averageScore"], 1),
+        "bestScore": summary["bestScore"],
+        "worstScore": summary["worstScore"],
+        "latestScore": summary["latestScore"],
+        "improvements": summary["improvements"],
+        "regressions": summary["regressions"],
+        "isDemo": False
+    }
+
+
+def mongo_trend(period):
+    # Served from the pre-aggregated buckets kept up to date by every scan write
+    with analytics_query_seconds.time(f'trend_{period}'):
+        return read_trend(rollups_collection, period)
+
+
+def mongo_issues():
+    with analytics_query_seconds.time('completed_count'):
+        total_scans = scans_collection.count_documents(COMPLETED_SCANS) or 1
+
+    # Both read the issue index (one small doc per rule) instead of unwinding every scan
+    with analytics_query_seconds.time('recurring_issues'):
+        recurring = read_recurring_issues(issue_stats_collection, total_scans)
+    with analytics_query_seconds.time('issue_distribution'):
+        distribution = read_distribution(issue_stats_collection)
+    return {"recurringIssues": recurring, "distribution": distribution}
+
+
+def columnar_response(name, read, *args):
+    # Answered from the in-process columnar snapshot (services/columnar.py)
+    with analytics_query_seconds.time(f'columnar_{name}'):
+        response = jsonify(read(*args))
+    response.headers['X-Analytics-Source'] = 'columnar'
+    return response, 200
+
+
+def check_columnar():
+    # Compares every columnar-served response with the Mongo-served one; returns the differences
+    mismatches = compare_analytics('overview', mongo_overview(), columnar.overview())
+    for period in ('daily', 'weekly', 'monthly'):
+        mismatches += compare_analytics(f'trend_{period}', mongo_trend(period), columnar.trend(period))
+    return mismatches + compare_analytics('issues', mongo_issues(), columnar.issues())
+
+
 # ================== API ENDPOINTS ==================
 
 @analytics_bp.route('/api/analytics/overview', methods=['GET'])
+@analytics_cache.cached()
 def get_overview():
-    if not is_db_connected():
+    connected = is_db_connected()
+    if columnar.serves(connected):
+        return columnar_response('overview', columnar.overview)
+    if not connected:
         return jsonify(get_mock_overview()), 200
 
     try:
-        # 1. Total, average, best, and worst score metrics
-        stats_pipeline = [
-            {"$match": {"status": "completed", "results.score": {"$exists": True}}},
-            {"$group": {
-                "_id": None,
-                "totalScans": {"$sum": 1},
-                "averageScore": {"$avg": "$results.score"},
-                "bestScore": {"$max": "$results.score"},
-                "worstScore": {"$min": "$results.score"}
-            }}
-        ]
-        stats = list(scans_collection.aggregate(stats_pipeline))
-        
-        if not stats or stats[0]["totalScans"] == 0:
-            return jsonify({
-                "totalScans": 0,
-                "averageScore": 0,
-                "bestScore": 0,
-                "worstScore": 0,
-                "latestScore": 0,
-                "improvements": 0,
-                "regressions": 0,
-                "isDemo": False
-            }), 200
-
-        # 2. Latest score
-        latest_scan = scans_collection.find_one(
-            {"status": "completed", "results.score": {"$exists": True}},
-            sort=[("date", -1)]
-        )
-        latest_score = latest_scan["results"]["score"] if latest_scan else 0
-
-        # 3. Improvements & Regressions calculation
-        # Group chronologically sorted scans by URL, get the last 2 scores, and compare them.
-        diff_pipeline = [
-            {"$match": {"status": "completed", "results.score": {"$exists": True}}},
-            {"$sort": {"date": 1}},
-            {"$group": {
-                "_id": "$url",
-                "scores": {"$push": "$results.score"}
-            }},
-            {"$project": {
-                "last_two": {"$slice": ["$scores", -2]}
-            }},
-            {"$project": {
-                "diff": {
-                    "$cond": {
-                        "if": {"$eq": [{"$size": "$last_two"}, 2]},
-                        "then": {"$subtract": [{"$arrayElemAt": ["$last_two", 1]}, {"$arrayElemAt": ["$last_two", 0]}]},
-                        "else": 0
-                    }
-                }
-            }},
-            {"$group": {
-                "_id": None,
-                "improvements": {"$sum": {"$cond": [{"$gt": ["$diff", 0]}, 1, 0]}},
-                "regressions": {"$sum": {"$cond": [{"$lt": ["$diff", 0]}, 1, 0]}}
-            }}
-        ]
-        diffs = list(scans_collection.aggregate(diff_pipeline))
-        improvements = diffs[0]["improvements"] if diffs else 0
-        regressions = diffs[0]["regressions"] if diffs else 0
-
-        return jsonify({
-            "totalScans": stats[0]["totalScans"],
-            "averageScore": round(stats[0]["averageScore"], 1),
-            "bestScore": stats[0]["bestScore"],
-            "worstScore": stats[0]["worstScore"],
-            "latestScore": latest_score,
-            "improvements": improvements,
-            "regressions": regressions,
-            "isDemo": False
-        }), 200
-
+        return jsonify(mongo_overview()), 200
     except Exception as e:
         print(f"Error in database aggregation for overview: {str(e)}")
+        if columnar.ready():
+            return columnar_response('overview', columnar.overview)
         # Graceful fallback to mock data on query/parse exception
         return jsonify(get_mock_overview()), 200
 
 
 @analytics_bp.route('/api/analytics/trends', methods=['GET'])
+@analytics_cache.cached('period')
 def get_trends():
     period = request.args.get('period', 'daily').lower()
-    
-    if not is_db_connected():
+    if period not in ('daily', 'weekly', 'monthly'):
+        period = 'daily'
+
+    connected = is_db_connected()
+    if columnar.serves(connected):
+        return columnar_response(f'trend_{period}', columnar.trend, period)
+    if not connected:
         return jsonify(get_mock_trends(period)), 200
 
     try:
-        # Date string formatting based on requested period
-        if period == 'monthly':
-            date_format = "%Y-%m"
-        elif period == 'weekly':
-            date_format = "%Y-W%V"
-        else:  # daily
-            date_format = "%Y-%m-%d"
-
-        trend_pipeline = [
-            {"$match": {
-                "status": "completed", 
-                "results.score": {"$exists": True}, 
-                "date": {"$exists": True}
-            }},
-            # Convert date field to BSON date format if it was saved as a string
-            {"$project": {
-                "score": "$results.score",
-                "parsedDate": {
-                    "$cond": {
-                        "if": {"$eq": [{"$type": "$date"}, "date"]},
-                        "then": "$date",
-                        "else": {"$toDate": "$date"}
-                    }
-                }
-            }},
-            {"$group": {
-                "_id": {"$dateToString": {"format": date_format, "date": "$parsedDate"}},
-                "avgScore": {"$avg": "$score"},
-                "sortDate": {"$min": "$parsedDate"}
-            }},
-            {"$sort": {"sortDate": 1}}
-        ]
-        
-        trend_results = list(scans_collection.aggregate(trend_pipeline))
-        labels = [r["_id"] for r in trend_results]
-        scores = [round(r["avgScore"], 1) for r in trend_results]
-        
-        return jsonify({
-            "labels": labels,
-            "scores": scores
-        }), 200
-
+        return jsonify(mongo_trend(period)), 200
     except Exception as e:
         print(f"Error in database aggregation for trends: {str(e)}")
+        if columnar.ready():
+            return columnar_response(f'trend_{period}', columnar.trend, period)
         return jsonify(get_mock_trends(period)), 200
 
 
 @analytics_bp.route('/api/analytics/issues', methods=['GET'])
+@analytics_cache.cached()
 def get_issues():
-    if not is_db_connected():
+    connected = is_db_connected()
+    if columnar.serves(connected):
+        return columnar_response('issues', columnar.issues)
+    if not connected:
         return jsonify(get_mock_issues()), 200
 
     try:
-        total_scans = scans_collection.count_documents({"status": "completed"}) or 1
-
-        # 1. Top 10 Recurring issues aggregation
-        recurring_pipeline = [
-            {"$match": {"status": "completed", "results.issues": {"$exists": True, "$type": "array"}}},
-            {"$unwind": "$results.issues"},
-            {"$group": {
-                "_id": "$results.issues.id",
-                "title": {"$first": "$results.issues.title"},
-                "count": {"$sum": 1}
-            }},
-            {"$sort": {"count": -1}},
-            {"$limit": 10}
-        ]
-        recurring_results = list(scans_collection.aggregate(recurring_pipeline))
-
-        recurring_issues = []
-        for r in recurring_results:
-            recurring_issues.append({
-                "id": r["_id"],
-                "title": r["title"] or r["_id"],
-                "count": r["count"],
-                "frequency": round((r["count"] / total_scans) * 100, 1)
-            })
-
-        # 2. Issue category distribution aggregation
-        distribution_pipeline = [
-            {"$match": {"status": "completed", "results.issues": {"$exists": True, "$type": "array"}}},
-            {"$unwind": "$results.issues"},
-            {"$group": {
-                "_id": "$results.issues.id",
-                "count": {"$sum": 1}
-            }}
-        ]
-        dist_results = list(scans_collection.aggregate(distribution_pipeline))
+        return jsonify(mongo_issues()), 200
+    except Exception as e:
+        print(f"Error in database aggregation for issues: {str(e)}")
+        if columnar.ready():
+            return columnar_response('issues', columnar.issues)
+        return jsonify(get_mock_issues()), 200
 
-        categories_map = {}
-        for d in dist_results:
-            cat = get_issue_category(d["_id"])
-            categories_map[cat] = categories_map.get(cat, 0) + d["count"]
 
-        # Format sorted by count descending
-        distribution = [{"category": k, "count": v} for k, v in categories_map.items()]
-        distribution.sort(key=lambda x: x["count"], reverse=True)
+@analytics_bp.route('/api/analytics/issues/<issue_id>/sites', methods=['GET'])
+@analytics_cache.cached('limit', 'skip')
+def get_issue_sites(issue_id):
+    # Which sites currently have this issue, most recently seen first
+    if not is_db_connected():
+        return jsonify({"error": "Database unavailable"}), 503
 
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        skip = max(int(request.args.get('skip', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "limit and skip must be integers"}), 400
+
+    try:
+        stats = issue_stats_collection.find_one({"_id": issue_id}) or {}
+        with analytics_query_seconds.time('issue_sites'):
+            sites = sites_with_issue(issue_occurrences_collection, issue_id, limit=limit, skip=skip)
+        for site in sites:
+            for key in ("firstSeen", "lastSeen"):
+                if isinstance(site.get(key), datetime):
+                    site[key] = site[key].isoformat()
         return jsonify({
-            "recurringIssues": recurring_issues,
-            "distribution": distribution
+            "id": issue_id,
+            "title": stats.get("title") or issue_id,
+            "category": stats.get("category") or get_issue_category(issue_id),
+            "activeCount": stats.get("activeCount", 0),
+            "sites": sites
         }), 200
-
     except Exception as e:
-        print(f"Error in database aggregation for issues: {str(e)}")
-        return jsonify(get_mock_issues()), 200
+        return jsonify({"error": str(e)}), 500
+
+
+@analytics_bp.route('/api/analytics/cache', methods=['GET'])
+def get_cache_stats():
+    return jsonify(analytics_cache.stats()), 200
+
+
+@analytics_bp.route('/api/analytics/columnar', methods=['GET'])
+def get_columnar_stats():
+    return jsonify(columnar.stats()), 200
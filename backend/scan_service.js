@@ -5,6 +5,7 @@ const axe = require('axe-core');
 const puppeteer = require('puppeteer');
 const path = require('path');
 const fs = require('fs');
+const readline = require('readline');
 
 // Ensure the local temp directory exists
 const tempDir = path.join(__dirname, 'temp_lighthouse');
@@ -12,11 +13,22 @@ if (!fs.existsSync(tempDir)) {
   fs.mkdirSync(tempDir);
 }
 
+// One-off user-data-dirs are removed once their Chrome has exited
+// (the Python side sweeps any left behind by a crash)
+function removeDir(dir) {
+  try {
+    fs.rmSync(dir, { recursive: true, force: true });
+  } catch (err) {
+    console.error(`Unable to remove ${dir}: ${err.message}`);
+  }
+}
+
 // Lighthouse scan function with isolation
-async function runLighthouseScan(url) {
+// When a running chrome is passed in (worker mode) it is reused and left open
+async function runLighthouseScan(url, sharedChrome) {
   const userDataDir = path.join(tempDir, `lh_${Date.now()}`);
   
-  const chrome = await chromeLauncher.launch({
+  const chrome = sharedChrome || await chromeLauncher.launch({
     chromeFlags: [
       '--headless', 
       '--no-sandbox', 
@@ -37,19 +49,24 @@ async function runLighthouseScan(url) {
 
   try {
     const runnerResult = await lighthouse(url, options);
-    return JSON.parse(runnerResult.report);
+    // lhr is the already-parsed report; re-parsing the serialized copy doubles the work
+    return runnerResult.lhr;
   } catch (error) {
     throw error;
   } finally {
-  await chrome.kill();
-}
+    if (!sharedChrome) {
+      await chrome.kill();
+      removeDir(userDataDir);
+    }
+  }
 }
 
 // Axe-core scan function with isolation
-async function runAxeScan(url) {
+// When a connected browser is passed in (worker mode) only the page is closed
+async function runAxeScan(url, sharedBrowser) {
   const userDataDir = path.join(tempDir, `axe_${Date.now()}`);
   
-  const browser = await puppeteer.launch({
+  const browser = sharedBrowser || await puppeteer.launch({
     headless: 'new',
     args: [
       '--no-sandbox', 
@@ -58,8 +75,9 @@ async function runAxeScan(url) {
     ]
   });
 
+  let page = null;
   try {
-    const page = await browser.newPage();
+    page = await browser.newPage();
     await page.goto(url, { waitUntil: 'networkidle2' });
 
     await page.evaluate(axe.source);
@@ -69,12 +87,143 @@ async function runAxeScan(url) {
   } catch (error) {
     throw error;
   } finally {
-    await browser.close();
+    if (sharedBrowser) {
+      if (page) await page.close().catch(() => {});
+    } else {
+      await browser.close();
+      removeDir(userDataDir);
+    }
+  }
+}
+
+// Reduce full Lighthouse + axe output to the fields the backend stores:
+// category scores and violations without the per-node check details.
+// Full Lighthouse reports run to several MB; this is usually a few KB.
+function summarizeResults(lighthouseResults, axeResults) {
+  const categories = {};
+  for (const [id, category] of Object.entries(lighthouseResults.categories || {})) {
+    categories[id] = { score: category.score };
+  }
+
+  const violations = ((axeResults && axeResults.violations) || []).map((v) => ({
+    id: v.id,
+    impact: v.impact,
+    help: v.help,
+    description: v.description,
+    helpUrl: v.helpUrl,
+    tags: v.tags,
+    nodes: (v.nodes || []).map((n) => ({ html: n.html, target: n.target, impact: n.impact }))
+  }));
+
+  return { lighthouse: { categories }, axe: { violations } };
+}
+
+// WORKER MODE
+// Long-lived process driven by the Python scan worker pool. Reads one JSON
+// request per line on stdin and writes one JSON response per line on stdout:
+//   {"id": "...", "type": "scan", "url": "..."} -> {"id", "ok", "result" | "error", "rss"}
+//     result is the summarizeResults() extract unless the request sets "full": true
+//   {"id": "...", "type": "ping"}               -> {"id", "ok", "pong", "rss"}
+// A single Chrome is launched lazily and shared by Lighthouse and axe.
+// SCAN_PROFILE_DIR is the pooled user-data-dir handed out by the Python side, which
+// also resets and reuses it; without one the worker uses (and removes) its own.
+async function runWorker() {
+  // Anything printed by libraries must not corrupt the protocol stream
+  console.log = console.error;
+
+  const pooledProfile = process.env.SCAN_PROFILE_DIR;
+  const userDataDir = pooledProfile || path.join(tempDir, `worker_${process.pid}`);
+  let chrome = null;
+  let browser = null;
+
+  const ensureBrowser = async () => {
+    if (browser && browser.isConnected()) return;
+    await closeBrowser();
+    chrome = await chromeLauncher.launch({
+      chromeFlags: [
+        '--headless',
+        '--no-sandbox',
+        '--disable-gpu',
+        `--user-data-dir=${userDataDir}`
+      ]
+    });
+    browser = await puppeteer.connect({ browserURL: `http://127.0.0.1:${chrome.port}` });
+  };
+
+  const closeBrowser = async () => {
+    if (browser) await browser.disconnect().catch(() => {});
+    if (chrome) await chrome.kill().catch(() => {});
+    browser = null;
+    chrome = null;
+  };
+
+  const respond = (message) => {
+    message.rss = process.memoryUsage().rss;
+    process.stdout.write(JSON.stringify(message) + '\n');
+  };
+
+  const shutdown = async () => {
+    await closeBrowser();
+    if (!pooledProfile) removeDir(userDataDir);
+    process.exit(0);
+  };
+  process.on('SIGTERM', shutdown);
+
+  const rl = readline.createInterface({ input: process.stdin });
+  for await (const line of rl) {
+    if (!line.trim()) continue;
+    let request;
+    try {
+      request = JSON.parse(line);
+    } catch (err) {
+      respond({ id: null, ok: false, error: `Invalid request: ${err.message}` });
+      continue;
+    }
+
+    if (request.type === 'ping') {
+      respond({ id: request.id, ok: true, pong: true });
+      continue;
+    }
+
+    try {
+      // Per-phase wall time in ms, reported back for the pool's metrics
+      const timings = {};
+      let started = Date.now();
+      const lap = (phase) => {
+        const now = Date.now();
+        timings[phase] = now - started;
+        started = now;
+      };
+      await ensureBrowser();
+      lap('chrome');
+      // Run sequentially to prevent resource contention
+      const lighthouseResults = await runLighthouseScan(request.url, chrome);
+      lap('lighthouse');
+      const axeResults = await runAxeScan(request.url, browser);
+      lap('axe');
+      const result = request.full
+        ? { lighthouse: lighthouseResults, axe: axeResults }
+        : summarizeResults(lighthouseResults, axeResults);
+      lap('summarize');
+      respond({ id: request.id, ok: true, result, timings });
+    } catch (err) {
+      // Start from a fresh Chrome next time in case this one is wedged
+      await closeBrowser();
+      respond({ id: request.id, ok: false, error: err.message });
+    }
   }
+
+  // stdin closed: the pool is retiring this worker
+  await shutdown();
 }
 
 // MAIN RUNNER
-if (require.main === module) {
+if (require.main === module && process.argv[2] === '--worker') {
+  runWorker().catch((err) => {
+    console.error("Worker crashed:", err.message);
+    process.exit(1);
+  });
+} else if (require.main === module) {
   const url = process.argv[2];
   if (!url) {
     console.error("No URL provided.");
@@ -114,5 +263,6 @@ async function scanUrl(url) {
 module.exports = {
   runLighthouseScan,
   runAxeScan,
-  scanUrl
+  scanUrl,
+  summarizeResults
 };
\ No newline at end of file
@@ -0,0 +1,176 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from services.metrics import registry
+from services.scan_workers import NODE_WORKERS
+
+# Admission control for scans. Each scan holds a Node worker and two headless Chromes, so the
+# number running at once is capped by memory (SCAN_MEMORY_MB each, keeping SCAN_MEMORY_RESERVE_MB
+# free) and paused while the 1-minute load average per CPU is above SCAN_MAX_LOAD. Scans past the
+# cap wait for a slot; API requests past SCAN_QUEUE_DEPTH waiting scans are rejected up front
+# with 429 and a Retry-After estimated from recent scan durations.
+SCAN_MAX_CONCURRENT = int(os.environ.get('SCAN_MAX_CONCURRENT', NODE_WORKERS))
+SCAN_MEMORY_MB = int(os.environ.get('SCAN_MEMORY_MB', 700))
+SCAN_MEMORY_RESERVE_MB = int(os.environ.get('SCAN_MEMORY_RESERVE_MB', 512))
+SCAN_MAX_LOAD = float(os.environ.get('SCAN_MAX_LOAD', 2.0))
+SCAN_QUEUE_DEPTH = int(os.environ.get('SCAN_QUEUE_DEPTH', 20))
+# Resource readings are reused for this long
+ADMISSION_SAMPLE_SECONDS = 1.0
+# Scan duration assumed before any scan has finished
+DEFAULT_SCAN_SECONDS = 30.0
+MAX_RETRY_AFTER = 600
+
+scan_admission_total = registry.counter(
+    'webable_scan_admission_total',
+    'Scan admission decisions: accepted/rejected (429) API requests, started/queued scans (queued waited for a slot)',
+    ('decision',))
+
+
+class ScanRejected(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Scan capacity exhausted, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def available_memory():
+    # Bytes available to new processes: MemAvailable, or the cgroup headroom when that is smaller
+    available = None
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    available = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    try:
+        with open('/sys/fs/cgroup/memory.max') as f:
+            limit = f.read().strip()
+        if limit != 'max':
+            with open('/sys/fs/cgroup/memory.current') as f:
+                headroom = int(limit) - int(f.read().strip())
+            available = headroom if available is None else min(available, headroom)
+    except (OSError, ValueError):
+        pass
+    return available
+
+
+def load_per_cpu():
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (OSError, AttributeError):
+        return None
+
+
+class ScanGovernor:
+    def __init__(self, max_concurrent=SCAN_MAX_CONCURRENT, memory_per_scan_mb=SCAN_MEMORY_MB,
+                 reserve_mb=SCAN_MEMORY_RESERVE_MB, max_load=SCAN_MAX_LOAD, queue_depth=SCAN_QUEUE_DEPTH):
+        self.max_concurrent = max(1, max_concurrent)
+        self.memory_per_scan = memory_per_scan_mb * 1024 * 1024
+        self.reserve = reserve_mb * 1024 * 1024
+        self.max_load = max_load
+        self.queue_depth = queue_depth
+        self._cond = threading.Condition()
+        self.running = 0
+        self.waiting = 0
+        # Admitted API requests that have not finished yet (queued on the job queue or scanning)
+        self.outstanding = 0
+        self.avg_seconds = None
+        self._sample = (0.0, None, None)
+        self.limited_by = None
+
+    def _resources(self):
+        sampled, memory, load = self._sample
+        if time.monotonic() - sampled > ADMISSION_SAMPLE_SECONDS:
+            memory, load = available_memory(), load_per_cpu()
+            self._sample = (time.monotonic(), memory, load)
+        return memory, load
+
+    def capacity(self):
+        # Caller must hold self._cond. Running scans already show up in the memory reading.
+        memory, load = self._resources()
+        capacity, self.limited_by = self.max_concurrent, 'max_concurrent'
+        if memory is not None:
+            by_memory = self.running + int(max(memory - self.reserve, 0) // self.memory_per_scan)
+            if by_memory < capacity:
+                capacity, self.limited_by = by_memory, 'memory'
+        if load is not None and load > self.max_load and self.running < capacity:
+            # Overloaded: finish what is running before starting more
+            capacity, self.limited_by = self.running, 'load'
+        # Always let one scan through so the queue keeps moving
+        return max(capacity, 1)
+
+    def retry_after(self):
+        # Caller must hold self._cond
+        capacity = self.capacity()
+        # Admitted requests plus scans started outside the API (scheduler, crawls) that hold or wait for slots
+        ahead = max(max(self.outstanding, self.running + self.waiting) - capacity, 0) + 1
+        seconds = math.ceil(ahead / capacity * (self.avg_seconds or DEFAULT_SCAN_SECONDS))
+        return max(1, min(seconds, MAX_RETRY_AFTER))
+
+    def admit(self, count=1):
+        # Reserves room for count scans of an API request, or raises ScanRejected
+        with self._cond:
+            if self.outstanding + count > self.capacity() + self.queue_depth and self.outstanding > 0:
+                scan_admission_total.inc('rejected')
+                raise ScanRejected(self.retry_after())
+            self.outstanding += count
+        scan_admission_total.inc('accepted')
+
+    def release(self, count=1):
+        with self._cond:
+            self.outstanding = max(self.outstanding - count, 0)
+
+    def admitted(self, func, count=1):
+        # Wraps a job so its admission is released once it finishes
+        def run(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.release(count)
+        return run
+
+    @contextmanager
+    def slot(self):
+        # Held around one scan; waits while the cap is reached
+        with self._cond:
+            if self.running < self.capacity():
+                scan_admission_total.inc('started')
+            else:
+                scan_admission_total.inc('queued')
+                self.waiting += 1
+                try:
+                    while self.running >= self.capacity():
+                        # Re-check resources now and then even when nothing finishes
+                        self._cond.wait(ADMISSION_SAMPLE_SECONDS)
+                finally:
+                    self.waiting -= 1
+            self.running += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            with self._cond:
+                self.running -= 1
+                self.avg_seconds = elapsed if self.avg_seconds is None else 0.8 * self.avg_seconds + 0.2 * elapsed
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            capacity = self.capacity()
+            memory, load = self._sample[1], self._sample[2]
+            return {
+                "capacity": capacity, "limitedBy": self.limited_by, "running": self.running,
+                "waiting": self.waiting, "outstanding": self.outstanding, "queueDepth": self.queue_depth,
+                "maxConcurrent": self.max_concurrent, "memoryPerScanMB": self.memory_per_scan // (1024 * 1024),
+                "availableMemoryMB": memory // (1024 * 1024) if memory is not None else None,
+                "loadPerCpu": round(load, 2) if load is not None else None,
+                "avgScanSeconds": round(self.avg_seconds, 1) if self.avg_seconds is not None else None,
+            }
+
+
+scan_governor = ScanGovernor()
@@ -0,0 +1,161 @@
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request, make_response
+
+from services.db import collection, is_db_connected
+
+# Upper bound on entry age even without writes (e.g. a demo fallback served during an outage)
+ANALYTICS_CACHE_TTL = int(os.environ.get('ANALYTICS_CACHE_TTL', 300))
+# Share the data generation across processes through Mongo instead of keeping it in-process
+ANALYTICS_CACHE_SHARED = os.environ.get('ANALYTICS_CACHE_SHARED', 'false').lower() == 'true'
+# With a shared generation, each process re-reads it at most this often (bounds cross-process staleness)
+ANALYTICS_GENERATION_POLL = float(os.environ.get('ANALYTICS_GENERATION_POLL', 1))
+# Least recently used responses are evicted past this many entries
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.environ.get('ANALYTICS_CACHE_MAX_ENTRIES', 256))
+
+GENERATION_ID = "analytics_generation"
+
+
+class AnalyticsCache:
+    # Responses keyed by endpoint + query parameters and tagged with the data generation they
+    # were computed at. Every scan/delete/retention write bumps the generation, which makes
+    # all older entries stale without having to know which endpoints a write affects.
+    # Only the query parameters a view declares are part of the key, and the entry count is
+    # capped, so clients cannot grow the cache by varying the query string.
+    def __init__(self, shared=ANALYTICS_CACHE_SHARED, ttl=ANALYTICS_CACHE_TTL, max_entries=ANALYTICS_CACHE_MAX_ENTRIES):
+        self.shared = shared
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._counters = collection("counters")
+        self._generation = 0
+        self._generation_read = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats_counters = {"hits": 0, "misses": 0, "notModified": 0, "invalidations": 0, "bypassed": 0,
+                               "evicted": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats_counters[name] += 1
+
+    def generation(self):
+        if not self.shared:
+            return self._generation
+        now = time.monotonic()
+        if now - self._generation_read >= ANALYTICS_GENERATION_POLL:
+            try:
+                doc = self._counters.find_one({"_id": GENERATION_ID})
+                self._generation = doc["value"] if doc else 0
+            except Exception as e:
+                print(f"Unable to read analytics generation: {str(e)}")
+            self._generation_read = now
+        return self._generation
+
+    def bump(self):
+        # Called by every write path that changes what the analytics endpoints return
+        self._count("invalidations")
+        with self._lock:
+            self._generation += 1
+        if self.shared:
+            try:
+                self._counters.update_one({"_id": GENERATION_ID}, {"$inc": {"value": 1}}, upsert=True)
+            except Exception as e:
+                print(f"Unable to bump analytics generation: {str(e)}")
+            self._generation_read = 0
+
+    def _lookup(self, key, generation):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["generation"] != generation or time.monotonic() - entry["stored"] >= self.ttl:
+                # Superseded or expired: it can never be served again
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry):
+        with self._lock:
+            if self._entries and next(reversed(self._entries.values()))["generation"] != entry["generation"]:
+                # First entry of a new generation: everything older is dead weight
+                for stale in [k for k, e in self._entries.items() if e["generation"] != entry["generation"]]:
+                    del self._entries[stale]
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats_counters["evicted"] += 1
+
+    def _respond(self, entry, hit):
+        response = make_response(entry["body"], entry["status"])
+        response.mimetype = 'application/json'
+        response.set_etag(entry["etag"])
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Analytics-Cache"] = "hit" if hit else "miss"
+        if entry.get("source"):
+            response.headers["X-Analytics-Source"] = entry["source"]
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            self._count("notModified")
+        return response
+
+    def cached(self, *params):
+        # @analytics_cache.cached('period') -- params are the query parameters the view reads
+        def decorator(view):
+            return self._wrap(view, params)
+        return decorator
+
+    def _wrap(self, view, params):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.endpoint, tuple(sorted(kwargs.items())), tuple(request.args.get(name) for name in params))
+            generation = self.generation()
+            entry = self._lookup(key, generation)
+            if entry:
+                self._count("hits")
+                return self._respond(entry, hit=True)
+
+            self._count("misses")
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or not is_db_connected():
+                # Never pin demo/fallback data or errors in the cache
+                self._count("bypassed")
+                return response
+
+            body = response.get_data()
+            entry = {
+                "generation": generation,
+                "stored": time.monotonic(),
+                "status": response.status_code,
+                "body": body,
+                "etag": f"{generation}-{hashlib.sha1(body).hexdigest()[:16]}",
+                "source": response.headers.get("X-Analytics-Source"),
+            }
+            self._store(key, entry)
+            return self._respond(entry, hit=False)
+        return wrapper
+
+    def stats(self):
+        now = time.monotonic()
+        generation = self.generation()
+        with self._lock:
+            stats = dict(self.stats_counters)
+            entries = list(self._entries.values())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hitRate"] = round(stats["hits"] / lookups, 3) if lookups else 0
+        stats["generation"] = generation
+        stats["shared"] = self.shared
+        stats["entries"] = len(entries)
+        stats["maxEntries"] = self.max_entries
+        stats["staleEntries"] = sum(1 for e in entries if e["generation"] != generation)
+        stats["oldestEntryAge"] = round(max((now - e["stored"] for e in entries), default=0), 1)
+        return stats
+
+
+analytics_cache = AnalyticsCache()
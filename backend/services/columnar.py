@@ -0,0 +1,414 @@
+import calendar
+import os
+import threading
+import time
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # the engine is disabled and analytics fall back to the demo data
+    np = None
+
+from services.issue_index import get_issue_category
+from services.retention import archived_days
+
+# In-process columnar copy of the analytics inputs: one row per scored history snapshot
+# (timestamp, score, URL code, weight) plus per-URL latest state and the issue-id codes of each URL's
+# latest scan. Overview, trends and issues are a handful of vectorized passes over it.
+#
+#   COLUMNAR_ANALYTICS=off       never load it
+#   COLUMNAR_ANALYTICS=fallback  answer analytics from it only when Mongo is unreachable or a query fails (default)
+#   COLUMNAR_ANALYTICS=serve     answer analytics from it whenever it is loaded (Mongo stays the source of truth)
+COLUMNAR_MODE = os.environ.get('COLUMNAR_ANALYTICS', 'fallback').lower()
+COLUMNAR_LOAD_BATCH = int(os.environ.get('COLUMNAR_LOAD_BATCH', 5000))
+# Writes that land while a load reads the collections make it start over, at most this often
+COLUMNAR_LOAD_ATTEMPTS = 3
+RECURRING_LIMIT = 10
+
+
+def _timestamp(date):
+    # Naive datetimes are stored (and bucketed by Mongo) as UTC
+    return calendar.timegm(date.utctimetuple()) if isinstance(date, datetime) else None
+
+
+def _number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def _grow(array, size, fill):
+    if size <= array.size:
+        return array
+    grown = np.full(max(size, array.size * 2, 1024), fill, array.dtype)
+    grown[:array.size] = array
+    return grown
+
+
+class _Store:
+    def __init__(self):
+        # History rows (only snapshots with a score, like the rollups). Days that retention pruned
+        # are one row each: the day's mean score weighted by its snapshot count, with URL code -1.
+        self.rows = 0
+        self.row_ts = np.zeros(0, np.int64)
+        self.row_score = np.zeros(0, np.float64)
+        self.row_url = np.zeros(0, np.int32)
+        self.row_weight = np.zeros(0, np.float64)
+        # Per URL code: the scans document (score, completed) and the url_summaries view
+        # (latest/previous scored snapshot)
+        self.url_codes = {}
+        self.score = np.zeros(0, np.float64)
+        self.completed = np.zeros(0, bool)
+        self.latest = np.zeros(0, np.float64)
+        self.previous = np.zeros(0, np.float64)
+        self.latest_ts = np.zeros(0, np.int64)
+        self.url_issues = []
+        # Per issue code: active count (URLs whose latest completed scan has it), title, category
+        self.issue_codes = {}
+        self.issue_ids = []
+        self.issue_titles = []
+        self.issue_category = np.zeros(0, np.int32)
+        self.active = np.zeros(0, np.int64)
+        self.category_codes = {}
+        self.categories = []
+
+    # ---- codes ----
+
+    def url_code(self, url):
+        code = self.url_codes.get(url)
+        if code is None:
+            code = self.url_codes[url] = len(self.url_codes)
+            self.score = _grow(self.score, code + 1, np.nan)
+            self.completed = _grow(self.completed, code + 1, False)
+            self.latest = _grow(self.latest, code + 1, np.nan)
+            self.previous = _grow(self.previous, code + 1, np.nan)
+            self.latest_ts = _grow(self.latest_ts, code + 1, -1)
+            self.url_issues.append(None)
+        return code
+
+    def issue_code(self, issue):
+        issue_id = issue.get('id')
+        code = self.issue_codes.get(issue_id)
+        if code is None:
+            code = self.issue_codes[issue_id] = len(self.issue_ids)
+            self.issue_ids.append(issue_id)
+            self.issue_titles.append(None)
+            self.issue_category = _grow(self.issue_category, code + 1, 0)
+            self.active = _grow(self.active, code + 1, 0)
+        category = issue.get('category') or get_issue_category(issue_id)
+        if category not in self.category_codes:
+            self.category_codes[category] = len(self.categories)
+            self.categories.append(category)
+        # Last write wins, as with the $set in record_issues
+        self.issue_titles[code] = issue.get('title')
+        self.issue_category[code] = self.category_codes[category]
+        return code
+
+    # ---- writes ----
+
+    def append_rows(self, ts, scores, urls, weights=1):
+        size = self.rows + len(ts)
+        self.row_ts = _grow(self.row_ts, size, 0)
+        self.row_score = _grow(self.row_score, size, 0)
+        self.row_url = _grow(self.row_url, size, 0)
+        self.row_weight = _grow(self.row_weight, size, 0)
+        self.row_ts[self.rows:size] = ts
+        self.row_score[self.rows:size] = scores
+        self.row_url[self.rows:size] = urls
+        self.row_weight[self.rows:size] = weights
+        self.rows = size
+
+    def set_issues(self, code, issues):
+        old = self.url_issues[code]
+        if old is not None:
+            np.subtract.at(self.active, old, 1)
+        new = None
+        if issues is not None:
+            new = np.unique(np.array([self.issue_code(issue) for issue in issues if issue.get('id')], np.int64))
+            np.add.at(self.active, new, 1)
+        self.url_issues[code] = new
+
+    def record(self, entries):
+        # entries: [(url, date, score, issues)] for completed scans just written
+        ts, scores, urls = [], [], []
+        for url, date, score, issues in entries:
+            code = self.url_code(url)
+            stamp = _timestamp(date)
+            self.score[code] = np.nan if score is None else score
+            self.completed[code] = True
+            if score is not None and stamp is not None:
+                ts.append(stamp)
+                scores.append(score)
+                urls.append(code)
+                self.previous[code] = self.latest[code]
+                self.latest[code] = score
+                self.latest_ts[code] = stamp
+            self.set_issues(code, issues or [])
+        if ts:
+            self.append_rows(ts, scores, urls)
+
+    def remove(self, urls):
+        # History rows stay: deleted scans stay in the trend buckets, as with the rollups
+        for url in urls:
+            code = self.url_codes.get(url)
+            if code is None:
+                continue
+            self.score[code] = self.latest[code] = self.previous[code] = np.nan
+            self.completed[code] = False
+            self.latest_ts[code] = -1
+            self.set_issues(code, None)
+
+    # ---- reads ----
+
+    def overview(self):
+        n = len(self.url_codes)
+        score = self.score[:n]
+        scored = self.completed[:n] & ~np.isnan(score)
+        total = int(scored.sum())
+        if not total:
+            return {"totalScans": 0, "averageScore": 0, "bestScore": 0, "worstScore": 0,
+                    "latestScore": 0, "improvements": 0, "regressions": 0, "isDemo": False}
+
+        latest, previous = self.latest[:n], self.previous[:n]
+        summarized = self.latest_ts[:n] >= 0
+        compared = summarized & ~np.isnan(previous)
+        result = {
+            "totalScans": total,
+            "averageScore": round(float(score[scored].mean()), 1),
+            "bestScore": 0, "worstScore": 0, "latestScore": 0,
+            "improvements": int((latest[compared] > previous[compared]).sum()),
+            "regressions": int((latest[compared] < previous[compared]).sum()),
+            "isDemo": False
+        }
+        if summarized.any():
+            values = latest[summarized]
+            result["bestScore"] = _number(values.max())
+            result["worstScore"] = _number(values.min())
+            result["latestScore"] = _number(values[np.argmax(self.latest_ts[:n][summarized])])
+        return result
+
+    def trend(self, period):
+        if not self.rows:
+            return {"labels": [], "scores": []}
+        ts = self.row_ts[:self.rows]
+        days = ts // 86400
+        if period == 'monthly':
+            keys = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        elif period == 'weekly':
+            # Calendar year with the ISO week number, like bucket_label (the Thursday of a
+            # date's week decides which year its week number counts from)
+            thursday = days - (days + 3) % 7 + 3
+            iso_year_start = thursday.astype('datetime64[D]').astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+            year = days.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+            keys = year * 100 + (thursday - iso_year_start) // 7 + 1
+        else:
+            keys = days
+
+        buckets, inverse = np.unique(keys, return_inverse=True)
+        weights = self.row_weight[:self.rows]
+        sums = np.bincount(inverse, weights=self.row_score[:self.rows] * weights, minlength=buckets.size)
+        counts = np.bincount(inverse, weights=weights, minlength=buckets.size)
+        starts = np.full(buckets.size, np.iinfo(np.int64).max, np.int64)
+        np.minimum.at(starts, inverse, ts)
+        order = np.argsort(starts, kind='stable')
+
+        if period == 'monthly':
+            labels = np.datetime_as_string(buckets.astype('datetime64[M]'))
+        elif period == 'weekly':
+            labels = [f"{key // 100}-W{key % 100:02d}" for key in buckets.tolist()]
+        else:
+            labels = np.datetime_as_string(buckets.astype('datetime64[D]'))
+        return {
+            "labels": [str(labels[i]) for i in order],
+            "scores": [round(float(sums[i] / counts[i]), 1) for i in order]
+        }
+
+    def issues(self):
+        n = len(self.url_codes)
+        total = int(self.completed[:n].sum()) or 1
+        active = self.active[:len(self.issue_ids)]
+        present = np.flatnonzero(active > 0)
+        top = present[np.argsort(-active[present], kind='stable')][:RECURRING_LIMIT]
+        recurring = [{
+            "id": self.issue_ids[code],
+            "title": self.issue_titles[code] or self.issue_ids[code],
+            "count": int(active[code]),
+            "frequency": round((int(active[code]) / total) * 100, 1)
+        } for code in top.tolist()]
+
+        per_category = np.bincount(self.issue_category[:len(self.issue_ids)], weights=active,
+                                   minlength=len(self.categories))
+        distribution = [
+            {"category": self.categories[code], "count": int(per_category[code])}
+            for code in np.argsort(-per_category, kind='stable').tolist() if per_category[code] > 0
+        ]
+        return {"recurringIssues": recurring, "distribution": distribution}
+
+    def nbytes(self):
+        arrays = (self.row_ts, self.row_score, self.row_url, self.row_weight, self.score, self.completed, self.latest,
+                  self.previous, self.latest_ts, self.issue_category, self.active)
+        return sum(a.nbytes for a in arrays) + sum(a.nbytes for a in self.url_issues if a is not None)
+
+
+def _load_store(scans, history, batch_size, archive=None):
+    store = _Store()
+    ts, scores, urls = [], [], []
+    for snapshot in history.find({}, {"_id": 0, "url": 1, "date": 1, "results.score": 1}).batch_size(batch_size):
+        score = (snapshot.get("results") or {}).get("score")
+        stamp = _timestamp(snapshot.get("date"))
+        if score is None or stamp is None or not snapshot.get("url"):
+            continue
+        ts.append(stamp)
+        scores.append(score)
+        urls.append(store.url_code(snapshot["url"]))
+        if len(ts) >= batch_size:
+            store.append_rows(ts, scores, urls)
+            ts, scores, urls = [], [], []
+    if ts:
+        store.append_rows(ts, scores, urls)
+
+    # Latest and previous scored snapshot per URL: sort by (url, time) and take each run's last two
+    if store.rows:
+        row_url, row_ts, row_score = store.row_url[:store.rows], store.row_ts[:store.rows], store.row_score[:store.rows]
+        order = np.lexsort((row_ts, row_url))
+        sorted_urls = row_url[order]
+        last = np.flatnonzero(np.append(sorted_urls[1:] != sorted_urls[:-1], True))
+        store.latest[sorted_urls[last]] = row_score[order[last]]
+        store.latest_ts[sorted_urls[last]] = row_ts[order[last]]
+        has_previous = last[(last > 0)]
+        has_previous = has_previous[sorted_urls[has_previous - 1] == sorted_urls[has_previous]]
+        store.previous[sorted_urls[has_previous]] = row_score[order[has_previous - 1]]
+
+    # Pruned days only count towards the trends, so they go in after the per-URL pass
+    if archive is not None:
+        days = [(_timestamp(day["date"]), day["sum"] / day["count"], day["count"]) for day in archived_days(archive)]
+        if days:
+            ts, scores, weights = zip(*days)
+            store.append_rows(ts, scores, -1, weights)
+
+    projection = {"_id": 0, "url": 1, "status": 1, "results.score": 1,
+                  "results.issues.id": 1, "results.issues.title": 1, "results.issues.category": 1}
+    for scan in scans.find({}, projection).batch_size(batch_size):
+        if not scan.get("url"):
+            continue
+        code = store.url_code(scan["url"])
+        results = scan.get("results") or {}
+        completed = scan.get("status") == "completed"
+        store.completed[code] = completed
+        store.score[code] = np.nan if results.get("score") is None else results["score"]
+        if completed:
+            store.set_issues(code, results.get("issues") or [])
+    return store
+
+
+class ColumnarAnalytics:
+    def __init__(self, mode=COLUMNAR_MODE, batch_size=COLUMNAR_LOAD_BATCH):
+        self.mode = mode if np is not None else 'off'
+        self.batch_size = batch_size
+        self._store = None
+        self._lock = threading.Lock()
+        self._loading = False
+        self._writes = 0
+        self.loaded_at = None
+        self.load_seconds = None
+        self.served = 0
+
+    def enabled(self):
+        return self.mode != 'off'
+
+    def ready(self):
+        return self._store is not None
+
+    def serves(self, db_connected=True):
+        # Whether an analytics request should be answered from the snapshot
+        return self.ready() and (self.mode == 'serve' or not db_connected)
+
+    def load(self, scans, history, archive=None):
+        # Reads the collections once; writes recorded meanwhile are not in the cursor results
+        # for certain, so the load starts over when any happened
+        if not self.enabled():
+            return False
+        start = time.perf_counter()
+        with self._lock:
+            self._loading = True
+        try:
+            for attempt in range(COLUMNAR_LOAD_ATTEMPTS):
+                writes = self._writes
+                store = _load_store(scans, history, self.batch_size, archive)
+                with self._lock:
+                    if self._writes == writes or attempt == COLUMNAR_LOAD_ATTEMPTS - 1:
+                        if self._writes != writes:
+                            print("Columnar analytics loaded while scans were being written; it may lag until the next load")
+                        self._store = store
+                        break
+        finally:
+            with self._lock:
+                self._loading = False
+        self.loaded_at = datetime.now()
+        self.load_seconds = time.perf_counter() - start
+        print(f"Columnar analytics loaded {store.rows} snapshots for {len(store.url_codes)} URLs in {self.load_seconds:.2f}s")
+        return True
+
+    def record(self, entries):
+        with self._lock:
+            self._writes += 1
+            if self._store is not None:
+                self._store.record(entries)
+
+    def remove(self, urls):
+        with self._lock:
+            self._writes += 1
+            if self._store is not None:
+                self._store.remove(urls)
+
+    def _read(self, method, *args):
+        with self._lock:
+            self.served += 1
+            return getattr(self._store, method)(*args)
+
+    def overview(self):
+        return self._read('overview')
+
+    def trend(self, period):
+        return self._read('trend', period)
+
+    def issues(self):
+        return self._read('issues')
+
+    def stats(self):
+        with self._lock:
+            store = self._store
+            return {
+                "mode": self.mode, "ready": store is not None, "loading": self._loading,
+                "snapshots": store.rows if store else 0, "urls": len(store.url_codes) if store else 0,
+                "issues": len(store.issue_ids) if store else 0, "bytes": store.nbytes() if store else 0,
+                "loadedAt": self.loaded_at.isoformat() if self.loaded_at else None,
+                "loadSeconds": self.load_seconds, "served": self.served
+            }
+
+
+def _tied_recurring(issues):
+    # Issues tied at the cut-off count can legitimately differ between engines
+    recurring = issues["recurringIssues"]
+    cutoff = recurring[-1]["count"] if len(recurring) == RECURRING_LIMIT else 0
+    return sorted((i["id"], i["count"], i["frequency"]) for i in recurring if i["count"] > cutoff), [i["count"] for i in recurring]
+
+
+def compare_analytics(name, expected, actual, tolerance=0.05):
+    # Differences between a Mongo-served response and the columnar one, as readable strings
+    if name == 'issues':
+        mismatches = []
+        if _tied_recurring(expected) != _tied_recurring(actual):
+            mismatches.append(f"issues recurring: {expected['recurringIssues']} != {actual['recurringIssues']}")
+        if sorted(map(tuple, (d.values() for d in expected["distribution"]))) != sorted(map(tuple, (d.values() for d in actual["distribution"]))):
+            mismatches.append(f"issues distribution: {expected['distribution']} != {actual['distribution']}")
+        return mismatches
+    if name.startswith('trend'):
+        if expected["labels"] != actual["labels"]:
+            return [f"{name} labels: {expected['labels']} != {actual['labels']}"]
+        return [f"{name} {label}: {a} != {b}" for label, a, b in zip(expected["labels"], expected["scores"], actual["scores"])
+                if abs(a - b) > tolerance]
+    return [f"{name} {key}: {expected[key]} != {actual.get(key)}" for key in expected
+            if not isinstance(expected[key], bool) and abs(expected[key] - actual.get(key, 0)) > tolerance]
+
+
+columnar = ColumnarAnalytics()
@@ -0,0 +1,212 @@
+import os
+import threading
+import urllib.request
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+from services.scan_cache import canonicalize_url
+
+CRAWL_MAX_PAGES = int(os.environ.get('CRAWL_MAX_PAGES', 50))
+CRAWL_PER_HOST_CONCURRENCY = int(os.environ.get('CRAWL_PER_HOST_CONCURRENCY', 2))
+CRAWL_FETCH_TIMEOUT = 10
+# Sitemap indexes can nest; stop following them after this many files
+CRAWL_MAX_SITEMAPS = 10
+
+# Links to these are never pages worth auditing
+SKIPPED_EXTENSIONS = (
+    '.pdf', '.zip', '.gz', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.ico',
+    '.css', '.js', '.json', '.xml', '.txt', '.mp3', '.mp4', '.webm', '.woff', '.woff2'
+)
+
+
+def fetch_url(url, timeout=CRAWL_FETCH_TIMEOUT):
+    # Returns (status, content_type, body bytes); the crawler only needs HTML and sitemaps
+    request = urllib.request.Request(url, headers={"User-Agent": "WebAble-Crawler/1.0"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.headers.get('Content-Type', ''), response.read()
+    except Exception as e:
+        print(f"Crawler fetch failed for {url}: {str(e)}")
+        return None, '', b''
+
+
+class _LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(href)
+
+
+def extract_links(base_url, html):
+    parser = _LinkParser()
+    try:
+        parser.feed(html)
+    except Exception:
+        pass
+    return [urljoin(base_url, href) for href in parser.links]
+
+
+def parse_sitemap(xml_bytes):
+    # Returns (page_urls, nested_sitemap_urls) from a <urlset> or <sitemapindex>
+    try:
+        root = ET.fromstring(xml_bytes)
+    except ET.ParseError:
+        return [], []
+    locs = [el.text.strip() for el in root.iter() if el.tag.endswith('loc') and el.text]
+    if root.tag.endswith('sitemapindex'):
+        return [], locs
+    return locs, []
+
+
+def aggregate_site_results(root_url, pages):
+    # Site-level summary: mean and worst score plus issue counts combined across pages
+    scanned = [p for p in pages if p.get("status") == "completed"]
+    scores = [p["score"] for p in scanned if isinstance(p.get("score"), (int, float))]
+    severity = {'critical': 0, 'serious': 0, 'moderate': 0, 'minor': 0}
+    issues = {}
+
+    for page in scanned:
+        for level, count in (page.get("issuesBySeverity") or {}).items():
+            if level in severity:
+                severity[level] += count
+        for issue in page.get("issues") or []:
+            entry = issues.setdefault(issue.get("id"), {
+                "id": issue.get("id"), "title": issue.get("title"), "impact": issue.get("impact"),
+                "pages": 0, "elements": 0
+            })
+            entry["pages"] += 1
+            entry["elements"] += len(issue.get("elementRefs") or issue.get("affectedElements") or [])
+
+    scored = [p for p in scanned if isinstance(p.get("score"), (int, float))]
+    worst_page = min(scored, key=lambda p: p["score"], default=None)
+    return {
+        "rootUrl": root_url,
+        "pagesScanned": len(scanned),
+        "pagesFailed": len(pages) - len(scanned),
+        "meanScore": round(sum(scores) / len(scores), 1) if scores else 0,
+        "worstScore": worst_page["score"] if worst_page else 0,
+        "worstPage": worst_page["url"] if worst_page else None,
+        "issuesBySeverity": severity,
+        "issues": sorted(issues.values(), key=lambda i: i["pages"], reverse=True),
+        "pages": [
+            {k: p.get(k) for k in ("id", "url", "status", "score", "error") if p.get(k) is not None}
+            for p in pages
+        ]
+    }
+
+
+class SiteCrawler:
+    def __init__(self, root_url, max_pages=CRAWL_MAX_PAGES, per_host_concurrency=CRAWL_PER_HOST_CONCURRENCY,
+                 fetch=fetch_url):
+        self.root_url = canonicalize_url(root_url)
+        self.origin = self._origin(self.root_url)
+        self.max_pages = max_pages
+        self.per_host_concurrency = per_host_concurrency
+        self.fetch = fetch
+        self.seen = set()
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _origin(url):
+        parts = urlsplit(url)
+        return parts.scheme, parts.netloc
+
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host_concurrency)
+            return self._host_limits[host]
+
+    def _fetch(self, url):
+        with self._host_slot(url):
+            return self.fetch(url)
+
+    def _accept(self, url):
+        # Same-origin http(s) pages only, each canonical URL at most once
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            return None
+        canonical = canonicalize_url(url)
+        if self._origin(canonical) != self.origin:
+            return None
+        if urlsplit(canonical).path.lower().endswith(SKIPPED_EXTENSIONS):
+            return None
+        if canonical in self.seen:
+            return None
+        self.seen.add(canonical)
+        return canonical
+
+    def sitemap_urls(self):
+        scheme, netloc = self.origin
+        pending = deque([f"{scheme}://{netloc}/sitemap.xml"])
+        visited = set()
+        pages = []
+        while pending and len(visited) < CRAWL_MAX_SITEMAPS:
+            sitemap = pending.popleft()
+            if sitemap in visited:
+                continue
+            visited.add(sitemap)
+            status, _, body = self._fetch(sitemap)
+            if status != 200 or not body:
+                continue
+            locs, nested = parse_sitemap(body)
+            pages.extend(locs)
+            pending.extend(nested)
+        return pages
+
+    def discover(self):
+        # Yields pages to scan: the root and sitemap entries first, then a breadth-first walk of
+        # same-origin links. Each page is fetched before it is yielded, so 404s, broken links
+        # and non-HTML responses never reach the scanner or use up the page budget.
+        frontier = deque()
+        for url in [self.root_url] + self.sitemap_urls():
+            accepted = self._accept(url)
+            if accepted:
+                frontier.append(accepted)
+
+        found = 0
+        while frontier and found < self.max_pages:
+            page = frontier.popleft()
+            status, content_type, body = self._fetch(page)
+            if status != 200 or 'html' not in content_type.lower():
+                continue
+            found += 1
+            yield page
+            for link in extract_links(page, body.decode('utf-8', errors='replace')):
+                accepted = self._accept(link)
+                if accepted:
+                    frontier.append(accepted)
+
+    def _scan_page(self, scan_func, url):
+        with self._host_slot(url):
+            try:
+                payload = scan_func(url)
+                results = payload.get("results") or {}
+                return {
+                    "id": payload.get("id"), "url": url, "status": "completed",
+                    "score": results.get("score"), "issues": results.get("issues"),
+                    "issuesBySeverity": results.get("issuesBySeverity")
+                }
+            except Exception as e:
+                return {"url": url, "status": "failed", "error": str(e)}
+
+    def crawl(self, scan_func):
+        # scan_func(url) returns the same payload as a single scan (with a "results" key).
+        # Pages are scanned while discovery is still running.
+        pages = []
+        workers = max(1, self.per_host_concurrency)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crawl-scan") as executor:
+            futures = [executor.submit(self._scan_page, scan_func, url) for url in self.discover()]
+            for future in as_completed(futures):
+                pages.append(future.result())
+        return aggregate_site_results(self.root_url, pages)
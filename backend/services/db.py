@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+
+import certifi
+import pymongo
+from pymongo import monitoring
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+DB_NAME = os.environ.get('MONGO_DB_NAME', "accessibility_analyzer")
+
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+# pymongo's monitor heartbeats every server at this interval; health state is read from it
+MONGO_HEARTBEAT_MS = int(os.environ.get('MONGO_HEARTBEAT_MS', 5000))
+# A health state older than this (no heartbeat seen) is refreshed with one ping
+MONGO_HEALTH_TTL = float(os.environ.get('MONGO_HEALTH_TTL', 15))
+
+
+class _HealthMonitor(monitoring.ServerHeartbeatListener):
+    # Tracks the last heartbeat outcome per server; the database is up if any server answered
+    def __init__(self):
+        self._servers = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event.connection_id, True)
+
+    def failed(self, event):
+        self._record(event.connection_id, False)
+
+    def _record(self, address, healthy):
+        with self._lock:
+            self._servers[address] = (healthy, time.monotonic())
+
+    def state(self, ttl):
+        # Returns True/False from fresh heartbeats, or None when there is nothing recent
+        now = time.monotonic()
+        with self._lock:
+            fresh = [healthy for healthy, seen in self._servers.values() if now - seen <= ttl]
+        if not fresh:
+            return None
+        return any(fresh)
+
+    def reset(self):
+        with self._lock:
+            self._servers.clear()
+
+
+class _PoolMonitor(monitoring.ConnectionPoolListener):
+    # Open and checked-out connections across this process's pools, for /metrics
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.wait_failures = 0
+        self._lock = threading.Lock()
+
+    def _add(self, name, delta):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def connection_created(self, event):
+        self._add("open", 1)
+
+    def connection_closed(self, event):
+        self._add("open", -1)
+
+    def connection_checked_out(self, event):
+        self._add("checked_out", 1)
+
+    def connection_checked_in(self, event):
+        self._add("checked_out", -1)
+
+    def connection_check_out_failed(self, event):
+        self._add("wait_failures", 1)
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def reset(self):
+        with self._lock:
+            self.open = self.checked_out = 0
+
+    def stats(self):
+        with self._lock:
+            return {"open": self.open, "checkedOut": self.checked_out, "checkoutFailures": self.wait_failures,
+                    "maxPoolSize": MONGO_MAX_POOL_SIZE}
+
+
+_monitor = _HealthMonitor()
+_pool_monitor = _PoolMonitor()
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+_connect_hooks = []
+
+
+def _create_client():
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "heartbeatFrequencyMS": MONGO_HEARTBEAT_MS,
+        "event_listeners": [_monitor, _pool_monitor],
+    }
+    if MONGO_URI.startswith('mongodb+srv://') or 'mongodb.net' in MONGO_URI:
+        options.update(tls=True, tlsCAFile=certifi.where())
+    return pymongo.MongoClient(MONGO_URI, **options)
+
+
+def get_client():
+    # One client (one pool) per process, created on first use. A client inherited
+    # across fork is never reused: the child builds its own.
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _lock:
+        if _client is None or _client_pid != pid:
+            _monitor.reset()
+            _pool_monitor.reset()
+            _client = _create_client()
+            _client_pid = pid
+            for hook in _connect_hooks:
+                threading.Thread(target=hook, daemon=True).start()
+    return _client
+
+
+def pool_stats():
+    return _pool_monitor.stats()
+
+
+def get_db():
+    return get_client()[DB_NAME]
+
+
+def on_connect(func):
+    # Runs func in the background each time a process creates its client (e.g. index setup)
+    _connect_hooks.append(func)
+    return func
+
+
+class LazyCollection:
+    # Module-level stand-in for a collection that resolves through get_client() on every use,
+    # so importing a module never opens connections before the server forks
+    def __init__(self, name):
+        self._name = name
+
+    @property
+    def name(self):
+        return self._name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self._name], attr)
+
+
+def collection(name):
+    return LazyCollection(name)
+
+
+def is_db_connected():
+    # Answered from the driver's heartbeat monitor; only pings when no recent heartbeat exists
+    state = _monitor.state(MONGO_HEALTH_TTL)
+    if state is not None:
+        return state
+    try:
+        get_client().admin.command('ping')
+        _monitor._record('ping', True)
+        return True
+    except Exception:
+        _monitor._record('ping', False)
+        return False
+
@@ -0,0 +1,111 @@
+import os
+import threading
+from collections import OrderedDict
+
+from services.issue_index import get_issue_category
+from services.snippets import snippet_fingerprint, truncate_snippet
+
+# Diffs of two snapshots never change (history is append-only), so they are cached by snapshot pair
+DIFF_CACHE_SIZE = int(os.environ.get('DIFF_CACHE_SIZE', 256))
+
+
+def element_refs(issue):
+    # Element fingerprints: stored elementRefs, or the same sha1 computed from inline html
+    # for scans saved before snippets were content-addressed
+    if "elementRefs" in issue:
+        return issue["elementRefs"] or []
+    return [snippet_fingerprint(truncate_snippet(html)) for html in issue.get("affectedElements") or []]
+
+
+def _issue_summary(issue, elements):
+    return {
+        "id": issue.get("id"), "title": issue.get("title"), "impact": issue.get("impact"),
+        "category": issue.get("category") or get_issue_category(issue.get("id")), "elements": elements
+    }
+
+
+def diff_issues(old_issues, new_issues):
+    # Issues are keyed by their axe rule id and elements by fingerprint, so this is one pass
+    # over each side with set operations per issue: O(issues + elements)
+    old = {issue.get("id"): issue for issue in old_issues or [] if issue.get("id")}
+    new = {issue.get("id"): issue for issue in new_issues or [] if issue.get("id")}
+    fixed, added, changed = [], [], []
+    unchanged = 0
+    for issue_id, issue in new.items():
+        new_refs = element_refs(issue)
+        if issue_id not in old:
+            added.append(_issue_summary(issue, new_refs))
+            continue
+        old_refs = set(element_refs(old[issue_id]))
+        new_set = set(new_refs)
+        if old_refs == new_set:
+            unchanged += 1
+            continue
+        changed.append(dict(_issue_summary(issue, len(new_set)),
+                            addedElements=[ref for ref in new_refs if ref not in old_refs],
+                            removedElements=[ref for ref in element_refs(old[issue_id]) if ref not in new_set]))
+    for issue_id, issue in old.items():
+        if issue_id not in new:
+            fixed.append(_issue_summary(issue, element_refs(issue)))
+
+    return {
+        "summary": {
+            "fixed": len(fixed), "new": len(added), "changed": len(changed), "unchanged": unchanged,
+            "elementsFixed": sum(len(i["elements"]) for i in fixed) + sum(len(i["removedElements"]) for i in changed),
+            "elementsNew": sum(len(i["elements"]) for i in added) + sum(len(i["addedElements"]) for i in changed),
+        },
+        "fixed": fixed, "new": added, "changed": changed
+    }
+
+
+def present_diff(diff, lookup=None):
+    # Copies a (possibly cached) diff for a response. Fixed/new issues carry element counts;
+    # with lookup (?expand=elements) every fingerprint list becomes [{ref, html}] from one query.
+    keys = ("elements", "addedElements", "removedElements")
+    html_by_ref = lookup({
+        ref for section in ("fixed", "new", "changed") for issue in diff[section]
+        for key in keys if isinstance(issue.get(key), list) for ref in issue[key]
+    }) if lookup else None
+
+    def present(issue):
+        issue = dict(issue)
+        for key in keys:
+            if not isinstance(issue.get(key), list):
+                continue
+            if html_by_ref is not None:
+                issue[key] = [{"ref": ref, "html": html_by_ref.get(ref, '')} for ref in issue[key]]
+            elif key == "elements":
+                issue[key] = len(issue[key])
+        return issue
+
+    return dict(diff, **{section: [present(issue) for issue in diff[section]] for section in ("fixed", "new", "changed")})
+
+
+class DiffCache:
+    def __init__(self, size=DIFF_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        diff = compute()
+        with self._lock:
+            self._entries[key] = diff
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return diff
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "size": self.size, "hits": self.hits, "misses": self.misses}
+
+
+diff_cache = DiffCache()
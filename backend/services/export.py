@@ -0,0 +1,183 @@
+import csv
+import io
+import os
+import re
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet exports are unavailable; NDJSON and CSV still work
+    pa = pq = None
+
+# Bulk export of scan results, read from a batched cursor and written out one batch at a time,
+# so memory stays flat however many rows match. Rows are flat records: one per scan, or one per
+# issue of each scan. source=latest reads the scans collection (one document per URL),
+# source=history every stored snapshot (downsampled snapshots have no issue rows).
+EXPORT_BATCH = int(os.environ.get('EXPORT_BATCH', 1000))
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORT_SOURCES = ('latest', 'history')
+
+SCAN_COLUMNS = ['id', 'snapshotId', 'url', 'original_url', 'date', 'status', 'score', 'performance',
+                'accessibility', 'bestPractices', 'seo', 'critical', 'serious', 'moderate', 'minor', 'issueCount']
+ISSUE_COLUMNS = ['id', 'snapshotId', 'url', 'date', 'score', 'issueId', 'title', 'impact', 'severity',
+                 'category', 'elements']
+EXPORT_ROWS = {'scan': SCAN_COLUMNS, 'issue': ISSUE_COLUMNS}
+
+# source -> (sort, index): every export walks a date-ordered index, so rows stream without a blocking
+# in-memory sort; the url prefix and date range are applied to that index scan
+EXPORT_ORDER = {
+    'latest': ([("date", 1), ("_id", 1)], "date_id_desc"),
+    'history': ([("date", 1), ("_id", 1)], "date_id_asc"),
+}
+
+EXPORT_PROJECTION = {"_id": 0, "id": 1, "scanId": 1, "snapshotId": 1, "url": 1, "original_url": 1, "date": 1,
+                     "status": 1, "results.score": 1, "results.metrics": 1, "results.issuesBySeverity": 1,
+                     "results.issueCount": 1, "results.issues.id": 1, "results.issues.title": 1,
+                     "results.issues.impact": 1, "results.issues.severity": 1, "results.issues.category": 1,
+                     "results.issues.elementRefs": 1, "results.issues.affectedElements": 1}
+
+
+class ExportRequest:
+    def __init__(self, fmt='ndjson', rows='scan', source='latest', url_prefix=None, since=None, until=None):
+        if fmt not in EXPORT_FORMATS and fmt != 'parquet':
+            raise ValueError(f"Unknown format: {fmt}. Allowed: {', '.join(EXPORT_FORMATS)}")
+        if rows not in EXPORT_ROWS:
+            raise ValueError(f"Unknown rows: {rows}. Allowed: {', '.join(EXPORT_ROWS)}")
+        if source not in EXPORT_SOURCES:
+            raise ValueError(f"Unknown source: {source}. Allowed: {', '.join(EXPORT_SOURCES)}")
+        self.format = fmt
+        self.rows = rows
+        self.source = source
+        self.url_prefix = url_prefix or None
+        self.since = datetime.fromisoformat(since) if isinstance(since, str) else since
+        self.until = datetime.fromisoformat(until) if isinstance(until, str) else until
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(args.get('format', 'ndjson'), args.get('rows', 'scan'), args.get('source', 'latest'),
+                   args.get('url_prefix'), args.get('since'), args.get('until'))
+
+    @property
+    def columns(self):
+        return EXPORT_ROWS[self.rows]
+
+    def query(self):
+        query = {}
+        if self.url_prefix:
+            query["url"] = {"$regex": "^" + re.escape(self.url_prefix)}
+        if self.since or self.until:
+            query["date"] = {}
+            if self.since: query["date"]["$gte"] = self.since
+            if self.until: query["date"]["$lt"] = self.until
+        return query
+
+    @property
+    def sort(self):
+        return EXPORT_ORDER[self.source][0]
+
+    @property
+    def hint(self):
+        return EXPORT_ORDER[self.source][1]
+
+    def filename(self, extension=None):
+        return f"webable-{self.source}-{self.rows}s-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{extension or self.format}"
+
+
+def read_batches(collection, export, batch_size=EXPORT_BATCH):
+    # Lists of at most batch_size documents, oldest first
+    cursor = (collection.find(export.query(), EXPORT_PROJECTION).sort(export.sort).hint(export.hint)
+              .batch_size(batch_size))
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def scan_row(doc):
+    results = doc.get("results") or {}
+    metrics = results.get("metrics") or {}
+    severity = results.get("issuesBySeverity") or {}
+    issues = results.get("issues")
+    return {
+        "id": doc.get("id") or doc.get("scanId"), "snapshotId": doc.get("snapshotId"), "url": doc.get("url"),
+        "original_url": doc.get("original_url"), "date": doc.get("date"), "status": doc.get("status"),
+        "score": results.get("score"), "performance": metrics.get("performance"),
+        "accessibility": metrics.get("accessibility"), "bestPractices": metrics.get("bestPractices"),
+        "seo": metrics.get("seo"), "critical": severity.get("critical"), "serious": severity.get("serious"),
+        "moderate": severity.get("moderate"), "minor": severity.get("minor"),
+        "issueCount": len(issues) if issues is not None else results.get("issueCount"),
+    }
+
+
+def issue_rows(doc):
+    results = doc.get("results") or {}
+    for issue in results.get("issues") or []:
+        yield {
+            "id": doc.get("id") or doc.get("scanId"), "snapshotId": doc.get("snapshotId"), "url": doc.get("url"),
+            "date": doc.get("date"), "score": results.get("score"), "issueId": issue.get("id"),
+            "title": issue.get("title"), "impact": issue.get("impact"), "severity": issue.get("severity"),
+            "category": issue.get("category"),
+            "elements": len(issue.get("elementRefs") or issue.get("affectedElements") or []),
+        }
+
+
+def export_rows(batch, rows):
+    if rows == 'scan':
+        return [scan_row(doc) for doc in batch]
+    return [row for doc in batch for row in issue_rows(doc)]
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def stream_export(collection, export, dumps, batch_size=EXPORT_BATCH):
+    # Encoded chunks, one per cursor batch; dumps(obj) -> bytes writes one NDJSON line
+    if export.format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=export.columns, extrasaction='ignore', lineterminator='\n')
+        writer.writeheader()
+        yield buffer.getvalue().encode()
+        for batch in read_batches(collection, export, batch_size):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows({k: _csv_value(v) for k, v in row.items()} for row in export_rows(batch, export.rows))
+            yield buffer.getvalue().encode()
+        return
+    for batch in read_batches(collection, export, batch_size):
+        rows = export_rows(batch, export.rows)
+        if rows:
+            yield b"\n".join(dumps(row) for row in rows) + b"\n"
+
+
+# ---- Parquet (generated offline by `flask export-parquet`) ----
+
+def parquet_schema(rows):
+    if pa is None:
+        return None
+    types = {"date": pa.timestamp('ms'), "score": pa.float64(), "performance": pa.float64(),
+             "accessibility": pa.float64(), "bestPractices": pa.float64(), "seo": pa.float64(),
+             "critical": pa.int64(), "serious": pa.int64(), "moderate": pa.int64(), "minor": pa.int64(),
+             "issueCount": pa.int64(), "elements": pa.int64()}
+    return pa.schema([(name, types.get(name, pa.string())) for name in EXPORT_ROWS[rows]])
+
+
+def write_parquet(collection, export, path, batch_size=EXPORT_BATCH):
+    # One row group per cursor batch; returns the number of rows written
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install -r requirements-optional.txt)")
+    schema = parquet_schema(export.rows)
+    written = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for batch in read_batches(collection, export, batch_size):
+            rows = export_rows(batch, export.rows)
+            if not rows:
+                continue
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            written += len(rows)
+    return written
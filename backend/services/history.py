@@ -0,0 +1,117 @@
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+# Bucket span hint for the time-series collection: scans of one URL are minutes to days apart
+HISTORY_GRANULARITY = os.environ.get('HISTORY_GRANULARITY', 'hours')
+HISTORY_MIGRATION_BATCH = int(os.environ.get('HISTORY_MIGRATION_BATCH', 500))
+
+
+def snapshot_document(scan_id, url, raw_url, date, results, snapshot_id=None):
+    return {
+        "snapshotId": snapshot_id or str(uuid.uuid4()), "scanId": scan_id, "url": url,
+        "original_url": raw_url, "date": date, "status": "completed", "results": results
+    }
+
+
+class ScanHistory:
+    # Every scan is appended to scan_history, a time-series collection (timeField date,
+    # metaField url) whose buckets group one URL's snapshots and are stored compressed.
+    # The scans collection keeps one "latest" document per URL pointing at its newest
+    # snapshot, so report lookups and lists never touch the history.
+    def __init__(self, collection, granularity=HISTORY_GRANULARITY):
+        self.collection = collection
+        self.granularity = granularity
+        self._ensured = False
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        # Must run before the first insert, which would otherwise create a plain collection
+        if self._ensured:
+            return
+        with self._lock:
+            if self._ensured:
+                return
+            db = self.collection.database
+            if self.collection.name not in db.list_collection_names():
+                try:
+                    db.create_collection(self.collection.name, timeseries={
+                        "timeField": "date", "metaField": "url", "granularity": self.granularity
+                    })
+                    print(f"Created time-series collection {self.collection.name}")
+                except CollectionInvalid:
+                    pass
+                except (OperationFailure, NotImplementedError, TypeError) as e:
+                    # Servers before 5.0 have no time-series collections; history still works unbucketed
+                    print(f"Time-series collections unavailable, using a regular collection: {str(e)}")
+            self._ensured = True
+
+    def is_timeseries(self):
+        info = next(self.collection.database.list_collections(filter={"name": self.collection.name}), None)
+        return bool(info and info.get("type") == "timeseries")
+
+    def record(self, snapshots):
+        if not snapshots:
+            return
+        self.ensure()
+        self.collection.insert_many(snapshots, ordered=False)
+
+    def read(self, url, limit=50, before=None, projection=None):
+        query = {"url": url}
+        if before is not None:
+            query["date"] = {"$lt": before}
+        return list(self.collection.find(query, projection).sort("date", -1).limit(limit))
+
+    def find(self, url, snapshot_id, projection=None):
+        # url keeps the lookup on the url_date index (and inside one URL's buckets)
+        return self.collection.find_one({"url": url, "snapshotId": snapshot_id}, projection)
+
+    def remove(self, urls):
+        # Time-series deletes must filter on the metaField only
+        if urls:
+            self.collection.delete_many({"url": {"$in": list(urls)}})
+
+    def migrate(self, scans, batch_size=HISTORY_MIGRATION_BATCH):
+        # Copies every latest document that has no snapshot yet into the history and links it.
+        # Resumable: an interrupted run leaves unlinked documents that the next run picks up.
+        self.ensure()
+        migrated = 0
+        query = {"status": "completed", "snapshotId": {"$exists": False}}
+        while True:
+            batch = list(scans.find(query, {"id": 1, "url": 1, "original_url": 1, "date": 1, "results": 1})
+                         .limit(batch_size))
+            if not batch:
+                return migrated
+            ops, snapshots = [], []
+            for doc in batch:
+                date = doc.get("date")
+                if isinstance(date, str):
+                    try:
+                        date = datetime.fromisoformat(date)
+                    except ValueError:
+                        date = None
+                # A scan rewritten since this batch was read already has its own snapshot
+                link = {"_id": doc["_id"], "snapshotId": {"$exists": False}}
+                if not isinstance(date, datetime):
+                    # Time-series documents need a date; mark it so the migration does not retry it
+                    ops.append(UpdateOne(link, {"$set": {"snapshotId": None}}))
+                    continue
+                snapshots.append(snapshot_document(doc.get("id"), doc["url"], doc.get("original_url"), date, doc.get("results")))
+                ops.append(UpdateOne(link, {"$set": {"snapshotId": snapshots[-1]["snapshotId"], "historyCount": 1}}))
+            self.record(snapshots)
+            scans.bulk_write(ops, ordered=False)
+            migrated += len(snapshots)
+
+
+def ensure_history(history, scans):
+    # First start after upgrading: move the existing per-URL documents into the history
+    try:
+        history.ensure()
+        if scans.count_documents({"status": "completed", "snapshotId": {"$exists": False}}, limit=1):
+            print(f"Migrated {history.migrate(scans)} scans into {history.collection.name}")
+    except Exception as e:
+        print(f"Unable to migrate scan history: {str(e)}")
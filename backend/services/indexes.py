@@ -0,0 +1,111 @@
+import pymongo
+from pymongo.errors import OperationFailure
+
+# Every query in app.py and routes/analytics.py is served by one of these.
+# (name, keys, options) -- names are explicit so verification does not depend on generated names.
+SCANS_INDEXES = [
+    ("id_unique", [("id", pymongo.ASCENDING)], {"unique": True}),
+    # One latest document per URL; the scan write paths upsert on url and rely on this to stay atomic
+    ("url", [("url", pymongo.ASCENDING)], {"unique": True}),
+    # Newest-first lists and their keyset cursors sort on (date, _id); date-only sorts use its prefix
+    ("date_id_desc", [("date", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)], {}),
+    ("status_date", [("status", pymongo.ASCENDING), ("date", pymongo.DESCENDING)], {}),
+    # Retention skips history snapshots that are some report's latest scan
+    ("snapshot_id", [("snapshotId", pymongo.ASCENDING)], {}),
+]
+
+# Trend reads: all buckets of one period in time order
+ROLLUP_INDEXES = [
+    ("period_start", [("period", pymongo.ASCENDING), ("start", pymongo.ASCENDING)], {}),
+]
+
+# Overview reads on url_summaries: best/worst, most recent, improvement/regression counts
+SUMMARY_INDEXES = [
+    ("latest_score", [("latestScore", pymongo.ASCENDING)], {}),
+    ("last_scan_date", [("lastScanDate", pymongo.DESCENDING)], {}),
+    ("trend", [("trend", pymongo.ASCENDING)], {}),
+]
+
+# Inverted issue index: "which sites currently have issue X" and the top recurring issues
+ISSUE_OCCURRENCE_INDEXES = [
+    ("issue_active_last_seen", [("issueId", pymongo.ASCENDING), ("active", pymongo.ASCENDING), ("lastSeen", pymongo.DESCENDING)], {}),
+]
+
+ISSUE_STATS_INDEXES = [
+    ("active_count", [("activeCount", pymongo.DESCENDING)], {}),
+]
+
+# Per-URL history reads; time-series collections accept secondary indexes on meta + time fields
+HISTORY_INDEXES = [
+    ("url_date", [("url", pymongo.ASCENDING), ("date", pymongo.DESCENDING)], {}),
+    # Retention batches and history exports walk snapshots in (date, _id) order without a blocking sort
+    ("date_id_asc", [("date", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)], {}),
+]
+
+# Scheduler due-time lookups: earliest nextRun among enabled monitors
+MONITOR_INDEXES = [
+    ("enabled_next_run", [("enabled", pymongo.ASCENDING), ("nextRun", pymongo.ASCENDING)], {}),
+    # GET /api/monitors lists every monitor (enabled or not) in nextRun order
+    ("next_run", [("nextRun", pymongo.ASCENDING)], {}),
+]
+
+# Shared scan job state: each job document expires at its expireAt (set when it is queued and again when it finishes)
+JOB_INDEXES = [
+    ("expire_at", [("expireAt", pymongo.ASCENDING)], {"expireAfterSeconds": 0}),
+]
+
+
+# Same name, different keys or options: the index definition changed since it was created
+INDEX_CONFLICT_CODES = (85, 86)
+
+
+def ensure_indexes(collection, indexes=SCANS_INDEXES):
+    # create_index is a no-op for an identical existing index, so this is safe on every startup
+    for name, keys, options in indexes:
+        try:
+            collection.create_index(keys, name=name, background=True, **options)
+        except OperationFailure as e:
+            if e.code not in INDEX_CONFLICT_CODES:
+                raise
+            # e.g. the url index became unique: rebuild it with the new definition
+            print(f"Rebuilding index {name} on {collection.name}: {str(e)}")
+            collection.drop_index(name)
+            try:
+                collection.create_index(keys, name=name, background=True, **options)
+            except OperationFailure as e:
+                if e.code != 11000:
+                    raise
+                # Duplicates stored before the index was unique: keep the lookups indexed and let
+                # verify_indexes report it until the duplicate documents are removed
+                print(f"Index {name} on {collection.name} cannot be unique yet, duplicate keys exist: {str(e)}")
+                collection.create_index(keys, name=name, background=True)
+
+
+def verify_indexes(collection, indexes=SCANS_INDEXES):
+    # Returns a list of problems; empty when every required index exists with the expected keys
+    existing = {index["name"]: index for index in collection.list_indexes()}
+    problems = []
+    for name, keys, options in indexes:
+        index = existing.get(name)
+        if index is None:
+            problems.append(f"missing index {name} on {collection.name}")
+            continue
+        if list(index["key"].items()) != keys:
+            problems.append(f"index {name} on {collection.name} has keys {dict(index['key'])}, expected {dict(keys)}")
+        if options.get("unique") and not index.get("unique"):
+            problems.append(f"index {name} on {collection.name} is not unique")
+    return problems
+
+
+def setup_indexes(collection, indexes=SCANS_INDEXES):
+    try:
+        ensure_indexes(collection, indexes)
+        problems = verify_indexes(collection, indexes)
+        for problem in problems:
+            print(f"Index check: {problem}")
+        if not problems:
+            print(f"Indexes verified on {collection.name}")
+        return problems
+    except Exception as e:
+        print(f"Unable to set up indexes on {collection.name}: {str(e)}")
+        return [str(e)]
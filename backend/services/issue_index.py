@@ -0,0 +1,245 @@
+import uuid
+
+from pymongo import ReplaceOne, UpdateOne
+
+# Inverted issue index, maintained incrementally on every scan write:
+#   issue_occurrences  one doc per (issue id, url): count, elements, first/last seen, active
+#   issue_stats        one doc per issue id: title, category, activeCount (URLs whose latest
+#                      scan has it), seenCount (all scans that ever reported it), first/last seen
+
+SEVERITIES = ('critical', 'serious', 'moderate', 'minor')
+
+# Issue Category Mapping Helper
+ISSUE_CATEGORIES = {
+    'color-contrast': 'Contrast',
+    'image-alt': 'Text Alternatives',
+    'image-redundant-alt': 'Text Alternatives',
+    'input-image-alt': 'Text Alternatives',
+    'role-img-alt': 'Text Alternatives',
+    'html-has-lang': 'Language',
+    'html-lang-valid': 'Language',
+    'valid-lang': 'Language',
+    'document-title': 'Page Structure',
+    'landmark-one-main': 'Page Structure',
+    'page-has-heading-one': 'Page Structure',
+    'bypass': 'Navigation',
+    'frame-title': 'Navigation',
+    'link-name': 'Navigation',
+    'button-name': 'Keyboard & Interactive',
+    'label': 'Forms & Inputs',
+    'form-field-multiple-labels': 'Forms & Inputs',
+    'aria-allowed-attr': 'ARIA',
+    'aria-hidden-body': 'ARIA',
+    'aria-required-attr': 'ARIA',
+    'aria-required-children': 'ARIA',
+    'aria-required-parent': 'ARIA',
+    'aria-roles': 'ARIA',
+    'aria-valid-attr-value': 'ARIA',
+    'aria-valid-attr': 'ARIA',
+    'duplicate-id-active': 'Keyboard & Interactive',
+    'duplicate-id-aria': 'ARIA',
+    'duplicate-id': 'Page Structure',
+    'list': 'Content Structure',
+    'listitem': 'Content Structure',
+}
+
+def get_issue_category(issue_id):
+    if not issue_id:
+        return 'Other'
+    if issue_id in ISSUE_CATEGORIES:
+        return ISSUE_CATEGORIES[issue_id]
+    issue_id_lower = issue_id.lower()
+    if issue_id_lower.startswith('aria-') or issue_id_lower.startswith('role-'):
+        return 'ARIA'
+    if 'alt' in issue_id_lower:
+        return 'Text Alternatives'
+    if 'lang' in issue_id_lower:
+        return 'Language'
+    if 'table' in issue_id_lower or 'list' in issue_id_lower:
+        return 'Content Structure'
+    if 'label' in issue_id_lower or 'input' in issue_id_lower or 'select' in issue_id_lower or 'button' in issue_id_lower:
+        return 'Forms & Inputs'
+    if 'focus' in issue_id_lower or 'tabindex' in issue_id_lower or 'keyboard' in issue_id_lower:
+        return 'Keyboard & Interactive'
+    return 'Other'
+
+
+def enrich_issue(issue):
+    # Category and severity are resolved once at ingestion instead of on every analytics read
+    issue['category'] = get_issue_category(issue.get('id'))
+    issue['severity'] = issue.get('impact') if issue.get('impact') in SEVERITIES else 'minor'
+    return issue
+
+
+def _occurrence_id(issue_id, url):
+    return f"{issue_id}|{url}"
+
+
+def record_issues(occurrences, stats, entries):
+    # entries: [(url, date, issues, previous_issue_ids)] where previous_issue_ids are the ids
+    # in the result this write replaces (empty for a new URL)
+    occurrence_ops, stats_ops = [], []
+    for url, date, issues, previous_ids in entries:
+        current = {issue.get('id'): issue for issue in issues or [] if issue.get('id')}
+        previous_ids = set(previous_ids or [])
+        for issue_id, issue in current.items():
+            category = issue.get('category') or get_issue_category(issue_id)
+            occurrence_ops.append(UpdateOne({"_id": _occurrence_id(issue_id, url)}, {
+                "$set": {
+                    "issueId": issue_id, "url": url, "title": issue.get('title'), "category": category,
+                    "impact": issue.get('impact'), "active": True, "lastSeen": date,
+                    "elements": len(issue.get('elementRefs') or issue.get('affectedElements') or [])
+                },
+                "$inc": {"count": 1},
+                "$setOnInsert": {"firstSeen": date}
+            }, upsert=True))
+            stats_ops.append(UpdateOne({"_id": issue_id}, {
+                "$set": {"title": issue.get('title'), "category": category, "lastSeen": date},
+                "$inc": {"seenCount": 1, "activeCount": 0 if issue_id in previous_ids else 1},
+                "$setOnInsert": {"firstSeen": date}
+            }, upsert=True))
+        for issue_id in previous_ids - set(current):
+            occurrence_ops.append(UpdateOne({"_id": _occurrence_id(issue_id, url)}, {"$set": {"active": False}}))
+            stats_ops.append(UpdateOne({"_id": issue_id}, {"$inc": {"activeCount": -1}}))
+    if occurrence_ops:
+        occurrences.bulk_write(occurrence_ops, ordered=False)
+    if stats_ops:
+        stats.bulk_write(stats_ops, ordered=False)
+
+
+def remove_issues(occurrences, stats, removed):
+    # removed: [(url, issue_ids)] for scans that were deleted
+    record_issues(occurrences, stats, [(url, None, [], issue_ids) for url, issue_ids in removed])
+
+
+def previous_issue_ids(scan):
+    if not scan or scan.get("status") != "completed":
+        return []
+    return list({issue.get('id') for issue in (scan.get("results") or {}).get("issues") or [] if issue.get('id')})
+
+
+def read_recurring_issues(stats, total_scans, limit=10):
+    recurring = []
+    for issue in stats.find({"activeCount": {"$gt": 0}}).sort("activeCount", -1).limit(limit):
+        recurring.append({
+            "id": issue["_id"],
+            "title": issue.get("title") or issue["_id"],
+            "count": issue["activeCount"],
+            "frequency": round((issue["activeCount"] / total_scans) * 100, 1)
+        })
+    return recurring
+
+
+def category_distribution_pipeline():
+    return [
+        {"$match": {"activeCount": {"$gt": 0}}},
+        {"$group": {"_id": "$category", "count": {"$sum": "$activeCount"}}},
+        {"$sort": {"count": -1}}
+    ]
+
+
+def read_distribution(stats):
+    # issue_stats has one document per distinct rule, so this never touches scan data
+    return [{"category": d["_id"], "count": d["count"]} for d in stats.aggregate(category_distribution_pipeline())]
+
+
+def sites_with_issue(occurrences, issue_id, limit=50, skip=0):
+    cursor = occurrences.find(
+        {"issueId": issue_id, "active": True},
+        {"_id": 0, "url": 1, "count": 1, "elements": 1, "impact": 1, "firstSeen": 1, "lastSeen": 1}
+    ).sort("lastSeen", -1).skip(skip).limit(limit)
+    return list(cursor)
+
+
+def issue_occurrence_pipeline():
+    return [
+        {"$match": {"status": "completed", "results.issues": {"$exists": True, "$type": "array"}}},
+        {"$unwind": "$results.issues"},
+        {"$group": {
+            "_id": {"issueId": "$results.issues.id", "url": "$url"},
+            "title": {"$last": "$results.issues.title"},
+            "impact": {"$last": "$results.issues.impact"},
+            "elements": {"$last": {"$size": {"$ifNull": ["$results.issues.elementRefs", []]}}},
+            "count": {"$sum": 1},
+            "firstSeen": {"$min": "$date"},
+            "lastSeen": {"$max": "$date"},
+        }}
+    ]
+
+
+REBUILD_CHUNK = 1000
+
+
+def _write_chunked(collection, ops):
+    # Flushes ops in REBUILD_CHUNK-sized bulk writes; returns the emptied list
+    if len(ops) >= REBUILD_CHUNK:
+        collection.bulk_write(ops, ordered=False)
+        return []
+    return ops
+
+
+def rebuild_issue_index(scans, history, occurrences, stats):
+    # Backfill both collections: count/firstSeen/lastSeen over every snapshot in the history
+    # (as record_issues counts them), active from each URL's latest scan. Documents written by
+    # this pass carry its token and everything else is swept afterwards, so no single command
+    # has to list every id. Run it while scan writes are quiet, like rebuild-rollups.
+    token = uuid.uuid4().hex
+    per_issue = {}
+    ops = []
+    for row in history.aggregate(issue_occurrence_pipeline(), allowDiskUse=True):
+        issue_id, url = row["_id"]["issueId"], row["_id"]["url"]
+        if not issue_id:
+            continue
+        category = get_issue_category(issue_id)
+        ops.append(ReplaceOne({"_id": _occurrence_id(issue_id, url)}, {
+            "issueId": issue_id, "url": url, "title": row["title"], "category": category,
+            "impact": row["impact"], "active": False, "count": row["count"], "elements": row["elements"],
+            "firstSeen": row["firstSeen"], "lastSeen": row["lastSeen"], "rebuild": token
+        }, upsert=True))
+        ops = _write_chunked(occurrences, ops)
+        entry = per_issue.setdefault(issue_id, {
+            "title": row["title"], "category": category, "activeCount": 0, "seenCount": 0,
+            "firstSeen": row["firstSeen"], "lastSeen": row["lastSeen"], "rebuild": token
+        })
+        entry["seenCount"] += row["count"]
+        entry["firstSeen"] = min(entry["firstSeen"], row["firstSeen"])
+        entry["lastSeen"] = max(entry["lastSeen"], row["lastSeen"])
+
+    # Latest scans decide which occurrences are active; scans that predate the history still count once
+    for row in scans.aggregate(issue_occurrence_pipeline(), allowDiskUse=True):
+        issue_id, url = row["_id"]["issueId"], row["_id"]["url"]
+        if not issue_id:
+            continue
+        category = get_issue_category(issue_id)
+        ops.append(UpdateOne({"_id": _occurrence_id(issue_id, url)}, {
+            "$set": {"issueId": issue_id, "url": url, "title": row["title"], "category": category,
+                     "impact": row["impact"], "active": True, "elements": row["elements"], "rebuild": token},
+            "$setOnInsert": {"count": row["count"], "firstSeen": row["firstSeen"], "lastSeen": row["lastSeen"]}
+        }, upsert=True))
+        ops = _write_chunked(occurrences, ops)
+        entry = per_issue.setdefault(issue_id, {
+            "title": row["title"], "category": category, "activeCount": 0, "seenCount": row["count"],
+            "firstSeen": row["firstSeen"], "lastSeen": row["lastSeen"], "rebuild": token
+        })
+        entry["activeCount"] += 1
+        entry["title"] = row["title"]
+
+    if ops:
+        occurrences.bulk_write(ops, ordered=False)
+    occurrences.delete_many({"rebuild": {"$ne": token}})
+    ops = []
+    for issue_id, doc in per_issue.items():
+        ops.append(ReplaceOne({"_id": issue_id}, doc, upsert=True))
+        ops = _write_chunked(stats, ops)
+    if ops:
+        stats.bulk_write(ops, ordered=False)
+    stats.delete_many({"rebuild": {"$ne": token}})
+    return len(per_issue)
+
+
+def ensure_issue_index(scans, history, occurrences, stats):
+    try:
+        if stats.estimated_document_count() == 0 and scans.estimated_document_count() > 0:
+            print(f"Backfilled issue index for {rebuild_issue_index(scans, history, occurrences, stats)} issues")
+    except Exception as e:
+        print(f"Unable to backfill issue index: {str(e)}")
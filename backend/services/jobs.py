@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from services.db import collection
+
+# Job lifecycle states reported by the status endpoint
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+SCAN_WORKERS = int(os.environ.get('SCAN_WORKERS', 4))
+# Finished jobs are kept around this long so clients can still collect the result
+JOB_RESULT_TTL = int(os.environ.get('SCAN_JOB_RESULT_TTL', 3600))
+# Unfinished jobs of a process that died are dropped after this long
+JOB_STALE_TTL = int(os.environ.get('SCAN_JOB_STALE_TTL', 86400))
+
+
+class ScanJobQueue:
+    # Jobs run on this process's worker threads, but their state lives in the scan_jobs
+    # collection (expired by a TTL index on expireAt), so a status or result poll answered
+    # by another gunicorn worker still finds the job. Without a collection, state is in-process.
+    def __init__(self, jobs_collection=None, max_workers=SCAN_WORKERS, result_ttl=JOB_RESULT_TTL,
+                 stale_ttl=JOB_STALE_TTL):
+        self.collection = jobs_collection
+        self.max_workers = max_workers
+        self.result_ttl = result_ttl
+        self.stale_ttl = stale_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan-worker")
+        # Jobs submitted by this process: answers local polls and the queue-depth gauges
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        # Runs func(*args, **kwargs) on the worker pool and returns the new job id
+        job_id = str(uuid.uuid4())
+        job = {
+            "id": job_id,
+            "status": QUEUED,
+            "createdAt": datetime.now().isoformat(),
+            "startedAt": None,
+            "finishedAt": None,
+            "result": None,
+            "error": None,
+            "_finished": None,
+        }
+        if self.collection is not None:
+            # Stored before the job can start, so no poll sees it missing
+            self.collection.insert_one(dict(self._public(job), _id=job_id,
+                                            expireAt=datetime.now() + timedelta(seconds=self.stale_ttl)))
+        with self._lock:
+            self._evict_expired()
+            self._jobs[job_id] = job
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        self._update(job_id, status=RUNNING, startedAt=datetime.now().isoformat())
+        finished = lambda: {"finishedAt": datetime.now().isoformat(), "_finished": time.monotonic()}
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            print(f"Scan job {job_id} failed: {str(e)}")
+            self._update(job_id, status=FAILED, error=str(e), **finished())
+            return
+        if not self._update(job_id, status=COMPLETED, result=result, **finished()):
+            # e.g. a result too large to store: pollers elsewhere must not wait on it forever
+            self._update(job_id, status=FAILED, result=None, error="Unable to store the scan result", **finished())
+
+    def _update(self, job_id, **fields):
+        # Returns False when the shared job state could not be written
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+        if self.collection is None:
+            return True
+        shared = self._public(fields)
+        if "_finished" in fields:
+            shared["expireAt"] = datetime.now() + timedelta(seconds=self.result_ttl)
+        try:
+            self.collection.update_one({"_id": job_id}, {"$set": shared})
+            return True
+        except Exception as e:
+            print(f"Unable to update scan job {job_id}: {str(e)}")
+            return False
+
+    def _evict_expired(self):
+        # Caller must hold self._lock
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["_finished"] is not None and now - job["_finished"] > self.result_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _public(job):
+        return {k: v for k, v in job.items() if not k.startswith('_')}
+
+    def get(self, job_id):
+        # Returns a snapshot of the job (without internal fields) or None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._public(job)
+        if self.collection is None:
+            return None
+        return self.collection.find_one({"_id": job_id}, {"_id": 0, "expireAt": 0})
+
+    def stats(self):
+        # Jobs of this process only
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, COMPLETED: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+        counts["workers"] = self.max_workers
+        return counts
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait)
+
+
+scan_jobs = ScanJobQueue(collection("scan_jobs"))
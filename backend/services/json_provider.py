@@ -0,0 +1,74 @@
+import os
+
+from bson import ObjectId
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Lists with more items than this are serialized and sent in chunks instead of as one body
+STREAM_LIST_MIN = int(os.environ.get('STREAM_LIST_MIN', 50))
+STREAM_CHUNK_ITEMS = 20
+
+
+def _default(value):
+    # Mongo documents go straight to the encoder, _id included
+    if isinstance(value, ObjectId):
+        return str(value)
+    return DefaultJSONProvider.default(value)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # orjson when it is installed, the stdlib encoder otherwise. With orjson, naive datetimes
+    # (everything pymongo returns) are written as ISO 8601 in UTC, the same instant the
+    # default provider writes as an RFC 822 date.
+    default = staticmethod(_default)
+    sort_keys = False
+    ensure_ascii = False
+
+    def _orjson_options(self, indent=False):
+        options = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj, indent=False):
+        if orjson is None:
+            return super().dumps(obj, indent=2 if indent else None).encode()
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options(indent))
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self.dumps_bytes(obj, indent=indent), mimetype=self.mimetype)
+
+    def stream_list(self, items):
+        # A JSON array written a few items at a time, so large pages never exist as one string
+        def generate():
+            yield b"["
+            for start in range(0, len(items), STREAM_CHUNK_ITEMS):
+                chunk = b",".join(self.dumps_bytes(item) for item in items[start:start + STREAM_CHUNK_ITEMS])
+                yield (b"," + chunk) if start else chunk
+            yield b"]"
+        return Response(generate(), mimetype=self.mimetype)
+
+
+def list_response(app, items):
+    if isinstance(app.json, FastJSONProvider) and len(items) > STREAM_LIST_MIN:
+        return app.json.stream_list(items)
+    return app.json.response(items)
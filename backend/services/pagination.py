@@ -0,0 +1,109 @@
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+
+# Keyset pagination over the scans collection in (date, _id) descending order, served by the
+# date_id_desc index. Each page ends with an opaque token that resumes right after its last row,
+# so page N costs the same as page 1 (skip has to walk and discard every earlier document).
+LIST_SORT = [("date", -1), ("_id", -1)]
+# Scans stored as ISO strings sort in a different BSON type bracket than datetimes, so a cursor
+# would never reach them; normalize_dates converts them (flask migrate-dates, and on startup)
+LEGACY_DATES = {"date": {"$type": "string"}}
+DATE_MIGRATION_BATCH = 500
+
+# fields= names accepted by the list endpoints, mapped to the stored paths they project
+LIST_FIELDS = {
+    "id": "id",
+    "url": "url",
+    "original_url": "original_url",
+    "date": "date",
+    "status": "status",
+    "snapshotId": "snapshotId",
+    "score": "results.score",
+    "metrics": "results.metrics",
+    "issues": "results.issues",
+    "issuesBySeverity": "results.issuesBySeverity",
+    "scanTime": "results.scanTime",
+    "results": "results",
+}
+
+
+def parse_fields(value, default=None):
+    # None means "whole document"; date and _id are always included so a page can emit its cursor
+    if not value:
+        return default
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(LIST_FIELDS)}")
+    projection = {LIST_FIELDS[name]: 1 for name in names}
+    if "results" in projection:
+        projection = {path: 1 for path in projection if not path.startswith("results.")}
+    projection["date"] = 1
+    return projection
+
+
+def encode_cursor(doc):
+    date = doc.get("date")
+    value = {"d": date.isoformat() if isinstance(date, datetime) else date, "i": str(doc["_id"])}
+    if isinstance(date, datetime):
+        value["t"] = "dt"
+    return base64.urlsafe_b64encode(json.dumps(value, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        value = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        date = datetime.fromisoformat(value["d"]) if value.get("t") == "dt" else value["d"]
+        return date, ObjectId(value["i"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise ValueError("Invalid cursor")
+
+
+def keyset_filter(token):
+    if not token:
+        return {}
+    date, oid = decode_cursor(token)
+    return {"$or": [{"date": {"$lt": date}}, {"date": date, "_id": {"$lt": oid}}]}
+
+
+def read_page(collection, limit, token=None, projection=None):
+    # Fetches one extra row to know whether another page exists; returns (docs, next_token)
+    docs = list(collection.find(keyset_filter(token), projection).sort(LIST_SORT).limit(limit + 1))
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1])
+
+
+def normalize_dates(collection, batch_size=DATE_MIGRATION_BATCH):
+    # Rewrites string dates as datetimes; returns how many documents changed. A string that is not
+    # an ISO date is kept in legacyDate and the document dated by when its _id was generated.
+    converted = 0
+    while True:
+        batch = list(collection.find(LEGACY_DATES, {"date": 1}).limit(batch_size))
+        if not batch:
+            return converted
+        ops = []
+        for doc in batch:
+            update = {}
+            try:
+                update["date"] = datetime.fromisoformat(doc["date"])
+            except ValueError:
+                update = {"date": doc["_id"].generation_time.replace(tzinfo=None), "legacyDate": doc["date"]}
+            # Only if the date was not rewritten since this batch was read
+            ops.append(UpdateOne({"_id": doc["_id"], "date": doc["date"]}, {"$set": update}))
+        collection.bulk_write(ops, ordered=False)
+        converted += len(ops)
+
+
+def ensure_dates(collection):
+    try:
+        if collection.count_documents(LEGACY_DATES, limit=1):
+            print(f"Converted {normalize_dates(collection)} string dates on {collection.name} for cursor paging")
+    except Exception as e:
+        print(f"Unable to convert string dates on {collection.name}: {str(e)}")
@@ -0,0 +1,41 @@
+# Aggregation pipelines run by routes/analytics.py. Kept here so the query-plan check
+# (flask check-query-plans) and the rollup backfill run exactly what the endpoints run.
+
+COMPLETED_SCANS = {"status": "completed"}
+SCORED_SCANS = {"status": "completed", "results.score": {"$exists": True}}
+
+def overview_stats_pipeline():
+    return [
+        {"$match": SCORED_SCANS},
+        {"$group": {
+            "_id": None,
+            "totalScans": {"$sum": 1},
+            "averageScore": {"$avg": "$results.score"}
+        }}
+    ]
+
+def trend_pipeline(date_format):
+    return [
+        {"$match": {
+            "status": "completed", 
+            "results.score": {"$exists": True}, 
+            "date": {"$exists": True}
+        }},
+        # Convert date field to BSON date format if it was saved as a string
+        {"$project": {
+            "score": "$results.score",
+            "parsedDate": {
+                "$cond": {
+                    "if": {"$eq": [{"$type": "$date"}, "date"]},
+                    "then": "$date",
+                    "else": {"$toDate": "$date"}
+                }
+            }
+        }},
+        {"$group": {
+            "_id": {"$dateToString": {"format": date_format, "date": "$parsedDate"}},
+            "avgScore": {"$avg": "$score"},
+            "sortDate": {"$min": "$parsedDate"}
+        }},
+        {"$sort": {"sortDate": 1}}
+    ]
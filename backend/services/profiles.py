@@ -0,0 +1,238 @@
+import os
+import shutil
+import threading
+import time
+
+from services.metrics import registry
+
+# Scratch space for the Node scan workers. Each worker checks out a profile directory holding
+# its Chrome user-data-dir (chrome/) and its TEMP/TMP (tmp/). The profile goes back to the pool
+# when the worker retires, and only then is tmp/ emptied (the worker's long-lived Chrome may hold
+# files there until it exits), so the next Chrome starts on a warm profile instead of creating a new one. Profiles live under a per-process directory
+# (optionally on tmpfs), and a background sweeper removes whatever crashed processes and older
+# code left behind: lh_*/axe_*/worker_* user-data-dirs and lh_worker_* temp dirs.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEGACY_TEMP_DIR = os.path.join(BACKEND_DIR, 'temp_lighthouse')
+
+SCAN_PROFILE_TMPFS = os.environ.get('SCAN_PROFILE_TMPFS', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+SCAN_PROFILE_ROOT = os.environ.get('SCAN_PROFILE_ROOT') or (
+    '/dev/shm/webable_profiles' if SCAN_PROFILE_TMPFS and os.path.isdir('/dev/shm')
+    else os.path.join(LEGACY_TEMP_DIR, 'profiles'))
+SCAN_PROFILE_POOL = int(os.environ.get('SCAN_PROFILE_POOL', os.environ.get('SCAN_NODE_WORKERS', os.environ.get('SCAN_WORKERS', 4))))
+SCRATCH_SWEEP_INTERVAL = int(os.environ.get('SCRATCH_SWEEP_INTERVAL', 600))
+# Unowned scratch directories older than this are treated as orphans
+SCRATCH_ORPHAN_AGE = int(os.environ.get('SCRATCH_ORPHAN_AGE', 3600))
+
+# Chrome profile contents that only cache page data; dropped when a profile is recycled
+CHROME_CACHE_DIRS = ('Default/Cache', 'Default/Code Cache', 'Default/GPUCache', 'Default/Service Worker',
+                     'GrShaderCache', 'ShaderCache', 'GraphiteDawnCache', 'Crashpad')
+ORPHAN_PREFIXES = ('lh_', 'axe_', 'worker_')
+
+scratch_swept_total = registry.counter(
+    'webable_scratch_swept_total', 'Orphaned scan scratch directories removed by the sweeper', ('kind',))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _empty_dir(path):
+    # Removes everything inside path, keeping path itself
+    try:
+        entries = list(os.scandir(path))
+    except FileNotFoundError:
+        os.makedirs(path, exist_ok=True)
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def disk_usage(path):
+    # (bytes, files) under path without following symlinks
+    total = files = 0
+    for root, dirs, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+                files += 1
+            except OSError:
+                pass
+        files += len(dirs)
+    return total, files
+
+
+class Profile:
+    __slots__ = ('path', 'chrome', 'tmp')
+
+    def __init__(self, path):
+        self.path = path
+        self.chrome = os.path.join(path, 'chrome')
+        self.tmp = os.path.join(path, 'tmp')
+        os.makedirs(self.chrome, exist_ok=True)
+        os.makedirs(self.tmp, exist_ok=True)
+
+
+class ProfilePool:
+    def __init__(self, root=SCAN_PROFILE_ROOT, size=SCAN_PROFILE_POOL, sweep_interval=SCRATCH_SWEEP_INTERVAL,
+                 orphan_age=SCRATCH_ORPHAN_AGE):
+        self.root = root
+        self.size = size
+        self.sweep_interval = sweep_interval
+        self.orphan_age = orphan_age
+        self._idle = []
+        self._in_use = set()
+        self._next = 0
+        self._pid = None
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self.counters = {"created": 0, "checkouts": 0, "wiped": 0, "discarded": 0, "sweeps": 0}
+        self.usage = {}
+
+    @property
+    def process_dir(self):
+        return os.path.join(self.root, f"p{os.getpid()}")
+
+    def _ensure(self):
+        # Caller must hold self._lock. A forked child starts its own set of profiles.
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._idle, self._in_use, self._next = [], set(), 0
+        # Left over by an earlier process that had the same pid
+        shutil.rmtree(self.process_dir, ignore_errors=True)
+        for _ in range(self.size):
+            self._idle.append(self._create())
+        if self.sweep_interval > 0 and (self._sweeper is None or not self._sweeper.is_alive()):
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="scratch-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _create(self):
+        # Caller must hold self._lock
+        self._next += 1
+        self.counters["created"] += 1
+        return Profile(os.path.join(self.process_dir, f"profile_{self._next}"))
+
+    def checkout(self):
+        with self._lock:
+            self._ensure()
+            if self._idle:
+                profile = self._idle.pop()
+            else:
+                profile = self._create()
+            self.counters["checkouts"] += 1
+            self._in_use.add(profile.path)
+        return profile
+
+    def tmp_bytes(self, profile):
+        # Temp files written by Lighthouse, puppeteer and Chrome since the worker started
+        return disk_usage(profile.tmp)[0]
+
+    def checkin(self, profile, wipe=False):
+        # A worker that crashed may have left its Chrome profile half-written, so it is wiped;
+        # otherwise only the caches go and the rest of the profile stays warm
+        with self._lock:
+            self._in_use.discard(profile.path)
+            keep = len(self._idle) < self.size and os.path.dirname(profile.path) == self.process_dir
+            self.counters["wiped"] += bool(wipe and keep)
+            self.counters["discarded"] += not keep
+        if not keep:
+            shutil.rmtree(profile.path, ignore_errors=True)
+            return
+        _empty_dir(profile.tmp)
+        if wipe:
+            _empty_dir(profile.chrome)
+        else:
+            for name in CHROME_CACHE_DIRS:
+                shutil.rmtree(os.path.join(profile.chrome, name), ignore_errors=True)
+        with self._lock:
+            self._idle.append(profile)
+
+    # ---- orphan sweeping ----
+
+    def _legacy_dirs(self):
+        # Per-scan and per-worker directories made outside the pool: [(entry, kind)]
+        temp_root = os.environ.get('TEMP', os.getcwd())
+        found = []
+        for directory, prefixes, kind in ((LEGACY_TEMP_DIR, ORPHAN_PREFIXES, 'user_data_dir'),
+                                          (temp_root, ('lh_worker_',), 'worker_temp')):
+            try:
+                entries = list(os.scandir(directory))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            found.extend((entry, kind) for entry in entries
+                         if entry.is_dir(follow_symlinks=False) and entry.name.startswith(prefixes))
+        return found
+
+    def _orphan_candidates(self):
+        # (path, kind) pairs that no live process owns
+        now = time.time()
+        candidates = []
+        try:
+            for entry in os.scandir(self.root):
+                if entry.is_dir() and entry.name[:1] == 'p' and entry.name[1:].isdigit():
+                    if not _pid_alive(int(entry.name[1:])):
+                        candidates.append((entry.path, 'profiles'))
+        except FileNotFoundError:
+            pass
+        for entry, kind in self._legacy_dirs():
+            if entry.name.startswith('worker_') and entry.name[7:].isdigit() and _pid_alive(int(entry.name[7:])):
+                continue
+            try:
+                if now - entry.stat(follow_symlinks=False).st_mtime > self.orphan_age:
+                    candidates.append((entry.path, kind))
+            except FileNotFoundError:
+                pass
+        return candidates
+
+    def sweep(self):
+        # Removes orphans and refreshes the disk usage figures; returns how many were removed
+        removed = 0
+        for path, kind in self._orphan_candidates():
+            shutil.rmtree(path, ignore_errors=True)
+            if not os.path.exists(path):
+                removed += 1
+                scratch_swept_total.inc(kind)
+        profiles = disk_usage(self.root) if os.path.isdir(self.root) else (0, 0)
+        legacy = [disk_usage(entry.path) for entry, _ in self._legacy_dirs()]
+        usage = {
+            "profiles": {"bytes": profiles[0], "files": profiles[1]},
+            "legacy": {"bytes": sum(u[0] for u in legacy), "files": sum(u[1] for u in legacy), "dirs": len(legacy)},
+        }
+        try:
+            free = shutil.disk_usage(self.root if os.path.isdir(self.root) else BACKEND_DIR).free
+        except OSError:
+            free = None
+        with self._lock:
+            self.usage = dict(usage, freeBytes=free, sweptAt=time.time())
+            self.counters["sweeps"] += 1
+        return removed
+
+    def _sweep_loop(self):
+        while True:
+            try:
+                removed = self.sweep()
+                if removed:
+                    print(f"Removed {removed} orphaned scan scratch directories")
+            except Exception as e:
+                print(f"Scratch sweep failed: {str(e)}")
+            time.sleep(self.sweep_interval)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, root=self.root, tmpfs=self.root.startswith('/dev/shm'),
+                        idle=len(self._idle), inUse=len(self._in_use), size=self.size, usage=dict(self.usage))
+
+
+profile_pool = ProfilePool()
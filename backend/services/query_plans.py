@@ -0,0 +1,236 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from services.pipelines import COMPLETED_SCANS, overview_stats_pipeline
+from services.pagination import read_page, encode_cursor, parse_fields, ensure_dates, normalize_dates
+from services.export import ExportRequest, read_batches
+from services.history import ScanHistory
+from services.jobs import ScanJobQueue
+from services.reports import (upsert_latest, latest_fields, latest_op, latest_by_url, find_report, read_offset_page,
+                              delete_reports)
+from services.scheduler import ScanScheduler
+from services.retention import RetentionEngine, page_query, BATCH_SORT
+from services.summaries import read_summary_stats, record_summaries
+from services.rollups import read_trend
+from services.issue_index import (read_recurring_issues, read_distribution, sites_with_issue, record_issues,
+                                  issue_occurrence_pipeline)
+
+SAMPLE_URL = "https://example.com"
+SAMPLE_ID = "00000000-0000-0000-0000-000000000000"
+
+# Stages that need every matching document in memory before the first result comes back
+BLOCKING_STAGES = ("COLLSCAN", "SORT")
+
+
+class _RecordedCursor:
+    def __init__(self, command):
+        self.command = command
+
+    def sort(self, key, direction=1):
+        self.command["sort"] = dict([(key, direction)] if isinstance(key, str) else key)
+        return self
+
+    def skip(self, skip):
+        if skip:
+            self.command["skip"] = skip
+        return self
+
+    def limit(self, limit):
+        self.command["limit"] = limit
+        return self
+
+    def hint(self, index):
+        self.command["hint"] = index
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        return iter(())
+
+
+class RecordingCollection:
+    # Stands in for a collection: the helpers the endpoints call run against it unchanged, and each
+    # query they issue is kept as the command to explain. Reads find nothing, writes change nothing.
+    def __init__(self, name, commands):
+        self.name = name
+        self.commands = commands
+
+    def find(self, filter=None, projection=None, sort=None):
+        command = {"find": self.name, "filter": filter or {}}
+        if projection:
+            command["projection"] = projection
+        self.commands.append(command)
+        cursor = _RecordedCursor(command)
+        return cursor.sort(sort) if sort else cursor
+
+    def find_one(self, filter=None, projection=None, sort=None):
+        self.find(filter, projection, sort).limit(1)
+        return None
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False, **kwargs):
+        command = {"findAndModify": self.name, "query": filter, "update": update, "upsert": upsert}
+        if sort:
+            command["sort"] = dict(sort)
+        self.commands.append(command)
+        return None
+
+    def count_documents(self, filter, limit=None):
+        # As the driver runs it
+        self.aggregate([{"$match": filter}] + ([{"$limit": limit}] if limit else [])
+                       + [{"$group": {"_id": 1, "n": {"$sum": 1}}}])
+        return 0
+
+    def aggregate(self, pipeline, **kwargs):
+        self.commands.append({"aggregate": self.name, "pipeline": pipeline, "cursor": {}})
+        return iter(())
+
+    def update_one(self, filter, update, upsert=False):
+        self.commands.append({"update": self.name, "updates": [{"q": filter, "u": update, "upsert": upsert}]})
+
+    def update_many(self, filter, update, upsert=False):
+        self.commands.append({"update": self.name, "updates": [{"q": filter, "u": update, "multi": True}]})
+
+    def delete_many(self, filter):
+        self.commands.append({"delete": self.name, "deletes": [{"q": filter, "limit": 0}]})
+        return _Deleted()
+
+    def bulk_write(self, requests, ordered=True):
+        # Every operation of one bulk write has the same shape; the first one stands for all
+        for op in requests[:1]:
+            self.update_one(op._filter, op._doc, op._upsert)
+
+    def insert_one(self, document):
+        pass
+
+    def insert_many(self, documents, ordered=True):
+        pass
+
+    def delete_one(self, filter):
+        pass
+
+    def replace_one(self, filter, replacement, upsert=False):
+        pass
+
+
+class _Deleted:
+    deleted_count = 0
+
+
+def _catalog_calls():
+    # (name, call): call(c) runs the helpers an endpoint runs, with c(name) as its collections.
+    # Keep in step with app.py and routes/analytics.py when adding an endpoint or a helper.
+    # Backfills that read all of scan_history (rebuild-rollups, rebuild-summaries, the history
+    # pass of rebuild-issue-index) are full passes by design and are not listed.
+    now = datetime.now()
+    cursor = encode_cursor({"date": now, "_id": ObjectId()})
+    list_fields = parse_fields("id,url,date,score")
+    return [
+        # app.py
+        ("save_scan: upsert latest by url", lambda c: upsert_latest(
+            c("scans"), SAMPLE_URL, latest_fields(SAMPLE_URL, now, {}, SAMPLE_ID), SAMPLE_ID)),
+        ("scan_batch: latest by url", lambda c: latest_by_url(c("scans"), [SAMPLE_URL])),
+        ("scan_batch: bulk upsert by url", lambda c: c("scans").bulk_write(
+            [latest_op(SAMPLE_URL, latest_fields(SAMPLE_URL, now, {}, SAMPLE_ID), SAMPLE_ID)])),
+        ("get_report: by url", lambda c: find_report(c("scans"), SAMPLE_URL)),
+        ("get_report: by id", lambda c: find_report(c("scans"), SAMPLE_ID)),
+        ("get_reports: first page", lambda c: read_page(c("scans"), 10, None, list_fields)),
+        ("get_reports: after cursor", lambda c: read_page(c("scans"), 10, cursor, list_fields)),
+        ("get_reports: legacy skip", lambda c: read_offset_page(c("scans"), 10, 20, list_fields)),
+        ("migrate-dates: string dates", lambda c: (ensure_dates(c("scans")), normalize_dates(c("scans")))),
+        ("recent_scans: newest first", lambda c: read_page(c("scans"), 5, None, list_fields)),
+        ("get_report_history: by url", lambda c: ScanHistory(c("scan_history")).read(SAMPLE_URL, before=now)),
+        ("diff_side: history snapshot by id", lambda c: ScanHistory(c("scan_history")).find(SAMPLE_URL, SAMPLE_ID)),
+        ("export_scans: by url prefix", lambda c: next(read_batches(c("scans"), ExportRequest(url_prefix=SAMPLE_URL)), None)),
+        ("export_scans: by date range", lambda c: next(read_batches(c("scans"), ExportRequest(since=now)), None)),
+        ("export_scans: history by url prefix", lambda c: next(read_batches(c("scan_history"), ExportRequest(
+            source="history", url_prefix=SAMPLE_URL, since=now)), None)),
+        ("scan_status: job by id", lambda c: ScanJobQueue(c("scan_jobs"), max_workers=1).get(SAMPLE_ID)),
+        ("delete_scans: by ids", lambda c: delete_reports(c("scans"), [SAMPLE_ID])),
+        # services/scheduler.py
+        ("scheduler: due monitors", lambda c: ScanScheduler(c("monitored_urls"), None, None).dispatch_due(now)),
+        ("scheduler: next due", lambda c: ScanScheduler(c("monitored_urls"), None, None).next_due()),
+        ("scheduler: claim", lambda c: ScanScheduler(c("monitored_urls"), None, None)._claim({"_id": SAMPLE_URL}, now)),
+        ("list_monitors: by next run", lambda c: ScanScheduler(c("monitored_urls"), None, None).list()),
+        # services/retention.py
+        ("retention: protected snapshots", lambda c: _retention(c)._protected([SAMPLE_ID])),
+        ("retention: prune batch", lambda c: _retention(c).prune(now)),
+        ("retention: downsample batch", lambda c: _retention(c).downsample(now)),
+        ("retention: next batch", lambda c: c("scan_history").find(
+            page_query({"date": {"$lt": now}}, (now - timedelta(days=1), ObjectId()))).sort(BATCH_SORT).limit(500)),
+        # routes/analytics.py
+        ("get_overview: stats", lambda c: c("scans").aggregate(overview_stats_pipeline())),
+        ("get_overview: summaries", lambda c: read_summary_stats(c("url_summaries"))),
+        ("record_summaries: upsert by url", lambda c: record_summaries(c("url_summaries"), [(SAMPLE_URL, now, 80)])),
+        ("get_trends: rollup buckets", lambda c: read_trend(c("score_rollups"), "daily")),
+        ("get_issues: completed count", lambda c: c("scans").count_documents(COMPLETED_SCANS)),
+        ("get_issues: recurring", lambda c: read_recurring_issues(c("issue_stats"), 1)),
+        ("get_issues: distribution", lambda c: read_distribution(c("issue_stats"))),
+        ("get_issue_sites: active sites", lambda c: sites_with_issue(c("issue_occurrences"), "color-contrast")),
+        ("record_issues: upsert occurrence", lambda c: record_issues(c("issue_occurrences"), c("issue_stats"), [
+            (SAMPLE_URL, now, [{"id": "color-contrast"}], [])])),
+        ("rebuild_issue_index: backfill pipeline", lambda c: c("scans").aggregate(issue_occurrence_pipeline())),
+    ]
+
+
+def _retention(c):
+    return RetentionEngine(c("scan_history"), c("scans"), c("score_archive"), pause=0)
+
+
+# Their sort runs on grouped output (one row per issue rule), not on collection documents
+GROUPED_SORTS = {"get_issues: distribution"}
+
+
+def query_catalog():
+    # Every query and pipeline the API runs against its collections, as explain commands recorded
+    # from the helpers themselves, so a route that changes its query changes what is checked
+    catalog = []
+    for name, call in _catalog_calls():
+        commands = []
+        call(lambda collection: RecordingCollection(collection, commands))
+        for i, command in enumerate(commands, 1):
+            catalog.append((f"{name} ({i}/{len(commands)})" if len(commands) > 1 else name, command))
+    return catalog
+
+
+def _winning_plans(node):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "winningPlan":
+                yield value
+            else:
+                yield from _winning_plans(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _winning_plans(item)
+
+
+def _stages(node):
+    if isinstance(node, dict):
+        if "stage" in node:
+            yield node["stage"]
+        for value in node.values():
+            yield from _stages(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _stages(item)
+
+
+def plan_stages(explain_output):
+    return [stage for plan in _winning_plans(explain_output) for stage in _stages(plan)]
+
+
+def check_query_plans(db, catalog=None):
+    # Returns [(name, ok, stages)]; ok is False when a winning plan scans the whole collection or
+    # sorts in memory (the failure the indexes exist to prevent)
+    report = []
+    for name, command in catalog or query_catalog():
+        explain = db.command("explain", command, verbosity="queryPlanner")
+        stages = plan_stages(explain)
+        blocking = [stage for stage in BLOCKING_STAGES if stage in stages]
+        if name.split(" (")[0] in GROUPED_SORTS:
+            blocking = [stage for stage in blocking if stage != "SORT"]
+        report.append((name, not blocking, stages))
+    return report
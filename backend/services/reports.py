@@ -0,0 +1,56 @@
+from urllib.parse import unquote
+
+from pymongo import ReturnDocument, UpdateOne
+
+from services.pagination import LIST_SORT
+from services.scan_cache import canonicalize_url
+
+# Lookups and writes on the scans collection (one latest document per URL) used by app.py.
+# They live here so flask check-query-plans explains exactly what the endpoints run.
+
+# Enough of a stored scan to know which issues a new result replaces
+PREVIOUS_ISSUES_FIELDS = {"id": 1, "url": 1, "status": 1, "results.issues.id": 1}
+
+
+def latest_fields(raw_url, date, results, snapshot_id):
+    return {"original_url": raw_url, "date": date, "results": results, "status": "completed", "snapshotId": snapshot_id}
+
+
+def latest_update(fields, new_id):
+    # Moves the URL's latest pointer to a new snapshot; new_id is only used when the URL is new
+    return {"$set": fields, "$inc": {"historyCount": 1}, "$setOnInsert": {"id": new_id}}
+
+
+def upsert_latest(scans, url, fields, new_id):
+    # One atomic upsert per URL (url is unique), so two jobs for a URL not stored yet cannot both
+    # insert; returns the pre-image (None for a new URL), which tells which issues were replaced
+    return scans.find_one_and_update({"url": url}, latest_update(fields, new_id), projection=PREVIOUS_ISSUES_FIELDS,
+                                     upsert=True, return_document=ReturnDocument.BEFORE)
+
+
+def latest_op(url, fields, new_id):
+    # The same upsert as one operation of a bulk_write
+    return UpdateOne({"url": url}, latest_update(fields, new_id), upsert=True)
+
+
+def latest_by_url(scans, urls):
+    return {doc["url"]: doc for doc in scans.find({"url": {"$in": list(urls)}}, PREVIOUS_ISSUES_FIELDS)}
+
+
+def find_report(scans, identifier, projection=None):
+    if identifier.startswith('http'):
+        # Match the canonical form as well as scans stored before URLs were canonicalized
+        url = unquote(identifier)
+        return scans.find_one({"url": {"$in": [canonicalize_url(url), url]}}, projection)
+    return scans.find_one({"id": identifier}, projection)
+
+
+def read_offset_page(scans, limit, skip, projection=None):
+    # Legacy offset paging, kept for existing clients
+    return list(scans.find({}, projection).sort(LIST_SORT).skip(skip).limit(limit))
+
+
+def delete_reports(scans, ids):
+    # Returns (removed documents, deleted count); the removed ones drive the derived-collection cleanup
+    removed = list(scans.find({"id": {"$in": ids}}, PREVIOUS_ISSUES_FIELDS))
+    return removed, scans.delete_many({"id": {"$in": ids}}).deleted_count
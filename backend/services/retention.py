@@ -0,0 +1,259 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+# Retention for scan_history, in two tiers:
+#   RETENTION_FULL_DAYS     snapshots older than this lose their issue details (results.issues);
+#                           score, metrics, issuesBySeverity and an issueCount stay, marked downsampled
+#   RETENTION_SUMMARY_DAYS  snapshots older than this are removed, after their scores are folded
+#                           into the per-day score_archive so rollup rebuilds keep their trend buckets
+# 0 turns a tier off. Each report's latest snapshot is never touched (the scans collection points at it).
+#
+# Work happens in batches of RETENTION_BATCH documents with RETENTION_PAUSE seconds between them,
+# so no operation holds locks for long or pushes much of the working set out of the cache.
+# On time-series collections, updates and deletes by _id need MongoDB 7.0 or later.
+RETENTION_ENABLED = os.environ.get('RETENTION_ENABLED', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+RETENTION_FULL_DAYS = int(os.environ.get('RETENTION_FULL_DAYS', 30))
+RETENTION_SUMMARY_DAYS = int(os.environ.get('RETENTION_SUMMARY_DAYS', 365))
+RETENTION_BATCH = int(os.environ.get('RETENTION_BATCH', 500))
+RETENTION_PAUSE = float(os.environ.get('RETENTION_PAUSE', 0.2))
+RETENTION_INTERVAL = int(os.environ.get('RETENTION_INTERVAL', 6 * 3600))
+# Only one process applies retention at a time; a lease left by a dead process expires after this
+RETENTION_LEASE = int(os.environ.get('RETENTION_LEASE', 3600))
+
+JOURNAL_ID = "_pending"
+LOCK_ID = "_lock"
+DAY_FORMAT = "%Y-%m-%d"
+
+
+# Batches walk the date_id_asc index of scan_history
+BATCH_SORT = [("date", 1), ("_id", 1)]
+
+
+def page_query(query, last=None):
+    # query restricted to documents after last = (date, _id), the final row of the previous batch
+    if not last:
+        return dict(query)
+    return {"$and": [query, {"$or": [{"date": {"$gt": last[0]}}, {"date": last[0], "_id": {"$gt": last[1]}}]}]}
+
+
+def day_start(date):
+    return datetime(date.year, date.month, date.day)
+
+
+class RetentionPolicy:
+    def __init__(self, full_days=RETENTION_FULL_DAYS, summary_days=RETENTION_SUMMARY_DAYS):
+        if full_days and summary_days and summary_days < full_days:
+            raise ValueError("RETENTION_SUMMARY_DAYS must not be shorter than RETENTION_FULL_DAYS")
+        self.full_days = full_days
+        self.summary_days = summary_days
+
+    def cutoffs(self, now=None):
+        # (downsample_before, prune_before); None where the tier is off
+        now = now or datetime.now()
+        return (now - timedelta(days=self.full_days) if self.full_days else None,
+                day_start(now - timedelta(days=self.summary_days)) if self.summary_days else None)
+
+    def describe(self):
+        return {"fullDays": self.full_days, "summaryDays": self.summary_days}
+
+
+class RetentionEngine:
+    def __init__(self, history, scans, archive, policy=None, batch_size=RETENTION_BATCH, pause=RETENTION_PAUSE,
+                 on_change=None):
+        self.history = history
+        self.scans = scans
+        self.archive = archive
+        self.policy = policy or RetentionPolicy()
+        self.batch_size = batch_size
+        self.pause = pause
+        # Called after a run changed anything (e.g. to invalidate cached analytics)
+        self.on_change = on_change
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._thread = None
+        self.last_run = None
+        self.interrupted = False
+
+    # ---- locking ----
+
+    def _acquire(self):
+        now = datetime.now()
+        try:
+            self.archive.find_one_and_update(
+                {"_id": LOCK_ID, "$or": [{"until": {"$lte": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "until": now + timedelta(seconds=RETENTION_LEASE)}},
+                upsert=True)
+            return True
+        except OperationFailure as e:
+            if e.code == 11000:
+                # The lock document exists and another process holds an unexpired lease
+                return False
+            raise
+
+    def _renew(self):
+        # Extends this process's lease; False once another process has taken the lock over
+        return self.archive.find_one_and_update(
+            {"_id": LOCK_ID, "owner": self.owner},
+            {"$set": {"until": datetime.now() + timedelta(seconds=RETENTION_LEASE)}}) is not None
+
+    def _release(self):
+        self.archive.delete_one({"_id": LOCK_ID, "owner": self.owner})
+
+    # ---- batches ----
+
+    def _protected(self, snapshot_ids):
+        # Snapshots that are some report's latest scan
+        ids = [s for s in snapshot_ids if s]
+        if not ids:
+            return set()
+        return {doc["snapshotId"] for doc in self.scans.find({"snapshotId": {"$in": ids}}, {"snapshotId": 1})}
+
+    def _batches(self, query, projection):
+        # Keyset walk in (date, _id) order so protected documents are skipped, not re-read forever
+        last = None
+        while True:
+            batch = list(self.history.find(page_query(query, last), projection).sort(BATCH_SORT).limit(self.batch_size))
+            if not batch:
+                return
+            last = (batch[-1]["date"], batch[-1]["_id"])
+            protected = self._protected([doc.get("snapshotId") for doc in batch])
+            yield [doc for doc in batch if doc.get("snapshotId") not in protected]
+            if len(batch) < self.batch_size:
+                return
+            # A pass that outlives its lease must not keep going next to the process that took the lock over
+            if not self._renew():
+                print("Retention lease lost to another process, stopping this pass")
+                self.interrupted = True
+                return
+            time.sleep(self.pause)
+
+    def downsample(self, before):
+        # Drops issue details from snapshots older than `before`; returns how many were changed
+        changed = 0
+        query = {"date": {"$lt": before}, "results.issues": {"$exists": True}}
+        for batch in self._batches(query, {"_id": 1, "date": 1, "snapshotId": 1}):
+            if not batch:
+                continue
+            result = self.history.update_many({"_id": {"$in": [doc["_id"] for doc in batch]}}, [
+                {"$set": {"results.issueCount": {"$size": {"$ifNull": ["$results.issues", []]}}, "downsampled": True}},
+                {"$project": {"results.issues": 0}},
+            ])
+            changed += result.modified_count
+        return changed
+
+    def _fold(self, journal):
+        # Adds a deleted batch's scores to score_archive. Each day document remembers the last
+        # batch folded into it, so replaying a journal after a crash never counts a batch twice.
+        ops = [
+            UpdateOne({"_id": label, "batch": {"$ne": journal["batch"]}}, {
+                "$inc": {"sum": day["sum"], "count": day["count"]},
+                "$min": {"min": day["min"], "date": day["date"]},
+                "$max": {"max": day["max"]},
+                "$set": {"batch": journal["batch"]},
+            }, upsert=True)
+            for label, day in journal["days"].items()
+        ]
+        if ops:
+            try:
+                self.archive.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                # Duplicate keys are days that already have this batch folded in
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+        self.archive.delete_one({"_id": JOURNAL_ID, "batch": journal["batch"]})
+
+    def _apply(self, journal):
+        self.history.delete_many({"_id": {"$in": journal["ids"]}})
+        self._fold(journal)
+
+    def recover(self):
+        # Finishes a batch interrupted between journaling and folding; deletes are idempotent
+        journal = self.archive.find_one({"_id": JOURNAL_ID})
+        if journal:
+            print(f"Resuming interrupted retention batch {journal['batch']}")
+            self._apply(journal)
+            return True
+        return False
+
+    def prune(self, before):
+        # Removes snapshots older than `before` after journaling their per-day score aggregates
+        removed = 0
+        for batch in self._batches({"date": {"$lt": before}}, {"_id": 1, "date": 1, "snapshotId": 1, "results.score": 1}):
+            if not batch:
+                continue
+            days = {}
+            for doc in batch:
+                score = (doc.get("results") or {}).get("score")
+                if score is None or not isinstance(doc.get("date"), datetime):
+                    continue
+                day = days.setdefault(doc["date"].strftime(DAY_FORMAT), {
+                    "sum": 0, "count": 0, "min": score, "max": score, "date": day_start(doc["date"])})
+                day["sum"] += score
+                day["count"] += 1
+                day["min"] = min(day["min"], score)
+                day["max"] = max(day["max"], score)
+            journal = {"_id": JOURNAL_ID, "batch": uuid.uuid4().hex, "ids": [doc["_id"] for doc in batch], "days": days}
+            self.archive.replace_one({"_id": JOURNAL_ID}, journal, upsert=True)
+            self._apply(journal)
+            removed += len(batch)
+        return removed
+
+    def run(self, now=None):
+        # One pass over both tiers; returns counts, or None when another process holds the lock
+        if not self._acquire():
+            return None
+        start = time.perf_counter()
+        self.interrupted = False
+        try:
+            self.recover()
+            downsample_before, prune_before = self.policy.cutoffs(now)
+            result = {"downsampled": 0, "pruned": 0}
+            if prune_before:
+                result["pruned"] = self.prune(prune_before)
+            if downsample_before and not self.interrupted:
+                result["downsampled"] = self.downsample(downsample_before)
+        finally:
+            self._release()
+        result["seconds"] = round(time.perf_counter() - start, 2)
+        result["interrupted"] = self.interrupted
+        result["finishedAt"] = datetime.now()
+        self.last_run = result
+        if (result["pruned"] or result["downsampled"]) and self.on_change:
+            self.on_change()
+        return result
+
+    # ---- background loop ----
+
+    def _loop(self, interval):
+        while True:
+            try:
+                result = self.run()
+                if result and (result["pruned"] or result["downsampled"]):
+                    print(f"Retention: pruned {result['pruned']} and downsampled {result['downsampled']} snapshots "
+                          f"in {result['seconds']}s")
+            except OperationFailure as e:
+                print(f"Retention failed (time-series history needs MongoDB 7.0 for retention): {str(e)}")
+            except Exception as e:
+                print(f"Retention failed: {str(e)}")
+            time.sleep(interval)
+
+    def start(self, interval=RETENTION_INTERVAL):
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="retention", daemon=True)
+        self._thread.start()
+        return True
+
+    def stats(self):
+        return {"enabled": self._thread is not None and self._thread.is_alive(), "policy": self.policy.describe(),
+                "batchSize": self.batch_size, "lastRun": self.last_run}
+
+
+def archived_days(archive):
+    # Per-day aggregates of pruned snapshots
+    return archive.find({"date": {"$exists": True}, "count": {"$gt": 0}})
@@ -0,0 +1,136 @@
+from datetime import datetime
+
+from pymongo import DeleteMany, ReplaceOne, UpdateOne
+
+from services.pipelines import trend_pipeline
+from services.retention import archived_days
+
+# Same labels as the $dateToString formats used by get_trends
+PERIOD_FORMATS = {
+    'daily': "%Y-%m-%d",
+    'weekly': "%Y-W%V",
+    'monthly': "%Y-%m",
+}
+
+
+def bucket_label(date, period):
+    if period == 'weekly':
+        # Mongo's %V is the ISO week number, paired with the calendar year (%Y)
+        return f"{date.year}-W{date.isocalendar()[1]:02d}"
+    return date.strftime(PERIOD_FORMATS[period])
+
+
+def _bucket_ops(date, score):
+    ops = []
+    for period in PERIOD_FORMATS:
+        label = bucket_label(date, period)
+        ops.append(UpdateOne({"_id": f"{period}:{label}"}, {
+            "$inc": {"sum": score, "count": 1},
+            "$setOnInsert": {"period": period, "label": label},
+            # Extremes only ever widen: they describe every score written to the bucket
+            "$min": {"start": date, "min": score},
+            "$max": {"max": score},
+        }, upsert=True))
+    return ops
+
+
+def record_scores(rollups, entries):
+    # entries: [(date, score)] for snapshots just appended to the history (which never replaces
+    # one, so buckets only grow). One bulk_write of atomic $inc upserts for all buckets touched.
+    ops = []
+    for date, score in entries:
+        if score is None or not isinstance(date, datetime):
+            continue
+        ops.extend(_bucket_ops(date, score))
+    if ops:
+        rollups.bulk_write(ops, ordered=False)
+
+
+def read_trend(rollups, period):
+    # O(number of buckets): one indexed range read, no per-scan work
+    buckets = rollups.find({"period": period, "count": {"$gt": 0}}).sort("start", 1)
+    labels, scores = [], []
+    for bucket in buckets:
+        labels.append(bucket["label"])
+        scores.append(round(bucket["sum"] / bucket["count"], 1))
+    return {"labels": labels, "scores": scores}
+
+
+def rollup_pipeline(period):
+    # trend_pipeline's $match/$project, grouped into sum/count/min/max instead of only the average
+    match, project = trend_pipeline(PERIOD_FORMATS[period])[:2]
+    return [match, project, {"$group": {
+        "_id": {"$dateToString": {"format": PERIOD_FORMATS[period], "date": "$parsedDate"}},
+        "sum": {"$sum": "$score"},
+        "count": {"$sum": 1},
+        "min": {"$min": "$score"},
+        "max": {"$max": "$score"},
+        "start": {"$min": "$parsedDate"}
+    }}]
+
+
+def rollup_rows(scans, period, archive=None):
+    # {label: {sum, count, min, max, start}} from the scans, plus the per-day aggregates that
+    # retention folded into the archive before pruning old snapshots
+    rows = {row["_id"]: row for row in scans.aggregate(rollup_pipeline(period), allowDiskUse=True)}
+    if archive is not None:
+        for day in archived_days(archive):
+            label = bucket_label(day["date"], period)
+            row = rows.get(label)
+            if row is None:
+                rows[label] = {"sum": day["sum"], "count": day["count"], "min": day["min"], "max": day["max"],
+                               "start": day["date"]}
+                continue
+            row["sum"] += day["sum"]
+            row["count"] += day["count"]
+            row["min"], row["max"] = min(row["min"], day["min"]), max(row["max"], day["max"])
+            row["start"] = min(row["start"], day["date"])
+    return rows
+
+
+def rebuild_rollups(scans, rollups, archive=None):
+    # Backfill: recompute every bucket from the scans collection (and the retention archive).
+    # Idempotent, and buckets with no remaining scans are removed. Run it while scan writes are quiet.
+    written = 0
+    for period in PERIOD_FORMATS:
+        ops = []
+        ids = []
+        for label, row in rollup_rows(scans, period, archive).items():
+            bucket_id = f"{period}:{label}"
+            ids.append(bucket_id)
+            ops.append(ReplaceOne({"_id": bucket_id}, {
+                "period": period, "label": label, "start": row["start"],
+                "sum": row["sum"], "count": row["count"], "min": row["min"], "max": row["max"]
+            }, upsert=True))
+        ops.append(DeleteMany({"period": period, "_id": {"$nin": ids}}))
+        rollups.bulk_write(ops, ordered=False)
+        written += len(ids)
+    return written
+
+
+def check_rollups(scans, rollups, archive=None):
+    # Compares rollup-served trends with the live pipeline; returns a list of mismatches
+    mismatches = []
+    archived = list(archived_days(archive)) if archive is not None else []
+    for period, date_format in PERIOD_FORMATS.items():
+        expected = {r["_id"]: round(r["avgScore"], 1) for r in scans.aggregate(trend_pipeline(date_format))}
+        if archived:
+            # Buckets holding pruned days average the retained snapshots together with the archive
+            rows = rollup_rows(scans, period, archive)
+            for label in {bucket_label(day["date"], period) for day in archived}:
+                expected[label] = round(rows[label]["sum"] / rows[label]["count"], 1)
+        trend = read_trend(rollups, period)
+        actual = dict(zip(trend["labels"], trend["scores"]))
+        for label in sorted(set(expected) | set(actual)):
+            if expected.get(label) != actual.get(label):
+                mismatches.append(f"{period} {label}: pipeline={expected.get(label)} rollup={actual.get(label)}")
+    return mismatches
+
+
+def ensure_rollups(scans, rollups, archive=None):
+    # First start after upgrading: build rollups from the existing history
+    try:
+        if rollups.estimated_document_count() == 0 and scans.estimated_document_count() > 0:
+            print(f"Backfilled {rebuild_rollups(scans, rollups, archive)} score rollup buckets")
+    except Exception as e:
+        print(f"Unable to backfill score rollups: {str(e)}")
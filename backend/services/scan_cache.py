@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+SCAN_CACHE_TTL = int(os.environ.get('SCAN_CACHE_TTL', 600))
+SCAN_CACHE_MAX_ENTRIES = int(os.environ.get('SCAN_CACHE_MAX_ENTRIES', 1000))
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url):
+    # example.com, https://example.com/ and HTTPS://Example.com:443 all map to https://example.com
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    netloc = host
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{parts.port}"
+    if parts.username:
+        userinfo = parts.username + (f":{parts.password}" if parts.password else '')
+        netloc = f"{userinfo}@{netloc}"
+    path = parts.path
+    if path == '/':
+        path = ''
+    # Fragments never reach the server, so they never change the scan
+    return urlunsplit((scheme, netloc, path, parts.query, ''))
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ScanResultCache:
+    def __init__(self, ttl=SCAN_CACHE_TTL, max_entries=SCAN_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "forced": 0}
+
+    def get_or_scan(self, url, scan_func, force=False):
+        # Returns a fresh cached result, joins a scan already running for the same URL,
+        # or runs scan_func(url) as the leader. force=True always starts a new scan.
+        # Returns (result, fresh): fresh is True only for the call that ran scan_func, so
+        # cache hits and joined scans can tell they must not store the result again.
+        with self._lock:
+            if force:
+                self.counters["forced"] += 1
+            else:
+                entry = self._entries.get(url)
+                if entry and time.monotonic() - entry[0] < self.ttl:
+                    self._entries.move_to_end(url)
+                    self.counters["hits"] += 1
+                    return entry[1], False
+                flight = self._in_flight.get(url)
+                if flight:
+                    self.counters["coalesced"] += 1
+                else:
+                    self.counters["misses"] += 1
+            if force or not flight:
+                flight = _InFlight()
+                self._in_flight[url] = flight
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.result, False
+
+        try:
+            flight.result = scan_func(url)
+            self._store(url, flight.result)
+            return flight.result, True
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._in_flight.get(url) is flight:
+                    del self._in_flight[url]
+            flight.done.set()
+
+    def _store(self, url, result):
+        with self._lock:
+            self._entries[url] = (time.monotonic(), result)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, url=None):
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(url, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self._entries)
+            stats["inFlight"] = len(self._in_flight)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hitRate"] = round(stats["hits"] / lookups, 3) if lookups else 0
+        stats["ttl"] = self.ttl
+        return stats
+
+
+scan_cache = ScanResultCache()
@@ -0,0 +1,265 @@
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+import uuid
+from collections import deque
+
+from services.metrics import scan_phase_seconds, scans_total
+from services.profiles import profile_pool
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCAN_SERVICE = os.path.join(BACKEND_DIR, 'scan_service.js')
+
+NODE_WORKERS = int(os.environ.get('SCAN_NODE_WORKERS', os.environ.get('SCAN_WORKERS', 4)))
+# Recycle a worker after this many scans or once its reported RSS or its profile's tmp/ passes the ceiling
+WORKER_MAX_SCANS = int(os.environ.get('SCAN_WORKER_MAX_SCANS', 50))
+WORKER_MAX_RSS_MB = int(os.environ.get('SCAN_WORKER_MAX_RSS_MB', 1024))
+WORKER_MAX_TMP_MB = int(os.environ.get('SCAN_WORKER_MAX_TMP_MB', 512))
+# Idle workers are pinged before reuse if they have not answered for this long
+WORKER_HEALTH_INTERVAL = int(os.environ.get('SCAN_WORKER_HEALTH_INTERVAL', 60))
+WORKER_PING_TIMEOUT = 10
+SCAN_TIMEOUT = 300
+
+
+class WorkerError(Exception):
+    pass
+
+
+# One long-lived `node scan_service.js --worker` process speaking NDJSON
+class NodeScanWorker:
+    def __init__(self, profile):
+        self.profile = profile
+        self.scans = 0
+        self.rss = 0
+        self.last_seen = time.monotonic()
+        self._lines = queue.Queue()
+        self._stderr = deque(maxlen=20)
+
+        # Chrome's user-data-dir and every temp file of the worker stay inside its pooled profile
+        env = os.environ.copy()
+        env["TEMP"] = env["TMP"] = env["TMPDIR"] = profile.tmp
+        env["SCAN_PROFILE_DIR"] = profile.chrome
+
+        self.process = subprocess.Popen(
+            ['node', SCAN_SERVICE, '--worker'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+            cwd=BACKEND_DIR,
+            text=True,
+            bufsize=1
+        )
+        # Pipes are drained on threads so reads can time out and stderr never fills up
+        threading.Thread(target=self._pump, args=(self.process.stdout, self._lines.put), daemon=True).start()
+        threading.Thread(target=self._pump, args=(self.process.stderr, self._stderr.append), daemon=True).start()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    @staticmethod
+    def _pump(stream, sink):
+        for line in iter(stream.readline, ''):
+            sink(line)
+        stream.close()
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def request(self, payload, timeout):
+        if not self.is_alive():
+            raise WorkerError(f"Worker {self.pid} exited: {self.stderr_tail()}")
+
+        request_id = str(uuid.uuid4())
+        try:
+            self.process.stdin.write(json.dumps(dict(payload, id=request_id)) + '\n')
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerError(f"Worker {self.pid} stdin closed: {str(e)}")
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise WorkerError(f"Worker {self.pid} timed out after {timeout}s")
+            try:
+                line = self._lines.get(timeout=min(remaining, 1))
+            except queue.Empty:
+                if not self.is_alive():
+                    raise WorkerError(f"Worker {self.pid} crashed: {self.stderr_tail()}")
+                continue
+            try:
+                parse_start = time.perf_counter()
+                response = json.loads(line)
+                parse_time = time.perf_counter() - parse_start
+            except ValueError:
+                # Stray non-protocol output; ignore it
+                continue
+            if response.get('id') != request_id:
+                continue
+            self.last_seen = time.monotonic()
+            self.rss = response.get('rss', self.rss)
+            response['_parseSeconds'] = parse_time
+            return response
+
+    def ping(self, timeout=WORKER_PING_TIMEOUT):
+        try:
+            return bool(self.request({"type": "ping"}, timeout).get('pong'))
+        except WorkerError:
+            return False
+
+    def scan(self, url, timeout=SCAN_TIMEOUT):
+        response = self.request({"type": "scan", "url": url}, timeout)
+        self.scans += 1
+        timings = response.get('timings') or {}
+        # A Chrome (re)launch inside the worker counts toward spawning, like the process start
+        if timings.get('chrome', 0) >= 1:
+            scan_phase_seconds.observe(timings['chrome'] / 1000, 'spawn')
+        for phase in ('lighthouse', 'axe'):
+            if phase in timings:
+                scan_phase_seconds.observe(timings[phase] / 1000, phase)
+        scan_phase_seconds.observe(response['_parseSeconds'] + timings.get('summarize', 0) / 1000, 'parse')
+        if not response.get('ok'):
+            raise Exception(response.get('error') or 'Unknown scan error')
+        return response['result']
+
+    def stderr_tail(self):
+        return ''.join(self._stderr).strip()
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+
+    def stop(self):
+        if not self.is_alive():
+            return
+        try:
+            # Closing stdin lets the worker shut Chrome down cleanly
+            self.process.stdin.close()
+            self.process.wait(timeout=10)
+        except Exception:
+            self.kill()
+
+
+class ScanWorkerPool:
+    def __init__(self, size=NODE_WORKERS, max_scans=WORKER_MAX_SCANS, max_rss_mb=WORKER_MAX_RSS_MB,
+                 max_tmp_mb=WORKER_MAX_TMP_MB, health_interval=WORKER_HEALTH_INTERVAL):
+        self.size = size
+        self.max_scans = max_scans
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.max_tmp = max_tmp_mb * 1024 * 1024
+        self.health_interval = health_interval
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._workers = set()
+        self.in_flight = 0
+        self.counters = {"started": 0, "recycled": 0, "restarted": 0, "scans": 0, "failures": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _spawn(self):
+        profile = profile_pool.checkout()
+        try:
+            with scan_phase_seconds.time('spawn'):
+                worker = NodeScanWorker(profile)
+        except Exception:
+            profile_pool.checkin(profile, wipe=True)
+            raise
+        with self._lock:
+            self._workers.add(worker)
+            self.counters["started"] += 1
+        print(f"Started scan worker pid={worker.pid}")
+        return worker
+
+    def _retire(self, worker, reason, crashed=False):
+        with self._lock:
+            self._workers.discard(worker)
+        print(f"Retiring scan worker pid={worker.pid}: {reason}")
+        worker.stop()
+        profile_pool.checkin(worker.profile, wipe=crashed)
+
+    def _checkout(self):
+        # Reuse an idle worker when it is still healthy, otherwise start a fresh one
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return self._spawn()
+            if not worker.is_alive():
+                self._count("restarted")
+                self._retire(worker, "process exited", crashed=True)
+                continue
+            if time.monotonic() - worker.last_seen > self.health_interval and not worker.ping():
+                self._count("restarted")
+                self._retire(worker, "failed health check", crashed=True)
+                continue
+            return worker
+
+    def _checkin(self, worker):
+        if not worker.is_alive():
+            self._count("restarted")
+            self._retire(worker, "process exited", crashed=True)
+        elif worker.scans >= self.max_scans:
+            self._count("recycled")
+            self._retire(worker, f"served {worker.scans} scans")
+        elif worker.rss >= self.max_rss:
+            self._count("recycled")
+            self._retire(worker, f"rss {worker.rss // (1024 * 1024)}MB over ceiling")
+        elif profile_pool.tmp_bytes(worker.profile) >= self.max_tmp:
+            # tmp/ is only emptied once the worker's Chrome is gone (profile_pool.checkin)
+            self._count("recycled")
+            self._retire(worker, "profile tmp over ceiling")
+        else:
+            self._idle.put(worker)
+
+    def scan(self, url, timeout=SCAN_TIMEOUT):
+        with self._slots:
+            worker = self._checkout()
+            with self._lock:
+                self.in_flight += 1
+            try:
+                result = worker.scan(url, timeout)
+                self._count("scans")
+                scans_total.inc("completed")
+                return result
+            except WorkerError:
+                # Timed out or crashed mid-scan: the process state is unknown, so replace it
+                self._count("failures")
+                scans_total.inc("worker_error")
+                worker.kill()
+                raise
+            except Exception:
+                self._count("failures")
+                scans_total.inc("failed")
+                raise
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                self._checkin(worker)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["live"] = len(self._workers)
+            stats["inFlight"] = self.in_flight
+        stats["idle"] = self._idle.qsize()
+        stats["size"] = self.size
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+            profile_pool.checkin(worker.profile)
+
+
+scan_worker_pool = ScanWorkerPool()
@@ -0,0 +1,238 @@
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from pymongo import ReturnDocument
+
+from services.metrics import registry
+
+# Recurring scans of monitored URLs. Schedule state lives in the monitored_urls collection
+# (one document per URL with its interval and nextRun), so it survives restarts; due URLs are
+# read from the enabled_next_run index in nextRun order, and the loop sleeps until the earliest
+# nextRun instead of polling every URL.
+#
+# Each dispatch first claims its document with a lease, so several processes running the
+# scheduler never scan the same URL twice; concurrency caps apply per scheduling process.
+SCAN_SCHEDULER = os.environ.get('SCAN_SCHEDULER', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+SCHEDULER_CONCURRENCY = int(os.environ.get('SCHEDULER_CONCURRENCY', 4))
+SCHEDULER_PER_HOST = int(os.environ.get('SCHEDULER_PER_HOST', 1))
+# Each run starts up to this fraction of the interval after its slot, so a fleet registered together
+# spreads out; slots themselves stay on the interval grid (baseRun) and do not drift
+SCHEDULER_JITTER = float(os.environ.get('SCHEDULER_JITTER', 0.1))
+SCHEDULER_MIN_INTERVAL = int(os.environ.get('SCHEDULER_MIN_INTERVAL', 300))
+# A claimed URL whose process died becomes due again after this long
+SCHEDULER_LEASE = int(os.environ.get('SCHEDULER_LEASE', 1800))
+# Longest sleep between due-time lookups (registrations elsewhere are picked up within this)
+SCHEDULER_MAX_SLEEP = int(os.environ.get('SCHEDULER_MAX_SLEEP', 60))
+SCHEDULER_RETRY_SECONDS = int(os.environ.get('SCHEDULER_RETRY_SECONDS', 900))
+
+scheduled_scans_total = registry.counter(
+    'webable_scheduled_scans_total', 'Scans dispatched by the recurring scheduler by outcome', ('outcome',))
+
+
+def host_of(url):
+    return (urlsplit(url).hostname or '').lower()
+
+
+def jitter(interval, fraction=SCHEDULER_JITTER):
+    return timedelta(seconds=random.uniform(0, interval * fraction))
+
+
+def next_slot(base, interval, now):
+    # First slot after now on the base + k * interval grid; missed slots are skipped, not replayed
+    step = timedelta(seconds=interval)
+    missed = max(int((now - base) / step), 0)
+    base += step * missed
+    return base + step if base <= now else base
+
+
+class ScanScheduler:
+    def __init__(self, monitors, dispatch, submit, concurrency=SCHEDULER_CONCURRENCY, per_host=SCHEDULER_PER_HOST):
+        # dispatch(url, raw_url) runs one scan; submit(func, *args) hands it to a worker and returns a job id
+        self.monitors = monitors
+        self.dispatch = dispatch
+        self.submit = submit
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self._running = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopped = False
+        self.dispatched = 0
+        self.deferred = 0
+        self._blocked = False
+
+    # ---- schedule state ----
+
+    def register(self, url, raw_url, interval):
+        # New URLs run within the jitter window; re-registering keeps the schedule but takes the new interval
+        now = datetime.now()
+        doc = self.monitors.find_one_and_update(
+            {"_id": url},
+            {
+                "$set": {"url": url, "original_url": raw_url, "host": host_of(url), "interval": interval, "enabled": True},
+                "$setOnInsert": {
+                    "createdAt": now, "baseRun": now, "nextRun": now + jitter(interval),
+                    "lastRun": None, "lastStatus": None, "lastError": None, "runs": 0, "failures": 0, "leaseUntil": None
+                }
+            },
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        self._wake.set()
+        return doc
+
+    def unregister(self, urls):
+        return self.monitors.delete_many({"_id": {"$in": list(urls)}}).deleted_count
+
+    def list(self, limit=100, skip=0):
+        return list(self.monitors.find({}).sort("nextRun", 1).skip(skip).limit(limit))
+
+    def next_due(self):
+        now = datetime.now()
+        doc = self.monitors.find_one({"enabled": True, "$or": [{"leaseUntil": None}, {"leaseUntil": {"$lte": now}}]},
+                                     {"nextRun": 1}, sort=[("nextRun", 1)])
+        return doc["nextRun"] if doc else None
+
+    def _due(self, now):
+        # Leased documents are being scanned somewhere; their lease expires if that process died
+        return {"enabled": True, "nextRun": {"$lte": now}, "$or": [{"leaseUntil": None}, {"leaseUntil": {"$lte": now}}]}
+
+    def _claim(self, doc, now):
+        return self.monitors.find_one_and_update(
+            dict(self._due(now), _id=doc["_id"]),
+            {"$set": {"leaseUntil": now + timedelta(seconds=SCHEDULER_LEASE)}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _finish(self, doc, error=None):
+        now = datetime.now()
+        update = {"lastRun": now, "lastStatus": "failed" if error else "completed", "lastError": error, "leaseUntil": None}
+        if error:
+            # Failed scans retry sooner (backing off), but never later than the regular interval
+            update["failures"] = doc.get("failures", 0) + 1
+            update["nextRun"] = now + timedelta(
+                seconds=min(doc["interval"], SCHEDULER_RETRY_SECONDS * 2 ** min(update["failures"] - 1, 5)))
+        else:
+            update["failures"] = 0
+            update["baseRun"] = next_slot(doc.get("baseRun") or now, doc["interval"], now)
+            update["nextRun"] = update["baseRun"] + jitter(doc["interval"])
+        self.monitors.update_one({"_id": doc["_id"]}, {"$set": update, "$inc": {"runs": 1}})
+
+    # ---- dispatch ----
+
+    def _slots(self):
+        with self._lock:
+            return self.concurrency - len(self._running)
+
+    def _acquire(self, doc):
+        host = doc.get("host") or host_of(doc["url"])
+        with self._lock:
+            if len(self._running) >= self.concurrency or self._hosts.get(host, 0) >= self.per_host:
+                return False
+            self._running[doc["_id"]] = host
+            self._hosts[host] = self._hosts.get(host, 0) + 1
+            return True
+
+    def _release(self, url):
+        with self._lock:
+            host = self._running.pop(url, None)
+            if host is not None:
+                self._hosts[host] -= 1
+                if not self._hosts[host]:
+                    del self._hosts[host]
+        self._wake.set()
+
+    def _run(self, doc):
+        error = None
+        try:
+            self.dispatch(doc["url"], doc.get("original_url") or doc["url"])
+        except Exception as e:
+            error = str(e)
+            print(f"Scheduled scan failed for {doc['url']}: {error}")
+            raise
+        finally:
+            try:
+                self._finish(doc, error)
+            except Exception as e:
+                print(f"Unable to reschedule {doc['url']}: {str(e)}")
+            self._release(doc["_id"])
+            scheduled_scans_total.inc('failed' if error else 'completed')
+
+    def dispatch_due(self, now=None):
+        # Claims and submits due URLs, earliest first, within the global and per-host caps
+        now = now or datetime.now()
+        free = self._slots()
+        if free <= 0:
+            return 0
+        with self._lock:
+            busy = set(self._running)
+        started = 0
+        self._blocked = False
+        # Read a few extra in case some are held back by their host's limit
+        due = self.monitors.find(self._due(now)).sort("nextRun", 1).limit(free * 4)
+        for doc in due:
+            if started >= free:
+                break
+            if doc["_id"] in busy or not self._acquire(doc):
+                self.deferred += 1
+                self._blocked = True
+                continue
+            claimed = self._claim(doc, now)
+            if not claimed:
+                # Another process (or a live lease) has it
+                self._release(doc["_id"])
+                continue
+            try:
+                self.submit(self._run, claimed)
+            except Exception as e:
+                print(f"Unable to submit scheduled scan for {doc['url']}: {str(e)}")
+                self._release(doc["_id"])
+                continue
+            self.dispatched += 1
+            started += 1
+        return started
+
+    def _loop(self):
+        print(f"Scan scheduler started (concurrency {self.concurrency}, per host {self.per_host})")
+        while not self._stopped:
+            self._wake.clear()
+            sleep = SCHEDULER_MAX_SLEEP
+            try:
+                self.dispatch_due()
+                # Due URLs held back by their host's limit wait for a slot to free up
+                if self._slots() > 0 and not self._blocked:
+                    next_run = self.next_due()
+                    if next_run is not None:
+                        sleep = min(sleep, max((next_run - datetime.now()).total_seconds(), 0.5))
+            except Exception as e:
+                print(f"Scan scheduler error: {str(e)}")
+            # Woken early by a registration or a finished scan freeing a slot
+            self._wake.wait(sleep)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._stopped = False
+            self._thread = threading.Thread(target=self._loop, name="scan-scheduler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            running = len(self._running)
+            hosts = dict(self._hosts)
+            alive = self._thread is not None and self._thread.is_alive()
+        return {
+            "enabled": alive, "concurrency": self.concurrency, "perHost": self.per_host,
+            "running": running, "runningByHost": hosts, "dispatched": self.dispatched,
+            "deferred": self.deferred, "jitter": SCHEDULER_JITTER
+        }
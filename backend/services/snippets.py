@@ -0,0 +1,73 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from pymongo import UpdateOne
+
+# axe node html longer than this is cut before hashing and storage
+SNIPPET_MAX_LENGTH = int(os.environ.get('SNIPPET_MAX_LENGTH', 500))
+# Fingerprints known to be stored already; saves a round trip for repeated headers/footers/nav
+SNIPPET_KNOWN_CACHE = int(os.environ.get('SNIPPET_KNOWN_CACHE', 50000))
+
+
+def truncate_snippet(html, max_length=SNIPPET_MAX_LENGTH):
+    if len(html) <= max_length:
+        return html
+    return html[:max_length] + '…'
+
+
+def snippet_fingerprint(html):
+    return hashlib.sha1(html.encode('utf-8')).hexdigest()
+
+
+class SnippetStore:
+    # Content-addressed storage for affected-element snippets: one document per distinct
+    # (truncated) snippet, keyed by its fingerprint, referenced from results.issues[].elementRefs
+    def __init__(self, collection, max_length=SNIPPET_MAX_LENGTH):
+        self.collection = collection
+        self.max_length = max_length
+        self._known = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, snippets, html):
+        # Registers html in the pending dict and returns its fingerprint
+        html = truncate_snippet(html, self.max_length)
+        fingerprint = snippet_fingerprint(html)
+        snippets[fingerprint] = html
+        return fingerprint
+
+    def save(self, snippets):
+        with self._lock:
+            new = {fp: html for fp, html in snippets.items() if fp not in self._known}
+        if not new:
+            return 0
+        self.collection.bulk_write([
+            UpdateOne({"_id": fp}, {"$setOnInsert": {"html": html}}, upsert=True)
+            for fp, html in new.items()
+        ], ordered=False)
+        with self._lock:
+            for fp in new:
+                self._known[fp] = True
+            while len(self._known) > SNIPPET_KNOWN_CACHE:
+                self._known.popitem(last=False)
+        return len(new)
+
+    def lookup(self, fingerprints):
+        if not fingerprints:
+            return {}
+        return {
+            doc["_id"]: doc["html"]
+            for doc in self.collection.find({"_id": {"$in": list(fingerprints)}})
+        }
+
+    def expand(self, scans):
+        # Fills issues[].affectedElements from elementRefs, with a single query for all scans
+        issue_lists = [(scan.get("results") or {}).get("issues") or [] for scan in scans]
+        refs = {ref for issues in issue_lists for issue in issues for ref in issue.get("elementRefs") or []}
+        html_by_ref = self.lookup(refs)
+        for issues in issue_lists:
+            for issue in issues:
+                if "elementRefs" in issue:
+                    issue["affectedElements"] = [html_by_ref.get(ref, '') for ref in issue["elementRefs"]]
+        return scans
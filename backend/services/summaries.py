@@ -0,0 +1,131 @@
+import uuid
+
+from pymongo import ReplaceOne, UpdateOne
+
+from services.pipelines import SCORED_SCANS
+
+# One small document per URL: latest/previous score, last scan date, scan count and the
+# direction of the last change (trend 1 improved, -1 regressed, 0 unchanged/first scan).
+REBUILD_CHUNK = 1000
+
+
+def _summary_update(date, score):
+    # Pipeline update: within one $set stage "$latestScore" still reads the old value,
+    # so the shift latest -> previous happens atomically on the server.
+    return [
+        {"$set": {
+            "previousScore": "$latestScore",
+            "previousScanDate": "$lastScanDate",
+            "latestScore": score,
+            "lastScanDate": date,
+            "firstScanDate": {"$ifNull": ["$firstScanDate", date]},
+            "scanCount": {"$add": [{"$ifNull": ["$scanCount", 0]}, 1]},
+        }},
+        {"$set": {
+            "trend": {"$cond": [
+                {"$eq": [{"$ifNull": ["$previousScore", None]}, None]}, 0,
+                {"$cond": [{"$gt": ["$latestScore", "$previousScore"]}, 1,
+                           {"$cond": [{"$lt": ["$latestScore", "$previousScore"]}, -1, 0]}]}
+            ]}
+        }},
+    ]
+
+
+def record_summaries(summaries, entries):
+    # entries: [(url, date, score)] for scans just written; one bulk_write for all of them
+    ops = [
+        UpdateOne({"_id": url}, _summary_update(date, score), upsert=True)
+        for url, date, score in entries if score is not None
+    ]
+    if ops:
+        summaries.bulk_write(ops, ordered=False)
+
+
+def remove_summaries(summaries, urls):
+    if urls:
+        summaries.delete_many({"_id": {"$in": list(urls)}})
+
+
+def read_summary_stats(summaries):
+    # Indexed reads only: best/worst via latestScore, latest via lastScanDate, counts via trend
+    best = summaries.find_one({}, {"latestScore": 1}, sort=[("latestScore", -1)])
+    worst = summaries.find_one({}, {"latestScore": 1}, sort=[("latestScore", 1)])
+    latest = summaries.find_one({}, {"latestScore": 1}, sort=[("lastScanDate", -1)])
+    return {
+        "bestScore": best["latestScore"] if best else 0,
+        "worstScore": worst["latestScore"] if worst else 0,
+        "latestScore": latest["latestScore"] if latest else 0,
+        "improvements": summaries.count_documents({"trend": 1}),
+        "regressions": summaries.count_documents({"trend": -1}),
+    }
+
+
+def summary_backfill_pipeline():
+    # url_date order puts each URL's newest scan first, so the group keeps a fixed-size row per
+    # URL however long its history is (no per-URL arrays of every score)
+    return [
+        {"$match": SCORED_SCANS},
+        {"$sort": {"url": 1, "date": -1}},
+        {"$group": {
+            "_id": "$url",
+            "latestScore": {"$first": "$results.score"},
+            "lastScanDate": {"$first": "$date"},
+            "firstScanDate": {"$min": "$date"},
+            "scanCount": {"$sum": 1},
+        }},
+    ]
+
+
+def previous_score_pipeline(latest):
+    # latest: {url: lastScanDate}; each URL's newest scan before that date, one indexed range per URL
+    return [
+        {"$match": {"$and": [SCORED_SCANS, {"$or": [{"url": url, "date": {"$lt": date}} for url, date in latest.items()]}]}},
+        {"$sort": {"url": 1, "date": -1}},
+        {"$group": {"_id": "$url", "score": {"$first": "$results.score"}, "date": {"$first": "$date"}}},
+    ]
+
+
+def _write_rebuilt(scans, summaries, rows, token):
+    # One previous-score lookup and one bulk_write per chunk of backfilled URLs
+    latest = {row["_id"]: row["lastScanDate"] for row in rows if row["scanCount"] > 1}
+    previous = {}
+    if latest:
+        previous = {doc["_id"]: doc for doc in scans.aggregate(previous_score_pipeline(latest), allowDiskUse=True)}
+    ops = []
+    for row in rows:
+        doc = {
+            "latestScore": row["latestScore"], "lastScanDate": row["lastScanDate"],
+            "firstScanDate": row["firstScanDate"], "scanCount": row["scanCount"], "trend": 0, "rebuild": token,
+        }
+        before = previous.get(row["_id"])
+        if before:
+            doc.update(previousScore=before["score"], previousScanDate=before["date"],
+                       trend=(row["latestScore"] > before["score"]) - (row["latestScore"] < before["score"]))
+        ops.append(ReplaceOne({"_id": row["_id"]}, doc, upsert=True))
+    if ops:
+        summaries.bulk_write(ops, ordered=False)
+
+
+def rebuild_summaries(scans, summaries):
+    # Backfill from the history; idempotent. Summaries this pass did not write (URLs with no
+    # scans left) are swept by token afterwards, so no command has to list every URL.
+    token = uuid.uuid4().hex
+    rows = []
+    rebuilt = 0
+    for row in scans.aggregate(summary_backfill_pipeline(), allowDiskUse=True):
+        rows.append(row)
+        rebuilt += 1
+        if len(rows) >= REBUILD_CHUNK:
+            _write_rebuilt(scans, summaries, rows, token)
+            rows = []
+    _write_rebuilt(scans, summaries, rows, token)
+    summaries.delete_many({"rebuild": {"$ne": token}})
+    return rebuilt
+
+
+def ensure_summaries(scans, summaries):
+    try:
+        if summaries.estimated_document_count() == 0 and scans.estimated_document_count() > 0:
+            print(f"Backfilled {rebuild_summaries(scans, summaries)} URL score summaries")
+    except Exception as e:
+        print(f"Unable to backfill URL score summaries: {str(e)}")
@@ -44,7 +44,7 @@ const HistoryPage = () => {
       setError(null);
       
       // Use the correct endpoint that exists in your backend
-      const response = await fetch('http://localhost:5000/api/reports?limit=50');
+      const response = await fetch('http://localhost:5000/api/reports?limit=50&fields=id,url,date,status,score,metrics,issuesBySeverity');
       if (!response.ok) {
         throw new Error(`Failed to fetch scan history: ${response.statusText}`);
       }
@@ -66,6 +66,7 @@ const HistoryPage = () => {
             seo?: number;
           };
           issues?: unknown[];
+          issuesBySeverity?: Record<string, number>;
         };
         status?: 'completed' | 'failed' | 'pending';
       }) => ({
@@ -77,7 +78,8 @@ const HistoryPage = () => {
         performance_score: scan.results?.metrics?.performance,
         best_practices_score: scan.results?.metrics?.bestPractices,
         seo_score: scan.results?.metrics?.seo,
-        issues_count: scan.results?.issues?.length || 0,
+        issues_count: scan.results?.issues?.length
+          ?? Object.values(scan.results?.issuesBySeverity || {}).reduce((sum, n) => sum + n, 0),
         status: scan.status || 'completed'
       }));
       
@@ -13,6 +13,7 @@ import {
   AiOutlineUp,
 } from "react-icons/ai";
 import { useScanner } from "../hooks/useScanner";
+import { scanWebsite } from "../services/api";
 import jsPDF from "jspdf";
 import html2canvas from "html2canvas";
 
@@ -401,7 +402,7 @@ const ReportPage: React.FC = () => {
             const encodedParam = encodeURIComponent(currentScanId!);
             response = await fetch(`http://localhost:5000/api/scan-report/${encodedParam}`);
             if (!response.ok) {
-              response = await fetch(`http://localhost:5000/api/reports/${encodedParam}`);
+              response = await fetch(`http://localhost:5000/api/reports/${encodedParam}?expand=elements`);
             }
             if (response.ok) {
               const data: ReportData = await response.json();
@@ -424,19 +425,9 @@ const ReportPage: React.FC = () => {
           }
           lastScannedUrl.current = urlToScan;
 
-          const scanResponse = await fetch(`http://localhost:5000/api/scan`, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ url: urlToScan }),
-          });
-
-          if (!scanResponse.ok) {
-            const errorText = await scanResponse.text();
-            throw new Error(`Scan failed: ${scanResponse.status} - ${errorText}`);
-          }
-
-          const scanData = await scanResponse.json();
-          const newScanId = scanData.scanId || scanData.id;
+          // Queues the scan and polls its job until the result is stored
+          const scanData = await scanWebsite(urlToScan);
+          const newScanId = scanData.id;
           if (!newScanId) throw new Error("Scan started but no scan ID returned.");
 
           const safeNewScanId = encodeURIComponent(newScanId);
@@ -48,13 +48,45 @@ const isLikelyScanId = (value?: string) => {
   return !!value && (/^[a-f\d]{24}$/i.test(value) || /^[\w\d-]{36}$/.test(value));
 };
 
+// Scan job as reported by /scans/<jobId>/status
+interface ScanJobStatus {
+  id: string;
+  status: 'queued' | 'running' | 'completed' | 'failed';
+  error?: string | null;
+}
+
+const SCAN_POLL_INTERVAL = 3000; // 3 seconds
+
+export const getScanStatus = async (jobId: string): Promise<ScanJobStatus> => {
+  const response = await api.get(`/scans/${jobId}/status`);
+  return response.data;
+};
+
+export const getScanResult = async (jobId: string): Promise<ScanResult> => {
+  const response = await api.get(`/scans/${jobId}/result`);
+  return response.data;
+};
+
 export const scanWebsite = async (url: string): Promise<ScanResult> => {
   try {
     console.log('Scanning URL:', url);
-    // Fixed: Added /api prefix to match Flask backend
+    // The backend queues the scan (202) and returns a job id to poll
     const response = await api.post('/scan', { url });
     console.log('Scan Response:', response.data);
-    return response.data;
+    const { jobId } = response.data;
+    if (!jobId) {
+      return response.data;
+    }
+
+    let job = await getScanStatus(jobId);
+    while (job.status === 'queued' || job.status === 'running') {
+      await new Promise((resolve) => setTimeout(resolve, SCAN_POLL_INTERVAL));
+      job = await getScanStatus(jobId);
+    }
+    if (job.status === 'failed') {
+      throw { message: job.error || 'Scan failed', response: { data: { error: job.error || undefined } } };
+    }
+    return await getScanResult(jobId);
   } catch (error: unknown) {
     console.error('Scan Error:', error);
     const apiError = error as ApiError;
@@ -72,7 +104,7 @@ export const getReport = async (id: string): Promise<ScanResult> => {
   }
   try {
     console.log('Fetching report for ID:', id);
-    const response = await api.get(`/reports/${id}`);
+    const response = await api.get(`/reports/${id}?expand=elements`);
     return response.data;
   } catch (error: unknown) {
     console.error('Get Report Error:', error);